@@ -0,0 +1,16 @@
+from django.apps import AppConfig
+
+
+class AnalyticsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'api.analytics'
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save
+        from api.assessments.models import Assessment
+        from api.progress.models import Progress
+        from .summaries import course_changed
+
+        for model in (Progress, Assessment):
+            post_save.connect(course_changed, sender=model, dispatch_uid=f'analytics_{model.__name__}_save')
+            post_delete.connect(course_changed, sender=model, dispatch_uid=f'analytics_{model.__name__}_delete')
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api.analytics import summaries
+
+
+class Command(BaseCommand):
+    help = "Recomputes the analytics summaries of courses changed since their last refresh."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Keep running, refreshing every --interval seconds.")
+        parser.add_argument('--interval', type=float, default=30, help="Seconds between refreshes with --loop.")
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.monotonic()
+            refreshed = summaries.refresh_changed()
+            if refreshed or not options['loop']:
+                self.stdout.write(f"Refreshed {refreshed} course(s) in {time.monotonic() - started:.2f}s.")
+            if not options['loop']:
+                return
+            close_old_connections()
+            try:
+                time.sleep(options['interval'])
+            except KeyboardInterrupt:
+                return
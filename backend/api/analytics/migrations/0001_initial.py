@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:52
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ("assessments", "0008_course_foreign_keys"),
+        ("courses", "0003_executionjob"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CourseSummary",
+            fields=[
+                (
+                    "course",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="analytics_summary",
+                        serialize=False,
+                        to="courses.course",
+                    ),
+                ),
+                ("enrollment", models.IntegerField(default=0)),
+                ("average_completion", models.FloatField(default=0)),
+                ("completion_histogram", models.JSONField(default=list)),
+                ("time_histogram", models.JSONField(default=list)),
+                ("changed_at", models.DateTimeField(default=django.utils.timezone.now)),
+                ("refreshed_at", models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="AssessmentSummary",
+            fields=[
+                (
+                    "assessment",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="analytics_summary",
+                        serialize=False,
+                        to="assessments.assessment",
+                    ),
+                ),
+                ("attempts", models.IntegerField(default=0)),
+                ("students", models.IntegerField(default=0)),
+                ("average_score", models.FloatField(default=0)),
+                (
+                    "course",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="assessment_summaries",
+                        to="courses.course",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,41 @@
+from django.db import models
+from django.utils import timezone
+from api.assessments.models import Assessment
+from api.courses.models import Course
+
+class CourseSummary(models.Model):
+    """
+    Precomputed course analytics, recomputed by api/analytics/summaries.py
+    whenever ``changed_at`` is newer than ``refreshed_at``.
+    """
+    course = models.OneToOneField(Course, on_delete=models.CASCADE, primary_key=True, related_name='analytics_summary')
+    enrollment = models.IntegerField(default=0)
+    average_completion = models.FloatField(default=0)
+    completion_histogram = models.JSONField(default=list) # [{"range": "0-10", "students": n}, ...]
+    time_histogram = models.JSONField(default=list) # minutes, same shape
+    # Set by every write to the course's progress, attempts or assessments
+    changed_at = models.DateTimeField(default=timezone.now)
+    refreshed_at = models.DateTimeField(null=True, blank=True)
+
+    @property
+    def is_stale(self):
+        return self.refreshed_at is None or self.changed_at > self.refreshed_at
+
+    @property
+    def stale_since(self):
+        # The summary shows the course as of refreshed_at; changed_at only
+        # holds the latest change since
+        return self.refreshed_at if self.is_stale else None
+
+    def __str__(self):
+        return f"Summary of {self.course_id}"
+
+class AssessmentSummary(models.Model):
+    assessment = models.OneToOneField(Assessment, on_delete=models.CASCADE, primary_key=True, related_name='analytics_summary')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='assessment_summaries')
+    attempts = models.IntegerField(default=0)
+    students = models.IntegerField(default=0)
+    average_score = models.FloatField(default=0) # percentage
+
+    def __str__(self):
+        return f"Summary of assessment {self.assessment_id}"
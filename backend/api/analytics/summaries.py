@@ -0,0 +1,149 @@
+"""
+Incrementally refreshed course analytics.
+
+Dashboards read one CourseSummary row and the course's AssessmentSummary rows,
+so a request costs the same for ten students or ten thousand. Everything that
+writes a course's Progress rows, attempts or assessments stamps the summary's
+``changed_at`` (bulk writers call course_changed_bulk, model saves go through
+the signal receivers wired in AnalyticsConfig.ready). refresh_changed then
+recomputes only the courses changed since their last refresh, each with a few
+aggregate queries. It runs from ``manage.py refresh_analytics --loop``;
+dashboards serve a stale summary as it is, with the time it went stale. A
+request computes one inline only for a course never summarized, or as a
+fallback when the summary has been stale for longer than
+ANALYTICS_MAX_STALENESS (the loop is not running or falling behind).
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Count, F, Q
+from django.utils import timezone
+
+from .models import AssessmentSummary, CourseSummary
+
+logger = logging.getLogger(__name__)
+
+COMPLETION_BUCKETS = 10
+
+
+def get_max_staleness():
+    return getattr(settings, 'ANALYTICS_MAX_STALENESS', 3600)
+
+
+def get_time_buckets():
+    # Lower edges in minutes; the last bucket is open-ended
+    return getattr(settings, 'ANALYTICS_TIME_BUCKETS', [0, 15, 30, 60, 120, 240, 480])
+
+
+def course_changed_bulk(course_ids):
+    CourseSummary.objects.filter(course_id__in=set(course_ids)).update(changed_at=timezone.now())
+
+
+def course_changed(sender, instance, **kwargs):
+    course_changed_bulk([instance.course_id])
+
+
+def _completion_ranges():
+    width = 100 // COMPLETION_BUCKETS
+    for index in range(COMPLETION_BUCKETS):
+        low = index * width
+        last = index == COMPLETION_BUCKETS - 1
+        condition = Q(completion__gte=low) if last else Q(completion__gte=low, completion__lt=low + width)
+        yield f"{low}-{low + width}", condition
+
+
+def _time_ranges():
+    edges = get_time_buckets()
+    for low, high in zip(edges, edges[1:] + [None]):
+        if high is None:
+            yield f"{low}+", Q(time_spent__gte=low)
+        else:
+            yield f"{low}-{high}", Q(time_spent__gte=low, time_spent__lt=high)
+
+
+def refresh_course(course_id):
+    """Recomputes and stores the summaries of one course."""
+    from api.assessments.models import Assessment, Attempt
+    from api.progress.models import Progress
+
+    # Taken first, so writes during the refresh leave the summary stale
+    started = timezone.now()
+    completion = list(_completion_ranges())
+    time = list(_time_ranges())
+    buckets = {f'c{index}': Count('pk', filter=condition) for index, (_, condition) in enumerate(completion)}
+    buckets.update({f't{index}': Count('pk', filter=condition) for index, (_, condition) in enumerate(time)})
+    totals = Progress.objects.filter(course_id=course_id).with_completion().aggregate(
+        enrollment=Count('pk'),
+        average_completion=Avg('completion'),
+        **buckets,
+    )
+    scores = {
+        row['assessment_id']: row
+        for row in Attempt.objects.filter(assessment__course_id=course_id)
+        .values('assessment_id')
+        .annotate(attempts=Count('pk'), students=Count('user', distinct=True), average_score=Avg('percentage'))
+    }
+
+    values = {
+        'enrollment': totals['enrollment'],
+        'average_completion': round(totals['average_completion'] or 0, 1),
+        'completion_histogram': [
+            {"range": label, "students": totals[f'c{index}']} for index, (label, _) in enumerate(completion)
+        ],
+        'time_histogram': [
+            {"range": label, "students": totals[f't{index}']} for index, (label, _) in enumerate(time)
+        ],
+        'refreshed_at': started,
+    }
+    with transaction.atomic():
+        summary, _ = CourseSummary.objects.update_or_create(
+            course_id=course_id, defaults=values, create_defaults={**values, 'changed_at': started},
+        )
+        AssessmentSummary.objects.filter(course_id=course_id).delete()
+        AssessmentSummary.objects.bulk_create([
+            AssessmentSummary(
+                assessment_id=assessment_id,
+                course_id=course_id,
+                attempts=scores.get(assessment_id, {}).get('attempts', 0),
+                students=scores.get(assessment_id, {}).get('students', 0),
+                average_score=round(scores.get(assessment_id, {}).get('average_score') or 0, 1),
+            )
+            for assessment_id in Assessment.objects.filter(course_id=course_id).values_list('pk', flat=True)
+        ])
+    return summary
+
+
+def refresh_changed():
+    """Refreshes every course changed since its last refresh. Returns the count."""
+    from api.courses.models import Course
+
+    CourseSummary.objects.bulk_create(
+        [CourseSummary(course_id=pk) for pk in Course.objects.filter(analytics_summary__isnull=True).values_list('pk', flat=True)],
+        ignore_conflicts=True,
+    )
+    changed = CourseSummary.objects.filter(
+        Q(refreshed_at__isnull=True) | Q(changed_at__gt=F('refreshed_at'))
+    ).values_list('course_id', flat=True)
+    refreshed = 0
+    for course_id in list(changed):
+        refresh_course(course_id)
+        refreshed += 1
+    return refreshed
+
+
+def get_summary(course):
+    """
+    The course's summary, stale or not (see ``stale_since``). It is computed
+    inline only if missing or stale for longer than ANALYTICS_MAX_STALENESS
+    seconds, which refresh_analytics --loop never lets happen.
+    """
+    summary = CourseSummary.objects.filter(course=course).first()
+    if summary is None or summary.refreshed_at is None:
+        return refresh_course(course.pk)
+    if summary.is_stale and summary.refreshed_at < timezone.now() - timedelta(seconds=get_max_staleness()):
+        logger.warning("Analytics summary of course %s stale since %s; is refresh_analytics --loop running?",
+                       course.pk, summary.refreshed_at)
+        return refresh_course(course.pk)
+    return summary
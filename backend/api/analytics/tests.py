@@ -0,0 +1,101 @@
+from io import StringIO
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import User
+from rest_framework.test import APIClient
+from rest_framework import status
+from api.assessments.models import Assessment, Attempt
+from api.authapi.models import Profile
+from api.courses.models import Course
+from api.progress.models import Progress
+from api.progress.write_behind import record_attempts
+from .models import CourseSummary
+
+@override_settings(PROGRESS_WRITE_BEHIND_INTERVAL=0)
+class CourseAnalyticsTests(TestCase):
+    def setUp(self):
+        self.instructor = User.objects.create_user(username='teacher', password='password')
+        Profile.objects.create(user=self.instructor, role='instructor')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.instructor)
+        self.course = Course.objects.create(title="Python", description="", instructor=self.instructor)
+        self.url = f'/api/analytics/courses/{self.course.id}/'
+
+        self.quiz = Assessment.objects.create(course=self.course, title="Quiz", description="")
+        for index, (done, minutes) in enumerate([(0, 5), (2, 20), (4, 45), (4, 500)]):
+            student = User.objects.create_user(username=f'student{index}')
+            Progress.objects.create(user=student, course=self.course, lessons_completed=done, total_lessons=4,
+                                    time_spent=minutes)
+            if index:
+                Attempt.objects.create(user=student, assessment=self.quiz, percentage=25.0 * index)
+
+    def test_course_analytics(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['enrollment'], 4)
+        completion = {bucket['range']: bucket['students'] for bucket in response.data['completion_distribution']}
+        self.assertEqual((completion['0-10'], completion['50-60'], completion['90-100']), (1, 1, 2))
+        time = {bucket['range']: bucket['students'] for bucket in response.data['time_on_task']}
+        self.assertEqual((time['0-15'], time['15-30'], time['30-60'], time['480+']), (1, 1, 1, 1))
+        self.assertEqual(response.data['assessments'], [
+            {"assessment": self.quiz.id, "title": "Quiz", "attempts": 3, "students": 3, "average_score": 50.0},
+        ])
+        self.assertFalse(response.data['stale'])
+        self.assertIsNotNone(response.data['refreshed_at'])
+
+    def test_served_from_summary_until_refreshed(self):
+        self.client.get(self.url)
+        # Reading a fresh summary costs the same however many students there are
+        with self.assertNumQueries(3):
+            self.client.get(self.url)
+
+        student = User.objects.create_user(username='late')
+        Progress.objects.create(user=student, course=self.course)
+        response = self.client.get(self.url)
+        self.assertTrue(response.data['stale'])
+        self.assertEqual(response.data['enrollment'], 4)
+
+        out = StringIO()
+        call_command('refresh_analytics', stdout=out)
+        self.assertIn("Refreshed 1 course(s)", out.getvalue())
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['enrollment'], 5)
+        self.assertFalse(response.data['stale'])
+
+        self.assertIsNone(response.data['stale_since'])
+
+        # Within ANALYTICS_MAX_STALENESS requests never recompute a summary
+        record_attempts([Attempt.objects.create(user=student, assessment=self.quiz, percentage=0)])
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data['assessments'][0]['attempts'], 3)
+        self.assertEqual(response.data['stale_since'], response.data['refreshed_at'])
+        call_command('refresh_analytics', stdout=StringIO())
+        self.assertEqual(self.client.get(self.url).data['assessments'][0]['attempts'], 4)
+
+    def test_refreshed_inline_past_max_staleness(self):
+        self.client.get(self.url)
+        record_attempts([Attempt.objects.create(user=User.objects.get(username='student0'), assessment=self.quiz, percentage=0)])
+        self.assertTrue(self.client.get(self.url).data['stale'])
+
+        # Without refresh_analytics running, requests fall back to refreshing
+        with override_settings(ANALYTICS_MAX_STALENESS=0), self.assertLogs('api.analytics.summaries', 'WARNING'):
+            response = self.client.get(self.url)
+        self.assertFalse(response.data['stale'])
+        self.assertIsNone(response.data['stale_since'])
+        self.assertEqual(response.data['assessments'][0]['attempts'], 4)
+
+    def test_submissions_mark_summary_changed(self):
+        self.client.get(self.url)
+        student = User.objects.get(username='student0')
+        self.client.force_authenticate(user=student)
+        self.client.post(f'/api/assessments/{self.quiz.id}/submit/', {"answers": {}}, format='json')
+        self.assertTrue(CourseSummary.objects.get(course=self.course).is_stale)
+
+    def test_only_course_instructor(self):
+        other = User.objects.create_user(username='other')
+        Profile.objects.create(user=other, role='instructor')
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_authenticate(user=User.objects.get(username='student0'))
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN)
@@ -0,0 +1,6 @@
+from django.urls import path
+from .views import CourseAnalyticsView
+
+urlpatterns = [
+    path('courses/<int:course_id>/', CourseAnalyticsView.as_view(), name='course-analytics'),
+]
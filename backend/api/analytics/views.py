@@ -0,0 +1,49 @@
+from django.shortcuts import get_object_or_404
+from rest_framework import permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from api.courses.models import Course
+from api.permissions import is_instructor
+from .models import AssessmentSummary
+from .summaries import get_summary
+
+class CourseAnalyticsView(APIView):
+    """
+    Enrollment, completion distribution, average score per assessment and
+    time on task for one course, served from the precomputed summaries.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, course_id):
+        course = get_object_or_404(Course, pk=course_id)
+        user = request.user
+        if not (user.is_staff or (is_instructor(user) and (course.instructor_id == user.pk or user.profile.role == 'admin'))):
+            return Response({"error": "Only the course instructor can view its analytics"}, status=status.HTTP_403_FORBIDDEN)
+
+        summary = get_summary(course)
+        assessments = (
+            AssessmentSummary.objects.filter(course=course)
+            .order_by('assessment_id')
+            .values('assessment_id', 'assessment__title', 'attempts', 'students', 'average_score')
+        )
+        return Response({
+            "course": course.pk,
+            "title": course.title,
+            "enrollment": summary.enrollment,
+            "average_completion": summary.average_completion,
+            "completion_distribution": summary.completion_histogram,
+            "assessments": [
+                {
+                    "assessment": row['assessment_id'],
+                    "title": row['assessment__title'],
+                    "attempts": row['attempts'],
+                    "students": row['students'],
+                    "average_score": row['average_score'],
+                }
+                for row in assessments
+            ],
+            "time_on_task": summary.time_histogram,
+            "refreshed_at": summary.refreshed_at,
+            "stale": summary.is_stale,
+            "stale_since": summary.stale_since,
+        })
@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class AssessmentsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api.assessments'
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save
+        from .grading import invalidate_answer_key
+        from .models import Assessment
+
+        post_save.connect(invalidate_answer_key, sender=Assessment, dispatch_uid='assessment_answer_key_save')
+        post_delete.connect(invalidate_answer_key, sender=Assessment, dispatch_uid='assessment_answer_key_delete')
@@ -0,0 +1,62 @@
+"""
+Per-student question draws for assessments backed by a question bank.
+
+An assessment with draw_count > 0 gives each student draw_count random bank
+questions (see QuestionQuerySet.sample) instead of its fixed ``questions``.
+The ids of the drawn questions go to the client in a signed draw token, which
+comes back with the submission. Grading therefore keeps no per-student state,
+and a student cannot swap in questions they were not given.
+"""
+from django.conf import settings
+from django.core import signing
+
+from .grading import AnswerKey, get_answer_key
+from .models import Question
+
+SALT = 'api.assessments.draw'
+
+
+class InvalidDraw(Exception):
+    pass
+
+
+def get_max_age():
+    # Long enough for submissions synced after a few days offline
+    return getattr(settings, 'ASSESSMENT_DRAW_MAX_AGE', 7 * 24 * 3600)
+
+
+def draw_questions(assessment, user):
+    """Returns the drawn questions and the token to submit them with."""
+    questions = assessment.draw_pool().sample(assessment.draw_count)
+    token = signing.dumps(
+        {'a': assessment.pk, 'u': user.pk, 'q': [question.pk for question in questions]},
+        salt=SALT,
+        compress=True,
+    )
+    return questions, token
+
+
+def load_draw(assessment, user, token):
+    """The drawn questions in the order they were shown, from a draw token."""
+    try:
+        data = signing.loads(token or '', salt=SALT, max_age=get_max_age())
+    except signing.BadSignature:
+        raise InvalidDraw("Invalid or expired draw_token")
+    if data.get('a') != assessment.pk or data.get('u') != user.pk:
+        raise InvalidDraw("draw_token belongs to another assessment or user")
+
+    ids = data.get('q') or []
+    questions = Question.objects.in_bulk(ids)
+    if len(questions) != len(set(ids)):
+        raise InvalidDraw("Some drawn questions no longer exist; start the assessment again")
+    return [questions[pk] for pk in ids]
+
+
+def get_submission_key(assessment, user, token=None):
+    """
+    The answer key to grade a submission with: the cached key of the fixed
+    questions, or one built from the questions in the draw token.
+    """
+    if not assessment.is_drawn:
+        return get_answer_key(assessment)
+    return AnswerKey([question.as_dict() for question in load_draw(assessment, user, token)])
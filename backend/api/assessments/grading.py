@@ -0,0 +1,121 @@
+"""
+Compiled answer keys for grading assessment submissions.
+
+Grading used to walk the whole ``questions`` JSON for every submission. During
+an exam the same assessment is graded thousands of times, so we compile it
+once into an AnswerKey (a compact array of correct option indices plus the
+question metadata the response needs) and keep it in process. Keys are stored
+per (assessment id, updated_at), so a save in any process makes older keys
+unreachable; the post_save/post_delete receivers also drop them locally.
+"""
+import operator
+import threading
+from array import array
+from collections import OrderedDict
+
+from django.conf import settings
+
+# Stored for questions without a usable answer, and for unanswered or invalid
+# submissions. They differ so the two never compare equal.
+NO_KEY = -1
+NO_ANSWER = -2
+
+
+def as_index(value, missing):
+    """An option index from stored or submitted JSON (``1``, ``"1"``), else ``missing``."""
+    if value is None or isinstance(value, bool):
+        return missing
+    try:
+        index = int(value)
+    except (TypeError, ValueError):
+        return missing
+    return index if index >= 0 else missing
+
+
+class AnswerKey:
+    __slots__ = ('answers', 'prompts', 'correct_answers', 'slots')
+
+    def __init__(self, questions):
+        self.answers = array('q', (as_index(q.get('answer'), NO_KEY) for q in questions))
+        self.prompts = tuple(q.get('question') for q in questions)
+        self.correct_answers = tuple(q.get('answer') for q in questions)
+        # Submissions key answers by question index as a string.
+        self.slots = tuple(str(idx) for idx in range(len(questions)))
+
+    def __len__(self):
+        return len(self.answers)
+
+    def grade(self, user_answers):
+        raw = [user_answers.get(slot) for slot in self.slots]
+        submitted = array('q', (as_index(value, NO_ANSWER) for value in raw))
+        # One element-wise comparison over the two arrays.
+        matches = list(map(operator.eq, self.answers, submitted))
+        score = sum(matches)
+        total = len(self.answers)
+        results = [
+            {
+                "question": prompt,
+                "correct": is_correct,
+                "user_answer": user_answer,
+                "correct_answer": correct_answer,
+            }
+            for prompt, is_correct, user_answer, correct_answer
+            in zip(self.prompts, matches, raw, self.correct_answers)
+        ]
+        return {
+            "score": score,
+            "total": total,
+            "percentage": (score / total) * 100 if total > 0 else 0,
+            "results": results,
+        }
+
+
+class AnswerKeyCache:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, assessment, load_questions):
+        version = (assessment.pk, assessment.updated_at)
+        with self._lock:
+            entry = self._entries.get(assessment.pk)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(assessment.pk)
+                return entry[1]
+
+        key = AnswerKey(load_questions())
+        with self._lock:
+            self._entries[assessment.pk] = (version, key)
+            self._entries.move_to_end(assessment.pk)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return key
+
+    def invalidate(self, pk):
+        with self._lock:
+            self._entries.pop(pk, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+answer_keys = AnswerKeyCache(getattr(settings, 'ASSESSMENT_ANSWER_KEY_CACHE_SIZE', 512))
+
+
+def get_answer_key(assessment):
+    """
+    Returns the compiled key for ``assessment``, which may have been loaded
+    with ``questions`` deferred; the JSON is only read on a cache miss.
+    """
+    def load_questions():
+        if 'questions' in assessment.get_deferred_fields():
+            return type(assessment).objects.values_list('questions', flat=True).get(pk=assessment.pk)
+        return assessment.questions
+
+    return answer_keys.get(assessment, load_questions)
+
+
+def invalidate_answer_key(sender, instance, **kwargs):
+    answer_keys.invalidate(instance.pk)
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("assessments", "0003_attempt"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="attempt",
+            index=models.Index(
+                fields=["user", "assessment"], name="attempt_user_assessment_idx"
+            ),
+        ),
+    ]
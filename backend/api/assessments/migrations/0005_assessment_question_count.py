@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:41
+
+from django.db import migrations, models
+
+
+def count_questions(apps, schema_editor):
+    Assessment = apps.get_model("assessments", "Assessment")
+    for assessment in Assessment.objects.only("id", "questions").iterator():
+        Assessment.objects.filter(pk=assessment.pk).update(
+            question_count=len(assessment.questions or [])
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("assessments", "0004_attempt_user_assessment_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="assessment",
+            name="question_count",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_questions, migrations.RunPython.noop),
+    ]
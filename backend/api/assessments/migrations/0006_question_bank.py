@@ -0,0 +1,140 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:44
+
+import api.assessments.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("assessments", "0005_assessment_question_count"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="QuestionBank",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("course_id", models.CharField(blank=True, max_length=255)),
+                ("title", models.CharField(max_length=255)),
+                ("description", models.TextField(blank=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="assessment",
+            name="draw_count",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="assessment",
+            name="draw_topic",
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name="assessment",
+            name="bank",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="assessments",
+                to="assessments.questionbank",
+            ),
+        ),
+        migrations.CreateModel(
+            name="Question",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("order", models.IntegerField(default=0)),
+                ("text", models.TextField()),
+                ("options", models.JSONField(default=list)),
+                ("answer", models.IntegerField(blank=True, null=True)),
+                ("topic", models.CharField(blank=True, max_length=100)),
+                (
+                    "difficulty",
+                    models.CharField(
+                        choices=[
+                            ("easy", "Easy"),
+                            ("medium", "Medium"),
+                            ("hard", "Hard"),
+                        ],
+                        default="medium",
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "sample_key",
+                    models.FloatField(
+                        default=api.assessments.models.random_sample_key, editable=False
+                    ),
+                ),
+                (
+                    "assessment",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="question_rows",
+                        to="assessments.assessment",
+                    ),
+                ),
+                (
+                    "bank",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="questions",
+                        to="assessments.questionbank",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["order", "id"],
+                "indexes": [
+                    models.Index(
+                        fields=["assessment", "order"], name="question_assessment_idx"
+                    ),
+                    models.Index(
+                        fields=["topic", "sample_key"], name="question_topic_sample_idx"
+                    ),
+                    models.Index(
+                        fields=["topic", "difficulty", "sample_key"],
+                        name="question_difficulty_sample_idx",
+                    ),
+                    models.Index(
+                        fields=["bank", "topic", "sample_key"],
+                        name="question_bank_sample_idx",
+                    ),
+                ],
+                "constraints": [
+                    models.CheckConstraint(
+                        condition=models.Q(
+                            ("assessment__isnull", False),
+                            ("bank__isnull", False),
+                            _connector="OR",
+                        ),
+                        name="question_has_owner",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:46
+
+import random
+
+from django.db import migrations
+
+DIFFICULTIES = {"easy", "medium", "hard"}
+
+
+def copy_questions(apps, schema_editor):
+    Assessment = apps.get_model("assessments", "Assessment")
+    Question = apps.get_model("assessments", "Question")
+    batch = []
+    for assessment in Assessment.objects.only("id", "questions").iterator():
+        for index, data in enumerate(assessment.questions or []):
+            if not isinstance(data, dict):
+                continue
+            answer = data.get("answer")
+            difficulty = data.get("difficulty")
+            batch.append(
+                Question(
+                    assessment_id=assessment.pk,
+                    order=index,
+                    text=str(data.get("question") or ""),
+                    options=data.get("options") or [],
+                    answer=(
+                        answer
+                        if isinstance(answer, int) and not isinstance(answer, bool)
+                        else None
+                    ),
+                    topic=str(data.get("topic") or "")[:100],
+                    difficulty=difficulty if difficulty in DIFFICULTIES else "medium",
+                    sample_key=random.random(),
+                )
+            )
+        if len(batch) >= 1000:
+            Question.objects.bulk_create(batch)
+            batch = []
+    Question.objects.bulk_create(batch)
+
+
+def delete_questions(apps, schema_editor):
+    Question = apps.get_model("assessments", "Question")
+    Question.objects.filter(assessment__isnull=False).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("assessments", "0006_question_bank"),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_questions, delete_questions),
+    ]
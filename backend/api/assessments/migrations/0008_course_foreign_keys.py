@@ -0,0 +1,132 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def link_courses(apps, schema_editor):
+    """
+    Points every assessment and bank at its Course. Assessments hold
+    authored content, so one naming a missing course stops the migration;
+    banks just become shared.
+    """
+    Course = apps.get_model("courses", "Course")
+    Assessment = apps.get_model("assessments", "Assessment")
+    QuestionBank = apps.get_model("assessments", "QuestionBank")
+    courses = {str(pk): pk for pk in Course.objects.values_list("pk", flat=True)}
+
+    assessments, orphans = [], []
+    for assessment in Assessment.objects.only("id", "course_id").iterator():
+        course = courses.get(assessment.course_id.strip())
+        if course is None:
+            orphans.append(assessment.pk)
+            continue
+        assessment.course_ref_id = course
+        assessments.append(assessment)
+    if orphans:
+        raise RuntimeError(
+            "Assessments %s name courses that do not exist; fix their course_id "
+            "or delete them before migrating." % sorted(orphans)
+        )
+    Assessment.objects.bulk_update(assessments, ["course_ref"], batch_size=1000)
+
+    banks = []
+    for bank in QuestionBank.objects.exclude(course_id="").iterator():
+        bank.course_ref_id = courses.get(bank.course_id.strip())
+        banks.append(bank)
+    QuestionBank.objects.bulk_update(banks, ["course_ref"], batch_size=1000)
+
+
+def unlink_courses(apps, schema_editor):
+    """Restores course_id from the foreign keys; shared banks get an empty one."""
+    Assessment = apps.get_model("assessments", "Assessment")
+    QuestionBank = apps.get_model("assessments", "QuestionBank")
+    assessments = list(Assessment.objects.only("id", "course_ref_id"))
+    for assessment in assessments:
+        assessment.course_id = str(assessment.course_ref_id)
+    Assessment.objects.bulk_update(assessments, ["course_id"], batch_size=1000)
+    banks = list(QuestionBank.objects.only("id", "course_ref_id"))
+    for bank in banks:
+        bank.course_id = str(bank.course_ref_id) if bank.course_ref_id else ""
+    QuestionBank.objects.bulk_update(banks, ["course_id"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("assessments", "0007_copy_questions"),
+        ("courses", "0003_executionjob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="assessment",
+            name="course_ref",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to="courses.course",
+            ),
+        ),
+        migrations.AddField(
+            model_name="questionbank",
+            name="course_ref",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to="courses.course",
+            ),
+        ),
+        migrations.RunPython(link_courses, unlink_courses),
+        # Defaults let the removals be reversed, so unlink_courses can run
+        migrations.AlterField(
+            model_name="assessment",
+            name="course_id",
+            field=models.CharField(default="", max_length=255),
+        ),
+        migrations.AlterField(
+            model_name="questionbank",
+            name="course_id",
+            field=models.CharField(blank=True, default="", max_length=255),
+        ),
+        migrations.RemoveField(
+            model_name="assessment",
+            name="course_id",
+        ),
+        migrations.RemoveField(
+            model_name="questionbank",
+            name="course_id",
+        ),
+        migrations.RenameField(
+            model_name="assessment",
+            old_name="course_ref",
+            new_name="course",
+        ),
+        migrations.RenameField(
+            model_name="questionbank",
+            old_name="course_ref",
+            new_name="course",
+        ),
+        migrations.AlterField(
+            model_name="assessment",
+            name="course",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="assessments",
+                to="courses.course",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="questionbank",
+            name="course",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="question_banks",
+                to="courses.course",
+            ),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:29
+
+from django.db import migrations, models
+
+
+def as_index(value):
+    # Same coercion as grading.as_index: 1 and "1" are both option 1
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        index = int(value)
+    except (TypeError, ValueError):
+        return None
+    return index if index >= 0 else None
+
+
+def restore_answers(apps, schema_editor):
+    """
+    Copies answers stored as strings ("0") in ``Assessment.questions``, which
+    0007_copy_questions turned into None, onto their question rows.
+    """
+    Question = apps.get_model("assessments", "Question")
+    fixed = []
+    rows = Question.objects.filter(assessment__isnull=False, answer__isnull=True).select_related("assessment")
+    for question in rows.iterator(chunk_size=1000):
+        data = question.assessment.questions or []
+        if question.order < len(data) and isinstance(data[question.order], dict):
+            question.answer = as_index(data[question.order].get("answer"))
+            if question.answer is not None:
+                fixed.append(question)
+    Question.objects.bulk_update(fixed, ["answer"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("assessments", "0008_course_foreign_keys"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="question",
+            index=models.Index(
+                condition=models.Q(("bank__isnull", False)),
+                fields=["sample_key"],
+                name="question_pool_sample_idx",
+            ),
+        ),
+        migrations.RunPython(restore_answers, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,29 @@
-from django.db import models
+from django.db import models, transaction
+from django.contrib.auth.models import User
+from django.utils import timezone
 import json
+import random
+from api.courses.models import Course
+from .grading import as_index
+
+def random_sample_key():
+    return random.random()
+
+class QuestionBank(models.Model):
+    """
+    A pool of reusable questions that assessments can draw from.
+    """
+    # Null for banks shared between courses
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, null=True, blank=True, related_name='question_banks')
+    title = models.CharField(max_length=255)
+    description = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.title
 
 class Assessment(models.Model):
-    course_id = models.CharField(max_length=255)
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='assessments')
     title = models.CharField(max_length=255)
     description = models.TextField()
     time_limit = models.IntegerField(default=0) # in minutes
@@ -11,6 +32,188 @@ class Assessment(models.Model):
     # Store questions as JSON for simplicity given the frontend type structure
     # Alternatively could be a separate model
     questions = models.JSONField(default=list)
+    # Kept in sync on save so lists can show it without loading questions
+    question_count = models.IntegerField(default=0, editable=False)
+    # Versions the compiled answer key cached in api/assessments/grading.py
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # With draw_count > 0 every student gets draw_count random questions from
+    # the bank (or from all banks), optionally limited to draw_topic, instead
+    # of ``questions``. See api/assessments/draws.py.
+    bank = models.ForeignKey(QuestionBank, on_delete=models.SET_NULL, null=True, blank=True, related_name='assessments')
+    draw_topic = models.CharField(max_length=100, blank=True)
+    draw_count = models.IntegerField(default=0)
+
+    @property
+    def is_drawn(self):
+        return self.draw_count > 0
+
+    def save(self, *args, **kwargs):
+        self.question_count = self.draw_count if self.is_drawn else len(self.questions or [])
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'questions', 'draw_count'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'question_count'}
+        sync_questions = (
+            'questions' not in self.get_deferred_fields()
+            and (update_fields is None or 'questions' in update_fields)
+        )
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if sync_questions:
+                Question.objects.sync_assessment(self)
+
+    def draw_pool(self):
+        """Bank questions this assessment draws from."""
+        pool = Question.objects.filter(bank__isnull=False)
+        if self.bank_id is not None:
+            pool = pool.filter(bank_id=self.bank_id)
+        if self.draw_topic:
+            pool = pool.filter(topic=self.draw_topic)
+        return pool
+
+    def allows_attempt(self, used):
+        # attempts <= 0 means unlimited
+        return self.attempts <= 0 or used < self.attempts
 
     def __str__(self):
         return self.title
+
+class Attempt(models.Model):
+    """
+    A graded submission. ``idempotency_key`` is set by clients that queue
+    submissions offline so a batch can be synced more than once safely.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='assessment_attempts')
+    assessment = models.ForeignKey(Assessment, on_delete=models.CASCADE, related_name='submissions')
+    idempotency_key = models.CharField(max_length=64, blank=True, null=True)
+    answers = models.JSONField(default=dict)
+    score = models.IntegerField(default=0)
+    total = models.IntegerField(default=0)
+    percentage = models.FloatField(default=0)
+    results = models.JSONField(default=list)
+    submitted_at = models.DateTimeField(default=timezone.now) # client time for offline submissions
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'idempotency_key'], name='unique_attempt_idempotency_key'),
+        ]
+        indexes = [
+            # Attempt limit checks and per-user history
+            models.Index(fields=['user', 'assessment'], name='attempt_user_assessment_idx'),
+        ]
+
+    def as_result(self):
+        return {
+            "score": self.score,
+            "total": self.total,
+            "percentage": self.percentage,
+            "results": self.results,
+        }
+
+    def __str__(self):
+        return f"{self.user.username} - {self.assessment.title}"
+
+class QuestionQuerySet(models.QuerySet):
+    def sample(self, count):
+        """
+        Up to ``count`` random questions from this queryset, in random order.
+
+        Every question carries a uniform random ``sample_key``. Each question is
+        the first one at or after its own random pivot in sample_key order
+        (wrapping around to the start), skipping those already drawn, so a draw
+        is ``count`` single-row index seeks no matter how many questions match,
+        and any combination of questions can come up.
+        """
+        rows = []
+        for _ in range(count):
+            pivot = random.random()
+            remaining = self.exclude(pk__in=[row.pk for row in rows]).order_by('sample_key')
+            row = remaining.filter(sample_key__gte=pivot).first() or remaining.filter(sample_key__lt=pivot).first()
+            if row is None:
+                break
+            rows.append(row)
+        return rows
+
+    def sync_assessment(self, assessment):
+        """
+        Rewrites the rows mirroring ``assessment.questions``, which stays the
+        authoring format for fixed assessments.
+        """
+        self.filter(assessment=assessment).delete()
+        self.bulk_create([
+            Question.from_dict(question, assessment=assessment, order=index)
+            for index, question in enumerate(assessment.questions or [])
+            if isinstance(question, dict)
+        ])
+
+class Question(models.Model):
+    """
+    A single question, owned either by an assessment (a mirror of its
+    ``questions`` JSON) or by a question bank.
+    """
+    DIFFICULTY_CHOICES = [
+        ('easy', 'Easy'),
+        ('medium', 'Medium'),
+        ('hard', 'Hard'),
+    ]
+
+    assessment = models.ForeignKey(Assessment, on_delete=models.CASCADE, null=True, blank=True, related_name='question_rows')
+    bank = models.ForeignKey(QuestionBank, on_delete=models.CASCADE, null=True, blank=True, related_name='questions')
+    order = models.IntegerField(default=0)
+    text = models.TextField()
+    options = models.JSONField(default=list)
+    answer = models.IntegerField(null=True, blank=True) # index into options
+    topic = models.CharField(max_length=100, blank=True)
+    difficulty = models.CharField(max_length=10, choices=DIFFICULTY_CHOICES, default='medium')
+    # Uniform random position used by QuestionQuerySet.sample
+    sample_key = models.FloatField(default=random_sample_key, editable=False)
+
+    objects = QuestionQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['order', 'id']
+        indexes = [
+            models.Index(fields=['assessment', 'order'], name='question_assessment_idx'),
+            models.Index(fields=['topic', 'sample_key'], name='question_topic_sample_idx'),
+            models.Index(fields=['topic', 'difficulty', 'sample_key'], name='question_difficulty_sample_idx'),
+            models.Index(fields=['bank', 'topic', 'sample_key'], name='question_bank_sample_idx'),
+            # Draws from every bank at once
+            models.Index(fields=['sample_key'], name='question_pool_sample_idx', condition=models.Q(bank__isnull=False)),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(assessment__isnull=False) | models.Q(bank__isnull=False),
+                name='question_has_owner',
+            ),
+        ]
+
+    @classmethod
+    def from_dict(cls, data, **kwargs):
+        difficulty = data.get('difficulty')
+        if difficulty not in dict(cls.DIFFICULTY_CHOICES):
+            difficulty = 'medium'
+        return cls(
+            text=str(data.get('question') or ''),
+            options=data.get('options') or [],
+            answer=as_index(data.get('answer'), None),
+            topic=str(data.get('topic') or '')[:100],
+            difficulty=difficulty,
+            **kwargs
+        )
+
+    def as_dict(self, include_answer=True):
+        """The question in the shape used by ``Assessment.questions``."""
+        data = {
+            "id": self.pk,
+            "question": self.text,
+            "options": self.options,
+            "topic": self.topic,
+            "difficulty": self.difficulty,
+        }
+        if include_answer:
+            data["answer"] = self.answer
+        return data
+
+    def __str__(self):
+        return self.text[:50]
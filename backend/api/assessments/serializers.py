@@ -1,7 +1,63 @@
 from rest_framework import serializers
-from .models import Assessment
+from .models import Assessment, Question, QuestionBank
 
 class AssessmentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Assessment
         fields = '__all__'
+        read_only_fields = ('question_count', 'updated_at')
+
+    def validate_draw_count(self, value):
+        if value < 0:
+            raise serializers.ValidationError("Must be zero or more.")
+        return value
+
+class AssessmentListSerializer(serializers.ModelSerializer):
+    """
+    Catalog representation: everything but the questions themselves.
+    """
+    class Meta:
+        model = Assessment
+        exclude = ('questions',)
+
+class StudentAssessmentSerializer(AssessmentSerializer):
+    """
+    Detail representation for students, with the correct answers removed.
+    """
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        data['questions'] = [
+            {key: value for key, value in question.items() if key != 'answer'}
+            if isinstance(question, dict) else question
+            for question in data['questions']
+        ]
+        return data
+
+class SyncSubmissionSerializer(serializers.Serializer):
+    idempotency_key = serializers.CharField(max_length=64)
+    assessment = serializers.IntegerField()
+    answers = serializers.DictField(default=dict)
+    submitted_at = serializers.DateTimeField(required=False)
+    draw_token = serializers.CharField(required=False)
+
+class QuestionBankSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = QuestionBank
+        fields = '__all__'
+
+class QuestionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Question
+        fields = '__all__'
+        read_only_fields = ('assessment',)
+
+    def validate(self, data):
+        if self.instance is not None and self.instance.assessment_id is not None:
+            raise serializers.ValidationError("Questions of an assessment are edited through the assessment.")
+        if data.get('bank', getattr(self.instance, 'bank', None)) is None:
+            raise serializers.ValidationError({"bank": ["This field is required."]})
+        options = data.get('options', getattr(self.instance, 'options', []))
+        answer = data.get('answer', getattr(self.instance, 'answer', None))
+        if answer is not None and not 0 <= answer < len(options):
+            raise serializers.ValidationError({"answer": ["Must be the index of one of the options."]})
+        return data
@@ -0,0 +1,112 @@
+"""
+Bulk sync of submissions queued on a device while it was offline.
+
+A whole day of attempts across many assessments arrives in one request. We
+validate every item on its own, look up all assessments and already-synced
+idempotency keys in one query each, grade against the cached answer keys (or
+the questions in an item's draw token) and insert the new attempts with a
+single bulk_create inside one transaction.
+Re-sending a batch returns the stored results instead of grading again.
+Items beyond an assessment's attempt limit are rejected individually; the
+batch's assessments stay locked from counting attempts until the insert, so
+concurrent requests cannot both take the last attempt.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .draws import InvalidDraw, get_submission_key
+from .models import Assessment, Attempt
+from .serializers import SyncSubmissionSerializer
+from api.progress.write_behind import record_attempts
+
+
+def get_max_batch():
+    return getattr(settings, 'ASSESSMENT_SYNC_MAX_BATCH', 500)
+
+
+def sync_submissions(user, items):
+    """Returns one result dict per item, in the order they were sent."""
+    results = [None] * len(items)
+    valid = []
+    for index, item in enumerate(items):
+        serializer = SyncSubmissionSerializer(data=item)
+        if serializer.is_valid():
+            valid.append((index, serializer.validated_data))
+        else:
+            key = item.get('idempotency_key') if isinstance(item, dict) else None
+            results[index] = {"idempotency_key": key, "status": "error", "errors": serializer.errors}
+
+    with transaction.atomic():
+        # Locked in primary key order, so overlapping batches cannot deadlock, and
+        # taken first so a concurrent sync of the same batch is seen as done
+        assessments = {
+            assessment.pk: assessment
+            for assessment in Assessment.objects.select_for_update().defer('questions')
+            .filter(pk__in={data['assessment'] for _, data in valid}).order_by('pk')
+        }
+        keys = {data['idempotency_key'] for _, data in valid}
+        existing = {
+            attempt.idempotency_key: attempt
+            for attempt in Attempt.objects.filter(user=user, idempotency_key__in=keys)
+        }
+        used = dict(
+            Attempt.objects.filter(user=user, assessment_id__in=assessments)
+            .values_list('assessment_id')
+            .annotate(count=Count('id'))
+        )
+
+        now = timezone.now()
+        created = []
+        seen = set()
+        for index, data in valid:
+            key = data['idempotency_key']
+            if key in existing:
+                results[index] = {"idempotency_key": key, "status": "duplicate", **existing[key].as_result()}
+                continue
+            if key in seen:
+                results[index] = {"idempotency_key": key, "status": "duplicate"}
+                continue
+            assessment = assessments.get(data['assessment'])
+            if assessment is None:
+                results[index] = {"idempotency_key": key, "status": "error", "errors": {"assessment": ["Not found."]}}
+                continue
+            if not assessment.allows_attempt(used.get(assessment.pk, 0)):
+                results[index] = {"idempotency_key": key, "status": "error", "errors": {"assessment": ["No attempts left."]}}
+                continue
+
+            try:
+                answer_key = get_submission_key(assessment, user, data.get('draw_token'))
+            except InvalidDraw as e:
+                results[index] = {"idempotency_key": key, "status": "error", "errors": {"draw_token": [str(e)]}}
+                continue
+
+            seen.add(key)
+            used[assessment.pk] = used.get(assessment.pk, 0) + 1
+            graded = answer_key.grade(data['answers'])
+            created.append(Attempt(
+                user=user,
+                assessment=assessment,
+                idempotency_key=key,
+                answers=data['answers'],
+                score=graded['score'],
+                total=graded['total'],
+                percentage=graded['percentage'],
+                results=graded['results'],
+                # A device clock ahead of ours must not date attempts in the future.
+                submitted_at=min(data.get('submitted_at') or now, now),
+            ))
+            results[index] = {"idempotency_key": key, "status": "graded", **graded}
+
+        # A concurrent sync of the same batch may have inserted some keys
+        # already; those rows are identical, so conflicts are ignored.
+        Attempt.objects.bulk_create(created, ignore_conflicts=True)
+    record_attempts(created)
+
+    # Later copies of a key within the same batch share the first one's result.
+    by_key = {result['idempotency_key']: result for result in results if result and result['status'] == 'graded'}
+    for index, result in enumerate(results):
+        if result['status'] == 'duplicate' and 'score' not in result:
+            results[index] = {**by_key[result['idempotency_key']], "status": "duplicate"}
+    return results
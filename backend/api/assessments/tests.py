@@ -1,19 +1,26 @@
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
 from rest_framework.test import APIClient
 from rest_framework import status
-from .models import Assessment
+from .models import Assessment, Attempt, Question, QuestionBank
+from .grading import answer_keys
 from api.authapi.models import Profile
+from api.courses.models import Course
+from api.progress.models import Progress
 
+@override_settings(PROGRESS_WRITE_BEHIND_INTERVAL=0)
 class AssessmentTests(TestCase):
     def setUp(self):
         self.client = APIClient()
         self.user = User.objects.create_user(username='student', password='password')
         Profile.objects.create(user=self.user, role='student')
         self.client.force_authenticate(user=self.user)
+        self.course = Course.objects.create(title="Python", description="", instructor=self.user)
 
         self.assessment = Assessment.objects.create(
-            course_id="1",
+            course=self.course,
             title="Test Quiz",
             description="Test Description",
             questions=[
@@ -35,6 +42,25 @@ class AssessmentTests(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data['questions']), 2)
 
+    def test_list_omits_questions(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/assessments/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0]['question_count'], 2)
+        self.assertNotIn('questions', response.data[0])
+        self.assertNotIn('"questions"', queries[-1]['sql'])
+
+    def test_detail_hides_answers_from_students(self):
+        response = self.client.get(f'/api/assessments/{self.assessment.id}/')
+        self.assertNotIn('answer', response.data['questions'][0])
+        self.assertEqual(response.data['questions'][0]['options'], ["3", "4", "5"])
+
+        instructor = User.objects.create_user(username='instructor', password='password')
+        Profile.objects.create(user=instructor, role='instructor')
+        self.client.force_authenticate(user=instructor)
+        response = self.client.get(f'/api/assessments/{self.assessment.id}/')
+        self.assertEqual(response.data['questions'][0]['answer'], 1)
+
     def test_submit_assessment(self):
         url = f'/api/assessments/{self.assessment.id}/submit/'
         # User answers: Q1 -> 1 (Correct), Q2 -> 1 (Wrong, correct is 0)
@@ -53,3 +79,172 @@ class AssessmentTests(TestCase):
         results = response.data['results']
         self.assertTrue(results[0]['correct'])
         self.assertFalse(results[1]['correct'])
+
+    def test_answer_key_is_recompiled_after_save(self):
+        self.assessment.attempts = 0
+        self.assessment.save()
+        url = f'/api/assessments/{self.assessment.id}/submit/'
+        data = {"answers": {"0": 1, "1": 0}}
+        self.assertEqual(self.client.post(url, data, format='json').data['score'], 2)
+
+        # Cached key is reused without reading the questions again: load, then
+        # lock, count attempts and insert inside a savepoint, plus four queries
+        # for the Progress flush and one marking the course's analytics
+        # summary changed, inside the flush's savepoint
+        with self.assertNumQueries(13):
+            self.client.post(url, data, format='json')
+
+        self.assessment.questions[1]['answer'] = 1
+        self.assessment.save()
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.data['score'], 1)
+        self.assertEqual(response.data['results'][1]['correct_answer'], 1)
+
+    def test_submit_with_invalid_answers(self):
+        answer_keys.clear()
+        url = f'/api/assessments/{self.assessment.id}/submit/'
+        response = self.client.post(url, {"answers": {"0": "x", "1": None}}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['score'], 0)
+        self.assertEqual(response.data['results'][0]['user_answer'], "x")
+
+    def test_sync_offline_submissions(self):
+        other = Assessment.objects.create(
+            course=self.course, title="Other Quiz", description="",
+            questions=[{"question": "1+1?", "options": ["2", "3"], "answer": 0}]
+        )
+        data = {"submissions": [
+            {"idempotency_key": "a", "assessment": self.assessment.id, "answers": {"0": 1, "1": 0},
+             "submitted_at": "2026-01-01T08:00:00Z"},
+            {"idempotency_key": "b", "assessment": other.id, "answers": {"0": 1}},
+            {"idempotency_key": "c", "assessment": 9999, "answers": {}},
+            {"assessment": other.id},
+            {"idempotency_key": "a", "assessment": self.assessment.id, "answers": {"0": 1, "1": 0}},
+        ]}
+        response = self.client.post('/api/assessments/sync/', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['graded'], response.data['duplicates'], response.data['errors']), (2, 1, 2))
+        results = response.data['results']
+        self.assertEqual(results[0]['score'], 2)
+        self.assertEqual(results[1]['score'], 0)
+        self.assertEqual(results[4]['score'], 2)
+        self.assertEqual(Attempt.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(Attempt.objects.get(idempotency_key="a").submitted_at.year, 2026)
+
+        # Re-sending the batch does not create new attempts
+        response = self.client.post('/api/assessments/sync/', data, format='json')
+        self.assertEqual(response.data['duplicates'], 3)
+        self.assertEqual(response.data['results'][1]['score'], 0)
+        self.assertEqual(Attempt.objects.filter(user=self.user).count(), 2)
+
+    def test_submit_records_attempt_and_progress(self):
+        url = f'/api/assessments/{self.assessment.id}/submit/'
+        response = self.client.post(url, {"answers": {"0": 1}}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['attempts_remaining'], 0)
+
+        attempt = Attempt.objects.get(user=self.user, assessment=self.assessment)
+        self.assertEqual(attempt.score, 1)
+        progress = Progress.objects.get(user=self.user, course=self.course)
+        self.assertEqual(progress.assessments_completed, 1)
+        self.assertEqual(progress.total_assessments, 1)
+
+        # attempts=1 on the assessment
+        response = self.client.post(url, {"answers": {"0": 1}}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(Attempt.objects.count(), 1)
+
+    def test_questions_are_mirrored_to_rows(self):
+        rows = list(Question.objects.filter(assessment=self.assessment))
+        self.assertEqual([(row.order, row.text, row.answer) for row in rows],
+                         [(0, "What is 2+2?", 1), (1, "Capital of France?", 0)])
+
+        self.assessment.questions.append({"question": "3*3?", "options": ["6", "9"], "answer": 1, "topic": "math"})
+        self.assessment.save()
+        rows = list(Question.objects.filter(assessment=self.assessment))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[2].topic, "math")
+
+    def test_sample_questions_from_topic(self):
+        bank = QuestionBank.objects.create(title="Python")
+        Question.objects.bulk_create(
+            [Question(bank=bank, text=f"loop {i}", options=["a", "b"], answer=0, topic="loops") for i in range(30)]
+            + [Question(bank=bank, text=f"other {i}", options=["a", "b"], answer=0, topic="io") for i in range(10)]
+        )
+        loops = Question.objects.filter(topic="loops")
+        for _ in range(5):
+            sample = loops.sample(5)
+            self.assertEqual(len({question.pk for question in sample}), 5)
+            self.assertTrue(all(question.topic == "loops" for question in sample))
+        self.assertEqual(len(loops.sample(50)), 30)
+        # Served from the (topic, sample_key) index, not a scan and sort
+        plan = loops.filter(sample_key__gte=0.5).order_by('sample_key')[:1].explain()
+        self.assertIn('question_topic_sample_idx', plan)
+        plan = Question.objects.filter(bank__isnull=False, sample_key__gte=0.5).order_by('sample_key')[:1].explain()
+        self.assertIn('question_pool_sample_idx', plan)
+
+    def test_sample_is_not_limited_to_contiguous_runs(self):
+        bank = QuestionBank.objects.create(title="Python")
+        Question.objects.bulk_create([Question(bank=bank, text=f"q{i}", topic="loops") for i in range(6)])
+        pool = Question.objects.filter(topic="loops")
+        # A window read from one pivot could only produce 6 of the 15 pairs
+        draws = {frozenset(question.pk for question in pool.sample(2)) for _ in range(200)}
+        self.assertGreater(len(draws), 6)
+
+    def test_string_answers_are_kept(self):
+        self.assertEqual(Question.from_dict({"question": "1+1?", "options": ["2", "3"], "answer": "0"}).answer, 0)
+        self.assertIsNone(Question.from_dict({"question": "1+1?", "answer": "x"}).answer)
+
+    def test_drawn_assessment(self):
+        bank = QuestionBank.objects.create(title="Python")
+        Question.objects.bulk_create([
+            Question(bank=bank, text=f"q{i}", options=["a", "b", "c"], answer=i % 3, topic="loops")
+            for i in range(10)
+        ])
+        drawn = Assessment.objects.create(
+            course=self.course, title="Drawn", description="", attempts=0,
+            bank=bank, draw_topic="loops", draw_count=4,
+        )
+        self.assertEqual(drawn.question_count, 4)
+
+        response = self.client.get(f'/api/assessments/{drawn.id}/')
+        questions = response.data['questions']
+        self.assertEqual(len(questions), 4)
+        self.assertNotIn('answer', questions[0])
+
+        answers = {str(idx): Question.objects.get(pk=q['id']).answer for idx, q in enumerate(questions)}
+        url = f'/api/assessments/{drawn.id}/submit/'
+        response = self.client.post(url, {"answers": answers, "draw_token": response.data['draw_token']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['score'], response.data['total']), (4, 4))
+        self.assertEqual(response.data['results'][0]['question'], questions[0]['question'])
+
+        response = self.client.post(url, {"answers": answers, "draw_token": "forged"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post('/api/assessments/sync/', {"submissions": [
+            {"idempotency_key": "d", "assessment": drawn.id, "answers": answers},
+        ]}, format='json')
+        self.assertIn('draw_token', response.data['results'][0]['errors'])
+
+    def test_question_bank_is_instructor_only(self):
+        response = self.client.get('/api/assessments/questions/')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        instructor = User.objects.create_user(username='teacher', password='password')
+        Profile.objects.create(user=instructor, role='instructor')
+        self.client.force_authenticate(user=instructor)
+        bank = self.client.post('/api/assessments/banks/', {"title": "Python"}, format='json').data
+        response = self.client.post('/api/assessments/questions/', {
+            "bank": bank['id'], "text": "2+2?", "options": ["3", "4"], "answer": 5,
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post('/api/assessments/questions/', {
+            "bank": bank['id'], "text": "2+2?", "options": ["3", "4"], "answer": 1, "topic": "math",
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        response = self.client.get('/api/assessments/questions/sample/?topic=math&count=3')
+        self.assertEqual([question['text'] for question in response.data], ["2+2?"])
+        mirrored = Question.objects.filter(assessment=self.assessment).first()
+        response = self.client.patch(f'/api/assessments/questions/{mirrored.id}/', {"text": "x"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -1,8 +1,11 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import AssessmentViewSet
+from .views import AssessmentViewSet, QuestionBankViewSet, QuestionViewSet
 
 router = DefaultRouter()
+# Registered before the assessments so 'banks/' is not taken for a pk
+router.register(r'banks', QuestionBankViewSet)
+router.register(r'questions', QuestionViewSet)
 router.register(r'', AssessmentViewSet)
 
 urlpatterns = [
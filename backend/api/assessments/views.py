@@ -1,46 +1,138 @@
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from .models import Assessment
-from .serializers import AssessmentSerializer
+from django.db import transaction
+from .models import Assessment, Attempt, Question, QuestionBank
+from api.progress.write_behind import record_attempts
+from .serializers import (
+    AssessmentSerializer, AssessmentListSerializer, StudentAssessmentSerializer,
+    QuestionBankSerializer, QuestionSerializer,
+)
+from api.permissions import IsInstructor, is_instructor
+from .draws import InvalidDraw, draw_questions, get_submission_key
+from .sync import get_max_batch, sync_submissions
 
 class AssessmentViewSet(viewsets.ModelViewSet):
     queryset = Assessment.objects.all()
     serializer_class = AssessmentSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'submit'):
+            # Lists show question_count and grading only needs the compiled
+            # answer key, so neither reads the JSON blob.
+            queryset = queryset.defer('questions')
+        return queryset
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return AssessmentListSerializer
+        if self.action == 'retrieve' and not is_instructor(self.request.user):
+            return StudentAssessmentSerializer
+        return AssessmentSerializer
+
+    def retrieve(self, request, *args, **kwargs):
+        assessment = self.get_object()
+        data = self.get_serializer(assessment).data
+        if assessment.is_drawn and not is_instructor(request.user):
+            # A fresh draw per request; the token is sent back with the answers
+            questions, data['draw_token'] = draw_questions(assessment, request.user)
+            data['questions'] = [question.as_dict(include_answer=False) for question in questions]
+        return Response(data)
+
     @action(detail=True, methods=['post'])
     def submit(self, request, pk=None):
         assessment = self.get_object()
         user_answers = request.data.get('answers', {}) # {question_index: selected_option_index}
 
-        score = 0
-        total_questions = len(assessment.questions)
-
-        results = []
+        with transaction.atomic():
+            # Locking the assessment keeps the count true until our attempt exists
+            Assessment.objects.select_for_update().only('pk').get(pk=assessment.pk)
+            used = Attempt.objects.filter(user=request.user, assessment=assessment).count()
+            if not assessment.allows_attempt(used):
+                return Response({"error": "No attempts left for this assessment"}, status=status.HTTP_403_FORBIDDEN)
 
-        for idx, question in enumerate(assessment.questions):
-            correct_answer = question.get('answer') # Assuming 0-indexed integer of correct option
-            user_answer = user_answers.get(str(idx))
+            try:
+                answer_key = get_submission_key(assessment, request.user, request.data.get('draw_token'))
+            except InvalidDraw as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            result = answer_key.grade(user_answers)
 
-            is_correct = False
-            if user_answer is not None and int(user_answer) == int(correct_answer):
-                score += 1
-                is_correct = True
+            attempt = Attempt.objects.create(
+                user=request.user,
+                assessment=assessment,
+                answers=user_answers,
+                score=result['score'],
+                total=result['total'],
+                percentage=result['percentage'],
+                results=result['results'],
+            )
+        # Progress is updated in batches by the write-behind buffer
+        record_attempts([attempt])
 
-            results.append({
-                "question": question.get('question'),
-                "correct": is_correct,
-                "user_answer": user_answer,
-                "correct_answer": correct_answer
-            })
+        result['attempt'] = used + 1
+        result['attempts_remaining'] = None if assessment.attempts <= 0 else assessment.attempts - used - 1
+        return Response(result)
 
-        percentage = (score / total_questions) * 100 if total_questions > 0 else 0
+    @action(detail=False, methods=['post'])
+    def sync(self, request):
+        """
+        Grades a batch of submissions queued offline, possibly across many
+        assessments. Each item carries an idempotency_key, so re-sending a
+        batch is safe.
+        """
+        submissions = request.data.get('submissions')
+        if not isinstance(submissions, list):
+            return Response({"error": "submissions must be a list"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(submissions) > get_max_batch():
+            return Response(
+                {"error": f"At most {get_max_batch()} submissions can be synced at once"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-        # Here we should save the progress to Progress model, but for MVP we return the result
+        results = sync_submissions(request.user, submissions)
         return Response({
-            "score": score,
-            "total": total_questions,
-            "percentage": percentage,
+            "graded": sum(1 for result in results if result['status'] == 'graded'),
+            "duplicates": sum(1 for result in results if result['status'] == 'duplicate'),
+            "errors": sum(1 for result in results if result['status'] == 'error'),
             "results": results
         })
+
+class QuestionBankViewSet(viewsets.ModelViewSet):
+    queryset = QuestionBank.objects.all()
+    serializer_class = QuestionBankSerializer
+    permission_classes = [permissions.IsAuthenticated, IsInstructor]
+
+class QuestionViewSet(viewsets.ModelViewSet):
+    """
+    Bank questions plus read-only mirrors of assessment questions, filterable
+    by bank, assessment, topic and difficulty.
+    """
+    queryset = Question.objects.all()
+    serializer_class = QuestionSerializer
+    permission_classes = [permissions.IsAuthenticated, IsInstructor]
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        params = self.request.query_params
+        for field in ('bank', 'assessment', 'topic', 'difficulty'):
+            if params.get(field):
+                queryset = queryset.filter(**{field: params[field]})
+        return queryset
+
+    @action(detail=False, methods=['get'])
+    def sample(self, request):
+        """
+        Random bank questions, e.g. ?topic=loops&count=10, as an assessment
+        would draw them.
+        """
+        try:
+            count = int(request.query_params.get('count', 10))
+        except ValueError:
+            return Response({"error": "count must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        if not 0 < count <= 100:
+            return Response({"error": "count must be between 1 and 100"}, status=status.HTTP_400_BAD_REQUEST)
+
+        questions = self.get_queryset().filter(bank__isnull=False).sample(count)
+        return Response(self.get_serializer(questions, many=True).data)
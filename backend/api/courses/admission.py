@@ -0,0 +1,146 @@
+"""
+Admission control for synchronous code execution.
+
+Sits in front of ExecuteCodeView, the streaming view and exercise grading. At
+most CODE_EXECUTION_MAX_CONCURRENT runs execute at once in this process and a
+single user may only have CODE_EXECUTION_MAX_PER_USER of them in flight,
+running or queued.
+Requests over the global limit wait in a bounded queue; when the queue is full
+or the wait runs out the caller gets 429 with a Retry-After estimate.
+"""
+import math
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+
+
+class Rejected(Exception):
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    def __init__(self, max_concurrent, max_per_user, max_queue, max_wait):
+        self.max_concurrent = max_concurrent
+        self.max_per_user = max_per_user
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._cond = threading.Condition()
+        self._running = 0
+        self._waiting = 0
+        self._per_user = Counter()
+        # Rolling average of how long an admitted run holds its slot, used
+        # to estimate Retry-After.
+        self._avg_hold = 1.0
+        self._counters = {
+            'admitted': 0,
+            'rejected_user_limit': 0,
+            'rejected_queue_full': 0,
+            'rejected_wait_timeout': 0,
+            'queued': 0,
+            'queue_wait_seconds': 0.0,
+        }
+
+    def retry_after(self):
+        slots = max(self.max_concurrent, 1)
+        return max(1, math.ceil(self._avg_hold * (self._waiting + 1) / slots))
+
+    def acquire(self, key):
+        with self._cond:
+            if self._per_user[key] >= self.max_per_user:
+                self._reject('user_limit')
+            # Counted while queued too, so a user's queued requests cannot all
+            # be admitted together once slots free up
+            self._per_user[key] += 1
+            try:
+                if self._running >= self.max_concurrent:
+                    if self._waiting >= self.max_queue:
+                        self._reject('queue_full')
+                    self._wait()
+            except Rejected:
+                self._forget(key)
+                raise
+            self._running += 1
+            self._counters['admitted'] += 1
+        return time.monotonic()
+
+    def release(self, key, admitted_at):
+        with self._cond:
+            self._running -= 1
+            self._forget(key)
+            self._avg_hold = 0.8 * self._avg_hold + 0.2 * (time.monotonic() - admitted_at)
+            self._cond.notify()
+
+    @contextmanager
+    def admit(self, key):
+        admitted_at = self.acquire(key)
+        try:
+            yield
+        finally:
+            self.release(key, admitted_at)
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._counters)
+            stats.update({
+                'running': self._running,
+                'waiting': self._waiting,
+                'max_concurrent': self.max_concurrent,
+                'max_per_user': self.max_per_user,
+                'max_queue': self.max_queue,
+            })
+        stats['queue_wait_seconds'] = round(stats['queue_wait_seconds'], 3)
+        return stats
+
+    def _wait(self):
+        # Called with the condition held.
+        self._waiting += 1
+        self._counters['queued'] += 1
+        started = time.monotonic()
+        deadline = started + self.max_wait
+        try:
+            while self._running >= self.max_concurrent:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._reject('wait_timeout')
+                self._cond.wait(remaining)
+        finally:
+            self._waiting -= 1
+            self._counters['queue_wait_seconds'] += time.monotonic() - started
+
+    def _forget(self, key):
+        self._per_user[key] -= 1
+        if not self._per_user[key]:
+            del self._per_user[key]
+
+    def _reject(self, reason):
+        self._counters[f'rejected_{reason}'] += 1
+        raise Rejected(reason, self.retry_after())
+
+
+def client_key(request):
+    if request.user.is_authenticated:
+        return f'user:{request.user.pk}'
+    return f"ip:{request.META.get('REMOTE_ADDR', '')}"
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_controller():
+    global _controller
+    with _controller_lock:
+        if _controller is None:
+            _controller = AdmissionController(
+                max_concurrent=getattr(settings, 'CODE_EXECUTION_MAX_CONCURRENT', 4),
+                max_per_user=getattr(settings, 'CODE_EXECUTION_MAX_PER_USER', 2),
+                max_queue=getattr(settings, 'CODE_EXECUTION_MAX_QUEUE', 16),
+                max_wait=getattr(settings, 'CODE_EXECUTION_MAX_QUEUE_WAIT', 10),
+            )
+        return _controller
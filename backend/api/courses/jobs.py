@@ -0,0 +1,229 @@
+"""
+Asynchronous code execution.
+
+With ``async`` set, ExecuteCodeView stores an ExecutionJob and returns at once
+instead of holding a web worker for the whole run. Dispatcher threads claim
+queued jobs from the database and run them on the sandbox pool. The queue
+lives in the database, so no broker is needed and a separate
+``run_execution_jobs`` process can drain it as well.
+
+Claiming is fair between users: the next job goes to the user with the fewest
+jobs running (oldest job first), and nobody gets more than
+CODE_EXECUTION_ASYNC_PER_USER jobs running at once.
+"""
+import logging
+import math
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import close_old_connections, transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+
+from . import admission, sandbox
+from .models import ExecutionJob
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = 1.0
+HOUSEKEEPING_INTERVAL = 60.0
+
+# Notified whenever a job run by this process finishes, so long-polls wake up
+# immediately instead of waiting for their next database check.
+_job_finished = threading.Condition()
+
+
+def get_concurrency():
+    return getattr(settings, 'CODE_EXECUTION_ASYNC_WORKERS', 2)
+
+
+def get_per_user_limit():
+    return getattr(settings, 'CODE_EXECUTION_ASYNC_PER_USER', 1)
+
+
+def get_max_wait():
+    return getattr(settings, 'CODE_EXECUTION_MAX_WAIT', 30)
+
+
+def get_max_queued():
+    return getattr(settings, 'CODE_EXECUTION_ASYNC_MAX_QUEUED', 5)
+
+
+def submit(user, code, stdin=''):
+    """
+    Queues a job for ``user``. Raises admission.Rejected once the user has
+    CODE_EXECUTION_ASYNC_MAX_QUEUED jobs queued or running.
+    """
+    with transaction.atomic():
+        # Locking the user's row serializes their submissions, so two of them
+        # cannot both pass the count
+        User.objects.select_for_update().only('pk').get(pk=user.pk)
+        pending = ExecutionJob.objects.filter(user=user, status__in=('queued', 'running')).count()
+        if pending >= get_max_queued():
+            # The oldest of them finishes within one execution timeout
+            raise admission.Rejected('user_limit', max(1, math.ceil(sandbox.get_timeout())))
+        job = ExecutionJob.objects.create(user=user, code=code, stdin=stdin or '')
+    if get_concurrency() > 0:
+        get_dispatcher().notify()
+    return job
+
+
+def claim_next_job():
+    """
+    Atomically moves the next fair job from queued to running and returns it,
+    or None when nothing can run right now.
+    """
+    limit = get_per_user_limit()
+    running = {
+        row['user']: row['count']
+        for row in ExecutionJob.objects.filter(status='running').values('user').annotate(count=Count('id'))
+    }
+    heads = ExecutionJob.objects.filter(status='queued').values('user').annotate(oldest=Min('created_at'))
+    candidates = [head for head in heads if running.get(head['user'], 0) < limit]
+    candidates.sort(key=lambda head: (running.get(head['user'], 0), head['oldest']))
+
+    for head in candidates:
+        job = ExecutionJob.objects.filter(user_id=head['user'], status='queued').order_by('created_at').first()
+        if job is None:
+            continue
+        # Conditional update so two dispatchers can never claim the same job.
+        claimed = ExecutionJob.objects.filter(pk=job.pk, status='queued').update(
+            status='running', started_at=timezone.now()
+        )
+        if claimed:
+            job.refresh_from_db()
+            return job
+    return None
+
+
+def run_job(job):
+    try:
+        result = sandbox.run_code(job.code, stdin=job.stdin)
+        job.output = sandbox.format_output(result)
+        job.status = 'done'
+    except Exception as e:
+        job.output = f"Error: {str(e)}"
+        job.status = 'failed'
+    job.finished_at = timezone.now()
+    job.save(update_fields=['output', 'status', 'finished_at'])
+    with _job_finished:
+        _job_finished.notify_all()
+    return job
+
+
+def process_next_job():
+    job = claim_next_job()
+    if job is not None:
+        run_job(job)
+    return job
+
+
+def housekeeping():
+    """Requeues jobs orphaned by a dead process and purges old results."""
+    now = timezone.now()
+    stale_after = sandbox.get_timeout() + getattr(settings, 'CODE_EXECUTION_JOB_STALE_AFTER', 60)
+    requeued = ExecutionJob.objects.filter(
+        status='running', started_at__lt=now - timedelta(seconds=stale_after)
+    ).update(status='queued', started_at=None)
+    purged, _ = ExecutionJob.objects.filter(
+        finished_at__lt=now - timedelta(seconds=getattr(settings, 'CODE_EXECUTION_JOB_TTL', 3600))
+    ).delete()
+    return requeued, purged
+
+
+def wait_for(job, wait):
+    deadline = time.monotonic() + min(wait, get_max_wait())
+    while not job.finished:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        with _job_finished:
+            # Also re-check the database now and then in case the job runs in
+            # another process.
+            _job_finished.wait(timeout=min(remaining, 0.5))
+        job.refresh_from_db()
+    return job
+
+
+def stats():
+    counts = dict(ExecutionJob.objects.values_list('status').annotate(count=Count('id')))
+    oldest = ExecutionJob.objects.filter(status='queued').aggregate(oldest=Min('created_at'))['oldest']
+    return {
+        'workers': get_concurrency(),
+        'per_user_limit': get_per_user_limit(),
+        'queued': counts.get('queued', 0),
+        'running': counts.get('running', 0),
+        'done': counts.get('done', 0),
+        'failed': counts.get('failed', 0),
+        'oldest_queued_seconds': (timezone.now() - oldest).total_seconds() if oldest else 0,
+    }
+
+
+class JobDispatcher:
+    def __init__(self, workers):
+        self._wakeup = threading.Condition()
+        self._stopping = False
+        self._last_housekeeping = 0.0
+        self._threads = [
+            threading.Thread(target=self._serve, name=f'execution-jobs-{index}', daemon=True)
+            for index in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def notify(self):
+        with self._wakeup:
+            self._wakeup.notify()
+
+    def stop(self):
+        self._stopping = True
+        with self._wakeup:
+            self._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=5)
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+
+    def _serve(self):
+        while not self._stopping:
+            job = None
+            try:
+                job = process_next_job()
+                if job is None:
+                    self._maybe_housekeep()
+            except Exception:
+                logger.exception("Execution job dispatcher failed")
+            finally:
+                close_old_connections()
+
+            if job is not None:
+                # A finished job may unblock a user who was at their limit.
+                with self._wakeup:
+                    self._wakeup.notify_all()
+            else:
+                with self._wakeup:
+                    self._wakeup.wait(timeout=POLL_INTERVAL)
+
+    def _maybe_housekeep(self):
+        now = time.monotonic()
+        if now - self._last_housekeeping < HOUSEKEEPING_INTERVAL:
+            return
+        self._last_housekeeping = now
+        housekeeping()
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher():
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = JobDispatcher(get_concurrency())
+        return _dispatcher
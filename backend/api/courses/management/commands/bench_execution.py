@@ -0,0 +1,246 @@
+import json
+import os
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler, get_internal_wsgi_application
+
+# Typical student programs, from trivial to runaway.
+CORPUS = {
+    'fast': "print(sum(range(1000)))",
+    'cpu': "total = 0\nfor i in range(1500000):\n    total += i * i\nprint(total)",
+    'print': "for i in range(20000):\n    print('line', i)",
+    'timeout': "while True:\n    pass",
+}
+DEFAULT_MIX = 'fast=60,cpu=20,print=15,timeout=5'
+BENCH_USER_PREFIX = 'bench-execution-'
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in CORPUS:
+            raise CommandError(f"Unknown program '{name}'; choose from {', '.join(CORPUS)}.")
+        try:
+            mix[name] = int(weight or 1)
+        except ValueError:
+            raise CommandError(f"Invalid weight for '{name}': {weight}")
+    return mix
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(latencies):
+    return {
+        'count': len(latencies),
+        'p50_ms': _ms(percentile(latencies, 50)),
+        'p95_ms': _ms(percentile(latencies, 95)),
+        'p99_ms': _ms(percentile(latencies, 99)),
+        'max_ms': _ms(max(latencies) if latencies else None),
+    }
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 1)
+
+
+class HostSampler:
+    """Samples host memory use and process count from /proc until stopped."""
+
+    def __init__(self, interval=0.1):
+        self.interval = interval
+        self.peak_memory = None
+        self.peak_processes = None
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopping.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            memory, processes = self.sample()
+            if memory is not None:
+                self.peak_memory = max(self.peak_memory or 0, memory)
+            if processes is not None:
+                self.peak_processes = max(self.peak_processes or 0, processes)
+            self._stopping.wait(self.interval)
+
+    @staticmethod
+    def sample():
+        try:
+            with open('/proc/meminfo') as meminfo:
+                fields = dict(line.split(':', 1) for line in meminfo)
+            used = int(fields['MemTotal'].split()[0]) - int(fields['MemAvailable'].split()[0])
+            memory = used * 1024
+            processes = sum(1 for entry in os.listdir('/proc') if entry.isdigit())
+        except (OSError, KeyError, ValueError):
+            return None, None
+        return memory, processes
+
+
+class Command(BaseCommand):
+    help = (
+        "Replays a corpus of student programs against POST /api/courses/execute/ at a given "
+        "concurrency and reports throughput, latency percentiles and peak host memory/processes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help="Total number of requests to send.")
+        parser.add_argument('--concurrency', type=int, default=8, help="Requests in flight at once.")
+        parser.add_argument('--mix', default=DEFAULT_MIX,
+                            help=f"Weighted program mix, e.g. '{DEFAULT_MIX}'. Programs: {', '.join(CORPUS)}.")
+        parser.add_argument('--seed', type=int, default=0, help="Seed for the request order.")
+        parser.add_argument('--url', help="Benchmark a running server instead of starting a local one, "
+                                          "e.g. http://127.0.0.1:8000. Requests are sent anonymously.")
+        parser.add_argument('--json', action='store_true', help="Print the report as JSON.")
+
+    def handle(self, *args, **options):
+        mix = parse_mix(options['mix'])
+        rng = random.Random(options['seed'])
+        programs = rng.choices(list(mix), weights=list(mix.values()), k=options['requests'])
+        concurrency = max(options['concurrency'], 1)
+
+        server = users = None
+        tokens = [None] * concurrency
+        if options['url']:
+            base_url = options['url'].rstrip('/')
+        else:
+            server = self._start_server()
+            base_url = f'http://127.0.0.1:{server.server_address[1]}'
+            # One user per client so per-user admission limits apply as they
+            # would in a real lab session.
+            users, tokens = self._create_clients(concurrency)
+
+        try:
+            report = self._run(base_url, programs, concurrency, tokens)
+        finally:
+            if server is not None:
+                server.shutdown()
+                server.server_close()
+            if users:
+                User.objects.filter(pk__in=[user.pk for user in users]).delete()
+
+        report['mix'] = mix
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self._print_report(report)
+
+    def _start_server(self):
+        server = ThreadedWSGIServer(('127.0.0.1', 0), QuietRequestHandler, allow_reuse_address=True)
+        server.set_app(get_internal_wsgi_application())
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+    def _create_clients(self, count):
+        from rest_framework_simplejwt.tokens import RefreshToken
+
+        users = [
+            User.objects.create_user(username=f'{BENCH_USER_PREFIX}{os.getpid()}-{index}')
+            for index in range(count)
+        ]
+        return users, [str(RefreshToken.for_user(user).access_token) for user in users]
+
+    def _run(self, base_url, programs, concurrency, tokens):
+        url = f'{base_url}/api/courses/execute/'
+        latencies = defaultdict(list)
+        statuses = Counter()
+        lock = threading.Lock()
+        slots = threading.local()
+        counter = iter(range(concurrency))
+
+        def send(program):
+            if not hasattr(slots, 'token'):
+                with lock:
+                    slots.token = tokens[next(counter)]
+            request = urllib.request.Request(
+                url,
+                data=json.dumps({'code': CORPUS[program], 'language': 'python'}).encode(),
+                headers={'Content-Type': 'application/json'},
+                method='POST',
+            )
+            if slots.token:
+                request.add_header('Authorization', f'Bearer {slots.token}')
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=60) as response:
+                    response.read()
+                    code = response.status
+            except urllib.error.HTTPError as e:
+                code = e.code
+            except OSError:
+                code = 'error'
+            elapsed = time.perf_counter() - started
+            with lock:
+                statuses[code] += 1
+                if code == 200:
+                    latencies[program].append(elapsed)
+
+        sampler = HostSampler().start()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(send, programs))
+        duration = time.perf_counter() - started
+        sampler.stop()
+
+        all_latencies = [value for values in latencies.values() for value in values]
+        return {
+            'requests': len(programs),
+            'concurrency': concurrency,
+            'duration_s': round(duration, 2),
+            'throughput_rps': round(len(programs) / duration, 2) if duration else None,
+            'statuses': {str(code): count for code, count in sorted(statuses.items(), key=str)},
+            'latency': summarize(all_latencies),
+            'latency_by_program': {program: summarize(values) for program, values in sorted(latencies.items())},
+            'peak_host_memory_mb': round(sampler.peak_memory / 1024 / 1024, 1) if sampler.peak_memory else None,
+            'peak_host_processes': sampler.peak_processes,
+        }
+
+    def _print_report(self, report):
+        write = self.stdout.write
+        write(f"Requests:     {report['requests']} at concurrency {report['concurrency']}")
+        write(f"Mix:          {', '.join(f'{name}={weight}' for name, weight in report['mix'].items())}")
+        write(f"Duration:     {report['duration_s']} s")
+        write(f"Throughput:   {report['throughput_rps']} req/s")
+        write(f"Statuses:     {', '.join(f'{code}: {count}' for code, count in report['statuses'].items())}")
+        write(f"Peak memory:  {report['peak_host_memory_mb']} MB (host)")
+        write(f"Peak procs:   {report['peak_host_processes']} (host)")
+        write("")
+        write(f"{'program':<10}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+        rows = list(report['latency_by_program'].items()) + [('all', report['latency'])]
+        for name, stats in rows:
+            write(
+                f"{name:<10}{stats['count']:>8}{_fmt(stats['p50_ms']):>10}{_fmt(stats['p95_ms']):>10}"
+                f"{_fmt(stats['p99_ms']):>10}{_fmt(stats['max_ms']):>10}"
+            )
+
+
+def _fmt(value):
+    return '-' if value is None else str(value)
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from api.courses import jobs
+
+
+class Command(BaseCommand):
+    help = "Runs queued asynchronous code execution jobs in this process."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=jobs.get_concurrency(),
+                            help="Number of jobs to run concurrently.")
+
+    def handle(self, *args, **options):
+        workers = max(options['workers'], 1)
+        self.stdout.write(f"Running execution jobs with {workers} worker(s). Press CTRL+C to stop.")
+        dispatcher = jobs.JobDispatcher(workers)
+        try:
+            dispatcher.join()
+        except KeyboardInterrupt:
+            dispatcher.stop()
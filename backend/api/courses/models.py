@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+import uuid
 
 class Course(models.Model):
     title = models.CharField(max_length=255)
@@ -21,3 +22,36 @@ class CodingExercise(models.Model):
 
     def __str__(self):
         return self.title
+
+class ExecutionJob(models.Model):
+    """
+    Code submitted for asynchronous execution. Picked up by the dispatcher in
+    api/courses/jobs.py; clients poll execute/{id}/ for the output.
+    """
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='execution_jobs')
+    code = models.TextField()
+    stdin = models.TextField(blank=True, default='')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    output = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'failed')
+
+    def __str__(self):
+        return f"{self.user.username} - {self.status}"
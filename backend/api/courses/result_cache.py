@@ -0,0 +1,178 @@
+"""
+Content-addressed cache for code execution results.
+
+Students and the autograder often run exactly the same program again (the
+unchanged starter code, a re-submitted solution). When
+CODE_EXECUTION_CACHE_ENABLED is on, results are kept in process, keyed by a
+hash of the code, language, stdin and interpreter version, with a TTL and LRU
+eviction once either CODE_EXECUTION_CACHE_SIZE entries or
+CODE_EXECUTION_CACHE_MAX_BYTES of output are stored. Programs that look nondeterministic (clock, randomness, hash or set
+ordering) are never cached, and neither are runs that timed out.
+"""
+import ast
+import copy
+import dataclasses
+import hashlib
+import json
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+NONDETERMINISTIC_MODULES = {'time', 'datetime', 'random', 'secrets', 'uuid', 'calendar', 'zoneinfo', 'timeit'}
+# hash()/id() and set iteration order change between interpreters because of
+# hash randomization.
+NONDETERMINISTIC_NAMES = {'hash', 'id', 'set', 'frozenset'}
+
+
+def is_deterministic(code):
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        # The error message is the same every time.
+        return True
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            if any(alias.name.split('.')[0] in NONDETERMINISTIC_MODULES for alias in node.names):
+                return False
+        elif isinstance(node, ast.ImportFrom):
+            if (node.module or '').split('.')[0] in NONDETERMINISTIC_MODULES:
+                return False
+        elif isinstance(node, ast.Name) and node.id in NONDETERMINISTIC_NAMES:
+            return False
+        elif isinstance(node, (ast.Set, ast.SetComp)):
+            return False
+    return True
+
+
+def make_key(code, language='python', stdin='', **extra):
+    payload = json.dumps(
+        {'code': code, 'language': language, 'stdin': stdin, 'runtime': sys.version, **extra},
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _size(value):
+    """Rough bytes held by a result: the length of every string in it."""
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    if dataclasses.is_dataclass(value):
+        value = vars(value)
+    if isinstance(value, dict):
+        return sum(_size(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(_size(item) for item in value)
+    return 0
+
+
+class ResultCache:
+    def __init__(self, max_entries, ttl, max_bytes=16 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'skipped': 0, 'evictions': 0, 'expired': 0, 'too_large': 0}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                self._remove(key)
+                self._counters['expired'] += 1
+                entry = None
+            if entry is None:
+                self._counters['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counters['hits'] += 1
+            return copy.deepcopy(entry[1])
+
+    def set(self, key, value):
+        size = _size(value)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            # One runaway output must not flush everything else
+            if size > self.max_bytes // 8:
+                self._counters['too_large'] += 1
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, copy.deepcopy(value), size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._counters['evictions'] += 1
+
+    def _remove(self, key):
+        # Called with the lock held.
+        self._bytes -= self._entries.pop(key)[2]
+
+    def skip(self):
+        with self._lock:
+            self._counters['skipped'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats.update({
+                'entries': len(self._entries), 'max_entries': self.max_entries,
+                'bytes': self._bytes, 'max_bytes': self.max_bytes, 'ttl': self.ttl,
+            })
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def enabled():
+    return getattr(settings, 'CODE_EXECUTION_CACHE_ENABLED', False)
+
+
+def get_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultCache(
+                max_entries=getattr(settings, 'CODE_EXECUTION_CACHE_SIZE', 256),
+                max_bytes=getattr(settings, 'CODE_EXECUTION_CACHE_MAX_BYTES', 16 * 1024 * 1024),
+                ttl=getattr(settings, 'CODE_EXECUTION_CACHE_TTL', 300),
+            )
+        return _cache
+
+
+def cached(code, compute, cacheable=lambda value: True, **key_parts):
+    """
+    Returns ``compute()``, served from the cache when the same deterministic
+    program was run before. ``cacheable`` rejects results that must not be
+    stored, such as timeouts.
+    """
+    if not enabled():
+        return compute()
+    cache = get_cache()
+    if not is_deterministic(code):
+        cache.skip()
+        return compute()
+
+    key = make_key(code, **key_parts)
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        if cacheable(value):
+            cache.set(key, value)
+    return value
+
+
+def stats():
+    if not enabled():
+        return {'enabled': False}
+    return {'enabled': True, **get_cache().stats()}
@@ -0,0 +1,534 @@
+"""
+Runs submitted code for ExecuteCodeView.
+
+Starting a fresh ``python`` for every "Run" click costs a full interpreter
+startup each time. Instead we keep a small pool of warm interpreters
+(sandbox_worker.py) that take jobs from a shared queue and fork a clean child
+per run. Workers are recycled after a number of runs or when they crash.
+
+Set CODE_EXECUTION_POOL_SIZE to 0 (or run on a platform without fork) to fall
+back to one subprocess per run.
+
+Output is capped at CODE_EXECUTION_MAX_OUTPUT bytes per stream: a program that
+goes over is killed and its result marked truncated, so a runaway print loop
+cannot build up huge strings in the web worker. stream_code() yields output
+while the program runs; setting its ``stop`` event (when the client goes away)
+kills the run within STOP_POLL seconds.
+"""
+import atexit
+import collections
+import json
+import logging
+import math
+import os
+import queue
+import select
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+
+from django.conf import settings
+
+from . import result_cache
+
+logger = logging.getLogger(__name__)
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sandbox_worker.py')
+
+# Extra time the pool waits for a worker's reply beyond the run timeout
+# before treating the worker itself as hung.
+REPLY_GRACE = 2.0
+LATENCY_WINDOW = 200
+# How often a worker waiting on a stoppable run checks its stop event
+STOP_POLL = 0.1
+
+
+# SECURITY CHECK: Basic Blocklist
+# This is NOT a complete sandbox. It is a minimal deterrent.
+# Real sandboxing requires Docker/Containers which is out of scope for this environment.
+FORBIDDEN_TERMS = ['import os', 'import subprocess', 'import sys', 'from os', 'from subprocess', 'from sys', '__import__', 'open(']
+
+
+def find_forbidden_term(code):
+    for term in FORBIDDEN_TERMS:
+        if term in code:
+            return term
+    return None
+
+
+def get_timeout():
+    return getattr(settings, 'CODE_EXECUTION_TIMEOUT', 5)
+
+
+def get_max_output():
+    return getattr(settings, 'CODE_EXECUTION_MAX_OUTPUT', 1024 * 1024)
+
+
+def get_limits(timeout):
+    """rlimits applied to every submitted program (see sandbox_worker.py)."""
+    return {
+        'cpu': math.ceil(timeout),
+        'memory': getattr(settings, 'CODE_EXECUTION_MEMORY_LIMIT', 256 * 1024 * 1024),
+        'processes': getattr(settings, 'CODE_EXECUTION_PROCESS_LIMIT', 64),
+    }
+
+
+def get_grade_timeout(case_count):
+    # Each case gets the normal run limit, but the whole batch is capped so a
+    # large test suite cannot pin a worker indefinitely.
+    cap = getattr(settings, 'CODE_EXECUTION_GRADE_TIMEOUT', 20)
+    return min(get_timeout() * max(case_count, 1), cap)
+
+
+@dataclass
+class ExecutionResult:
+    stdout: str = ''
+    stderr: str = ''
+    returncode: int = 0
+    timed_out: bool = False
+    truncated: bool = False
+    duration: float = 0.0
+    cases: list = None
+
+
+class WorkerError(Exception):
+    pass
+
+
+class WorkerCancelled(WorkerError):
+    pass
+
+
+class Worker:
+    """A single warm interpreter speaking the sandbox_worker.py protocol."""
+
+    def __init__(self):
+        self.process = subprocess.Popen(
+            [sys.executable, WORKER_SCRIPT],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            cwd=tempfile.gettempdir(),
+        )
+        self.runs = 0
+        self._pending = b''
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def execute(self, job, wait, on_event=None, stop=None):
+        try:
+            self.process.stdin.write(json.dumps(job).encode('utf-8') + b'\n')
+            self.process.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            raise WorkerError(f"worker unavailable: {e}")
+        self.runs += 1
+        deadline = time.monotonic() + wait
+        while True:
+            message = json.loads(self._read_line(deadline, stop))
+            if 'event' not in message:
+                return message
+            if on_event is not None:
+                on_event(message)
+
+    def _read_line(self, deadline, stop=None):
+        fd = self.process.stdout.fileno()
+        while b'\n' not in self._pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise WorkerError("worker did not reply in time")
+            if stop is not None:
+                remaining = min(remaining, STOP_POLL)
+            readable, _, _ = select.select([fd], [], [], remaining)
+            if stop is not None and stop.is_set():
+                raise WorkerCancelled("run was stopped")
+            if not readable:
+                continue
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                raise WorkerError("worker exited unexpectedly")
+            self._pending += chunk
+        line, self._pending = self._pending.split(b'\n', 1)
+        return line
+
+    def close(self):
+        if self.alive():
+            self.process.kill()
+        self.process.wait()
+        for stream in (self.process.stdin, self.process.stdout):
+            try:
+                stream.close()
+            except OSError:
+                pass
+
+
+class WorkerPool:
+    """
+    Fixed number of warm workers pulling jobs from one queue.
+
+    Each worker is owned by a dispatcher thread, so a job is only ever handed
+    to an idle interpreter and callers simply wait on a Future.
+    """
+
+    def __init__(self, size, max_runs):
+        self.size = size
+        self.max_runs = max_runs
+        self._jobs = queue.Queue()
+        self._lock = threading.Lock()
+        self._latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self._busy = 0
+        self._counters = {
+            'runs': 0, 'timeouts': 0, 'truncated': 0, 'limit_kills': 0, 'crashes': 0, 'cancelled': 0,
+            'recycled': 0,
+        }
+        self._threads = []
+        ready = []
+        for index in range(size):
+            started = threading.Event()
+            thread = threading.Thread(
+                target=self._serve, args=(started,), name=f'sandbox-worker-{index}', daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+            ready.append(started)
+        for started in ready:
+            started.wait()
+
+    def submit(self, job, on_event=None, stop=None):
+        """
+        Queues ``job``. Setting the ``stop`` event drops it if it has not
+        started yet, or kills it; its future then raises WorkerCancelled.
+        """
+        future = Future()
+        job.setdefault('max_output', get_max_output())
+        job.setdefault('limits', get_limits(job['timeout']))
+        self._jobs.put((job, future, on_event, stop, time.monotonic()))
+        return future
+
+    def run(self, code, timeout=None, stdin=''):
+        job = {'code': code, 'timeout': timeout or get_timeout(), 'stdin': stdin}
+        return self.submit(job).result()
+
+    def stream(self, code, timeout=None, stdin='', stop=None):
+        """
+        Yields ``{'event': 'stdout'|'stderr', 'data': ...}`` chunks while the
+        code runs, then the final ExecutionResult (with empty stdout/stderr).
+        Closing the generator early stops the run.
+        """
+        stop = stop or threading.Event()
+        events = queue.Queue()
+        job = {'code': code, 'timeout': timeout or get_timeout(), 'stdin': stdin, 'stream': True}
+        future = self.submit(job, on_event=events.put, stop=stop)
+        future.add_done_callback(lambda _: events.put(None))
+        try:
+            while True:
+                event = events.get()
+                if event is None:
+                    break
+                yield event
+            yield future.result()
+        finally:
+            stop.set()
+
+    def grade(self, code, cases, case_timeout=None, timeout=None):
+        job = {
+            'kind': 'grade',
+            'code': code,
+            'cases': cases,
+            'case_timeout': case_timeout or get_timeout(),
+            'timeout': timeout or get_grade_timeout(len(cases)),
+        }
+        return self.submit(job).result()
+
+    def stats(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            stats = dict(self._counters)
+            stats.update({
+                'pool_size': self.size,
+                'busy_workers': self._busy,
+                'queue_depth': self._jobs.qsize(),
+                'max_runs_per_worker': self.max_runs,
+            })
+        stats['latency_ms'] = _summarize(latencies)
+        return stats
+
+    def shutdown(self):
+        for _ in self._threads:
+            self._jobs.put(None)
+        for thread in self._threads:
+            thread.join(timeout=5)
+
+    def _spawn(self):
+        # None when no interpreter could be started; the next job retries
+        try:
+            return Worker()
+        except OSError:
+            logger.exception("Could not start an execution worker")
+            return None
+
+    def _serve(self, started):
+        worker = self._spawn()
+        started.set()
+        while True:
+            item = self._jobs.get()
+            if item is None:
+                break
+            job, future, on_event, stop, queued_at = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            if stop is not None and stop.is_set():
+                future.set_exception(WorkerCancelled("run was stopped before it started"))
+                continue
+            if worker is None:
+                worker = self._spawn()
+                if worker is None:
+                    future.set_exception(RuntimeError("No execution worker available"))
+                    continue
+            with self._lock:
+                self._busy += 1
+
+            crashed = cancelled = False
+            error = "Execution worker crashed"
+            try:
+                reply = worker.execute(job, job['timeout'] + REPLY_GRACE, on_event, stop)
+                result = ExecutionResult(**reply)
+            except WorkerCancelled:
+                # The worker is mid-run; recycling it kills the program
+                cancelled = True
+                result = None
+            except WorkerError:
+                crashed = True
+                # A worker that stopped answering has already blown the time
+                # limit; one that died early is reported as an internal error.
+                if worker.alive():
+                    result = ExecutionResult(timed_out=True, duration=job['timeout'])
+                else:
+                    result = None
+            except Exception as e:
+                # A malformed reply; the worker cannot be trusted with more jobs
+                logger.exception("Execution worker sent an unusable reply")
+                crashed = True
+                error = f"Execution worker failed: {e}"
+                result = None
+
+            recycle = crashed or cancelled or not worker.alive() or worker.runs >= self.max_runs
+            latency = time.monotonic() - queued_at
+            with self._lock:
+                self._busy -= 1
+                self._counters['runs'] += 1
+                self._counters['timeouts'] += bool(result and result.timed_out)
+                self._counters['truncated'] += bool(result and result.truncated)
+                self._counters['limit_kills'] += bool(result and _killed_by_limit(result))
+                self._counters['crashes'] += crashed
+                self._counters['cancelled'] += cancelled
+                self._counters['recycled'] += recycle
+                self._latencies.append(latency)
+
+            if cancelled:
+                future.set_exception(WorkerCancelled("run was stopped"))
+            elif result is None:
+                future.set_exception(RuntimeError(error))
+            else:
+                future.set_result(result)
+
+            if recycle:
+                worker.close()
+                worker = self._spawn()
+        if worker is not None:
+            worker.close()
+
+
+def _killed_by_limit(result):
+    # Timeouts and output truncation are counted on their own.
+    if result.timed_out or result.truncated:
+        return False
+    return result.returncode in (-signal.SIGXCPU, -signal.SIGKILL)
+
+
+def _summarize(latencies):
+    if not latencies:
+        return {'count': 0, 'avg': None, 'p50': None, 'p95': None, 'max': None}
+
+    def percentile(p):
+        return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 2)
+
+    return {
+        'count': len(latencies),
+        'avg': round(sum(latencies) / len(latencies) * 1000, 2),
+        'p50': percentile(0.50),
+        'p95': percentile(0.95),
+        'max': round(latencies[-1] * 1000, 2),
+    }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def pool_enabled():
+    return hasattr(os, 'fork') and getattr(settings, 'CODE_EXECUTION_POOL_SIZE', 4) > 0
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = WorkerPool(
+                size=getattr(settings, 'CODE_EXECUTION_POOL_SIZE', 4),
+                max_runs=getattr(settings, 'CODE_EXECUTION_MAX_RUNS_PER_WORKER', 50),
+            )
+            atexit.register(_pool.shutdown)
+        return _pool
+
+
+def run_subprocess(code, timeout=None, stdin=''):
+    """
+    One-off interpreter per run; used when the pool is disabled. Output is
+    only trimmed to the cap afterwards here, not bounded while it runs.
+    """
+    timeout = timeout or get_timeout()
+    with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as temp_file:
+        temp_file.write(code)
+        temp_file_path = temp_file.name
+    started = time.monotonic()
+    try:
+        limits = get_limits(timeout)
+        preexec_fn = None
+        if os.name == 'posix':
+            # The worker script imports resource, so only on POSIX
+            from .sandbox_worker import apply_limits
+            preexec_fn = lambda: apply_limits(limits)
+        process = subprocess.run(
+            [sys.executable, temp_file_path],
+            input=stdin,
+            capture_output=True,
+            text=True,
+            timeout=timeout,
+            preexec_fn=preexec_fn,
+        )
+        limit = get_max_output()
+        return ExecutionResult(
+            stdout=process.stdout[:limit],
+            stderr=process.stderr[:limit],
+            returncode=process.returncode,
+            truncated=len(process.stdout) > limit or len(process.stderr) > limit,
+            duration=time.monotonic() - started,
+        )
+    except subprocess.TimeoutExpired:
+        return ExecutionResult(timed_out=True, duration=timeout)
+    finally:
+        os.remove(temp_file_path)
+
+
+def run_code(code, timeout=None, stdin=''):
+    def execute():
+        if pool_enabled():
+            return get_pool().run(code, timeout=timeout, stdin=stdin)
+        return run_subprocess(code, timeout=timeout, stdin=stdin)
+
+    return result_cache.cached(
+        code, execute, cacheable=lambda result: not result.timed_out, stdin=stdin
+    )
+
+
+def truncation_notice():
+    return f"[Output truncated: limit of {get_max_output()} bytes reached]"
+
+
+def format_output(result, timeout=None):
+    """The single ``output`` string ExecuteCodeView has always returned."""
+    if result.timed_out:
+        return f"Error: Execution timed out (limit: {timeout or get_timeout()}s)."
+    output = result.stdout
+    if result.stderr:
+        output += "\nError:\n" + result.stderr
+    if result.truncated:
+        output += "\n" + truncation_notice()
+    return output
+
+
+def stream_code(code, timeout=None, stdin='', stop=None):
+    """
+    Like run_code, but yields output chunks as they are produced and finishes
+    with the ExecutionResult. Setting ``stop`` kills a pooled run. Without the
+    pool the whole output arrives as a single chunk once the program exits,
+    and the run cannot be stopped.
+    """
+    if pool_enabled():
+        yield from get_pool().stream(code, timeout=timeout, stdin=stdin, stop=stop)
+        return
+    result = run_subprocess(code, timeout=timeout, stdin=stdin)
+    for name in ('stdout', 'stderr'):
+        if getattr(result, name) and not result.timed_out:
+            yield {'event': name, 'data': getattr(result, name)}
+    yield result
+
+
+def _normalize_output(text):
+    lines = [line.rstrip() for line in str(text).replace('\r\n', '\n').split('\n')]
+    return '\n'.join(lines).strip('\n')
+
+
+def grade_code(code, test_cases):
+    """
+    Runs ``code`` once per test case, feeding each case's input on stdin, and
+    compares stdout with the expected output. With the pool enabled all cases
+    run in a single sandboxed process.
+    """
+    cases = [
+        {'input': case.get('input', ''), 'output': case.get('output', '')}
+        for case in test_cases
+    ]
+
+    def execute():
+        if pool_enabled():
+            return get_pool().grade(code, cases).cases
+        runs = []
+        for case in cases:
+            result = run_subprocess(code, stdin=str(case['input']))
+            runs.append({
+                'stdout': result.stdout, 'stderr': result.stderr, 'returncode': result.returncode,
+                'timed_out': result.timed_out, 'truncated': result.truncated, 'duration': result.duration,
+            })
+        return runs
+
+    runs = result_cache.cached(
+        code, execute, cacheable=lambda runs: not any(run['timed_out'] for run in runs), cases=cases
+    )
+
+    results = []
+    for index, (case, run) in enumerate(zip(cases, runs)):
+        if run['timed_out']:
+            error = f"Execution timed out (limit: {get_timeout()}s)."
+        elif run.get('truncated'):
+            error = run['stderr'] + truncation_notice()
+        else:
+            error = run['stderr']
+        passed = (
+            not run['timed_out']
+            and not run.get('truncated')
+            and run['returncode'] == 0
+            and _normalize_output(run['stdout']) == _normalize_output(case['output'])
+        )
+        results.append({
+            'case': index,
+            'passed': passed,
+            'input': case['input'],
+            'expected_output': case['output'],
+            'output': run['stdout'],
+            'error': error,
+            'time_ms': round(run['duration'] * 1000, 2),
+        })
+    return results
+
+
+def stats():
+    stats = get_pool().stats() if pool_enabled() else {'pool_size': 0}
+    stats['cache'] = result_cache.stats()
+    return stats
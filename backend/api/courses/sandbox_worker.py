@@ -0,0 +1,346 @@
+"""
+Long-lived interpreter used by the code execution pool (see sandbox.py).
+
+This script does not import Django. It reads one JSON job per line on stdin
+and writes one JSON result per line on stdout. Every job runs in a child
+forked from this warm interpreter, so a run starts without paying interpreter
+startup and cannot leave state behind for the next one.
+
+Grading jobs run every test case inside that one child, feeding each case's
+input through a replaced sys.stdin, and report per-case results on a separate
+pipe so the submitted code cannot tamper with them.
+
+Output is capped at ``max_output`` bytes per stream; a child that goes over
+is killed and its result marked truncated. Streaming jobs forward output as
+``{"event": "stdout"|"stderr", "data": ...}`` lines while the child runs and
+end with the usual result line.
+"""
+import codecs
+import io
+import json
+import linecache
+import os
+import resource
+import select
+import signal
+import sys
+import tempfile
+import time
+import traceback
+
+FILENAME = 'main.py'
+READ_CHUNK = 65536
+
+
+class CaseTimeout(BaseException):
+    pass
+
+
+class OutputLimitExceeded(BaseException):
+    pass
+
+
+class BoundedWriter(io.StringIO):
+    """Captured stdout/stderr for a grading case that stops at ``limit``."""
+
+    def __init__(self, limit):
+        super().__init__()
+        self.limit = limit
+        self.truncated = False
+
+    def write(self, text):
+        room = self.limit - self.tell()
+        if len(text) > room:
+            super().write(text[:max(room, 0)])
+            self.truncated = True
+            raise OutputLimitExceeded()
+        return super().write(text)
+
+
+def _exit_code(exc):
+    # Mirror how the interpreter turns SystemExit into a process exit code.
+    code = exc.code
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    print(code, file=sys.stderr)
+    return 1
+
+
+def _run_source(code):
+    linecache.cache[FILENAME] = (len(code), None, code.splitlines(True), FILENAME)
+    namespace = {'__name__': '__main__', '__file__': FILENAME, '__builtins__': __builtins__}
+    try:
+        exec(compile(code, FILENAME, 'exec'), namespace)
+    except SystemExit as exc:
+        return _exit_code(exc)
+    except (CaseTimeout, OutputLimitExceeded):
+        raise
+    except BaseException as exc:
+        # Drop this frame so the traceback starts at the submitted code,
+        # the same as running ``python main.py``.
+        traceback.print_exception(type(exc), exc, exc.__traceback__.tb_next)
+        return 1
+    return 0
+
+
+def _on_case_timeout(signum, frame):
+    raise CaseTimeout()
+
+
+def _grade_cases(job, results_w):
+    results = os.fdopen(results_w, 'w', encoding='utf-8')
+    signal.signal(signal.SIGALRM, _on_case_timeout)
+    for index, case in enumerate(job['cases']):
+        sys.stdin = io.StringIO(str(case.get('input', '')))
+        sys.stdout = stdout = BoundedWriter(job['max_output'])
+        sys.stderr = stderr = BoundedWriter(job['max_output'])
+        returncode = None
+        timed_out = False
+        started = time.perf_counter()
+        try:
+            signal.setitimer(signal.ITIMER_REAL, job['case_timeout'])
+            try:
+                returncode = _run_source(job['code'])
+            finally:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+        except CaseTimeout:
+            timed_out = True
+        except OutputLimitExceeded:
+            returncode = -signal.SIGKILL
+        duration = time.perf_counter() - started
+        results.write(json.dumps({
+            'index': index,
+            'stdout': stdout.getvalue(),
+            'stderr': stderr.getvalue(),
+            'returncode': returncode,
+            'timed_out': timed_out,
+            'truncated': stdout.truncated or stderr.truncated,
+            'duration': duration,
+        }) + '\n')
+        results.flush()
+    sys.stdout, sys.stderr = sys.__stdout__, sys.__stderr__
+    return 0
+
+
+def apply_limits(limits):
+    # CPU seconds (SIGXCPU, then SIGKILL one second later), address space in
+    # bytes and number of processes for the submitted program. A limit the
+    # host will not grant (its hard cap is lower) is skipped rather than
+    # failing the run. Also used by sandbox.run_subprocess.
+    for name, value, hard in (
+        ('RLIMIT_CPU', limits.get('cpu'), (limits.get('cpu') or 0) + 1),
+        ('RLIMIT_AS', limits.get('memory'), limits.get('memory')),
+        ('RLIMIT_NPROC', limits.get('processes'), limits.get('processes')),
+    ):
+        if value and hasattr(resource, name):
+            try:
+                resource.setrlimit(getattr(resource, name), (value, hard))
+            except (ValueError, OSError):
+                pass
+
+
+def _child(job, stdin_r, stdout_w, stderr_w, results_w, protocol_fds):
+    os.setpgid(0, 0)
+    apply_limits(job.get('limits', {}))
+    for fd in protocol_fds:
+        os.close(fd)
+    os.dup2(stdin_r, 0)
+    os.dup2(stdout_w, 1)
+    os.dup2(stderr_w, 2)
+    for fd in (stdin_r, stdout_w, stderr_w):
+        os.close(fd)
+    sys.argv = [FILENAME]
+
+    if job.get('kind') == 'grade':
+        returncode = _grade_cases(job, results_w)
+    else:
+        returncode = _run_source(job['code'])
+
+    try:
+        sys.stdout.flush()
+        sys.stderr.flush()
+    except Exception:
+        pass
+    os._exit(returncode)
+
+
+def _kill_group(pid):
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def _collect(pid, stdin_w, stdin_data, outputs, results_r, deadline, limit, emit):
+    """
+    Pumps stdin into the child and drains its output until it exits, the
+    deadline passes or a stream goes over ``limit`` bytes. ``outputs`` maps the
+    stdout/stderr descriptors to their stream names. With ``emit`` set, output
+    is forwarded as it arrives instead of being kept.
+    """
+    readers = list(outputs) + ([results_r] if results_r is not None else [])
+    buffers = {fd: bytearray() for fd in readers}
+    sizes = dict.fromkeys(readers, 0)
+    decoders = {fd: codecs.getincrementaldecoder('utf-8')(errors='replace') for fd in outputs}
+    writers = [stdin_w] if stdin_data else []
+    if not stdin_data:
+        os.close(stdin_w)
+
+    timed_out = False
+    truncated = False
+    while readers and not truncated:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            timed_out = True
+            break
+        readable, writable, _ = select.select(readers, writers, [], remaining)
+        for fd in readable:
+            chunk = os.read(fd, READ_CHUNK)
+            if not chunk:
+                readers.remove(fd)
+                continue
+            if fd in outputs:
+                if sizes[fd] + len(chunk) > limit:
+                    chunk = chunk[:limit - sizes[fd]]
+                    truncated = True
+                sizes[fd] += len(chunk)
+                if emit is not None:
+                    text = decoders[fd].decode(chunk, final=truncated)
+                    if text:
+                        emit({'event': outputs[fd], 'data': _decode_text(text)})
+                    continue
+            buffers[fd] += chunk
+        for fd in writable:
+            try:
+                written = os.write(fd, stdin_data[:select.PIPE_BUF])
+                stdin_data = stdin_data[written:]
+            except BrokenPipeError:
+                stdin_data = b''
+            if not stdin_data:
+                writers.remove(fd)
+                os.close(fd)
+
+    returncode = None
+    while not timed_out and not truncated:
+        # The child closed its output streams; wait for it to actually exit.
+        waited, status = os.waitpid(pid, os.WNOHANG)
+        if waited:
+            returncode = os.waitstatus_to_exitcode(status)
+            break
+        if time.monotonic() >= deadline:
+            timed_out = True
+            break
+        time.sleep(0.005)
+
+    _kill_group(pid)
+    if returncode is None:
+        _, status = os.waitpid(pid, 0)
+        if truncated:
+            returncode = os.waitstatus_to_exitcode(status)
+    for fd in buffers:
+        os.close(fd)
+    for fd in writers:
+        os.close(fd)
+    return buffers, returncode, timed_out, truncated
+
+
+def _decode_text(text):
+    # Same result as text=True on subprocess.run: universal newlines.
+    return text.replace('\r\n', '\n').replace('\r', '\n')
+
+
+def _decode(data):
+    return _decode_text(data.decode('utf-8', errors='replace'))
+
+
+def _case_results(data, cases):
+    finished = {}
+    for line in data.decode('utf-8', errors='replace').splitlines():
+        try:
+            result = json.loads(line)
+        except ValueError:
+            continue
+        finished[result['index']] = result
+    # Cases the child never reached were cut off by the overall deadline.
+    return [
+        finished.get(index, {
+            'index': index, 'stdout': '', 'stderr': '', 'returncode': None,
+            'timed_out': True, 'truncated': False, 'duration': 0.0,
+        })
+        for index in range(len(cases))
+    ]
+
+
+def run_job(job, protocol_fds, emit=None):
+    grading = job.get('kind') == 'grade'
+    stdin_data = job.get('stdin', '').encode('utf-8')
+    stdin_r, stdin_w = os.pipe()
+    stdout_r, stdout_w = os.pipe()
+    stderr_r, stderr_w = os.pipe()
+    results_r, results_w = os.pipe() if grading else (None, None)
+
+    started = time.monotonic()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.close(stdin_w)
+            os.close(stdout_r)
+            os.close(stderr_r)
+            if grading:
+                os.close(results_r)
+            _child(job, stdin_r, stdout_w, stderr_w, results_w, protocol_fds)
+        finally:
+            os._exit(1)
+
+    os.close(stdin_r)
+    os.close(stdout_w)
+    os.close(stderr_w)
+    if grading:
+        os.close(results_w)
+    buffers, returncode, timed_out, truncated = _collect(
+        pid, stdin_w, stdin_data, {stdout_r: 'stdout', stderr_r: 'stderr'}, results_r,
+        started + job['timeout'], job['max_output'], emit if job.get('stream') else None,
+    )
+    reply = {
+        'stdout': _decode(buffers[stdout_r]),
+        'stderr': _decode(buffers[stderr_r]),
+        'returncode': returncode,
+        'timed_out': timed_out,
+        'truncated': truncated,
+        'duration': time.monotonic() - started,
+    }
+    if grading:
+        reply['cases'] = _case_results(buffers[results_r], job['cases'])
+    return reply
+
+
+def main():
+    # Keep the protocol channel on private descriptors so the children can
+    # take over 0/1/2 without seeing it.
+    protocol_in = os.dup(0)
+    protocol_out = os.dup(1)
+    devnull = os.open(os.devnull, os.O_RDWR)
+    os.dup2(devnull, 0)
+    os.dup2(devnull, 1)
+    os.close(devnull)
+
+    # Submitted code sees the temp directory first on sys.path, as it did when
+    # it was run from a temporary file.
+    sys.path[0] = tempfile.gettempdir()
+
+    requests = os.fdopen(protocol_in, 'r', encoding='utf-8')
+    replies = os.fdopen(protocol_out, 'w', encoding='utf-8')
+
+    def send(message):
+        replies.write(json.dumps(message) + '\n')
+        replies.flush()
+
+    for line in requests:
+        job = json.loads(line)
+        send(run_job(job, (protocol_in, protocol_out), emit=send))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Course, CodingExercise
+from .models import Course, CodingExercise, ExecutionJob
 
 class CourseSerializer(serializers.ModelSerializer):
     class Meta:
@@ -11,3 +11,9 @@ class CodingExerciseSerializer(serializers.ModelSerializer):
     class Meta:
         model = CodingExercise
         fields = '__all__'
+
+class ExecutionJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ExecutionJob
+        fields = ('id', 'status', 'output', 'created_at', 'started_at', 'finished_at')
+        read_only_fields = fields
@@ -1,8 +1,14 @@
-from django.test import TestCase
+import threading
+import time
+from unittest import mock
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
 from django.contrib.auth.models import User
 from rest_framework.test import APIClient
 from rest_framework import status
-from .models import Course, CodingExercise
+from .models import Course, CodingExercise, ExecutionJob
+from .management.commands import bench_execution
+from . import admission, jobs, result_cache, sandbox
 from api.authapi.models import Profile
 
 class CourseTests(TestCase):
@@ -42,3 +48,359 @@ class CourseTests(TestCase):
         response = self.client.post(url, data, format='json')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertIn("Hello World", response.data['output'])
+
+    def test_execute_stream(self):
+        url = '/api/courses/execute/stream/'
+        response = self.client.post(url, {"code": "for i in range(3): print(i)"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = b''.join(response.streaming_content).decode()
+        self.assertIn("event: stdout", body)
+        self.assertIn('event: exit\ndata: {"returncode": 0', body)
+
+    def test_grade_exercise(self):
+        exercise = CodingExercise.objects.create(
+            course=self.course,
+            title="Double",
+            description="Print twice the input",
+            starter_code="",
+            test_cases=[
+                {"input": "2\n", "output": "4"},
+                {"input": "5\n", "output": "10\n"},
+                {"input": "x\n", "output": "xx"},
+            ]
+        )
+        url = f'/api/courses/exercises/{exercise.id}/grade/'
+        response = self.client.post(url, {"code": "print(int(input()) * 2)"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['passed'], 2)
+        self.assertEqual(response.data['total'], 3)
+        self.assertFalse(response.data['all_passed'])
+
+        results = response.data['results']
+        self.assertTrue(results[0]['passed'])
+        self.assertTrue(results[1]['passed'])
+        self.assertFalse(results[2]['passed'])
+        self.assertIn("ValueError", results[2]['error'])
+
+class SandboxPoolTests(TestCase):
+    def setUp(self):
+        self.pool = sandbox.WorkerPool(size=1, max_runs=2)
+
+    def tearDown(self):
+        self.pool.shutdown()
+
+    def test_runs_match_plain_interpreter(self):
+        result = self.pool.run("print('hi')\n1/0", timeout=5)
+        self.assertEqual(result.stdout, "hi\n")
+        self.assertIn('File "main.py", line 2', result.stderr)
+        self.assertIn("ZeroDivisionError", result.stderr)
+        self.assertEqual(result.returncode, 1)
+
+    def test_timeout_and_recycling(self):
+        result = self.pool.run("while True: pass", timeout=1)
+        self.assertTrue(result.timed_out)
+
+        self.pool.run("x = 1", timeout=5)
+        stats = self.pool.stats()
+        self.assertEqual(stats['runs'], 2)
+        self.assertEqual(stats['timeouts'], 1)
+        self.assertEqual(stats['recycled'], 1)
+        self.assertEqual(stats['pool_size'], 1)
+        self.assertEqual(stats['latency_ms']['count'], 2)
+
+    def test_grade_times_out_single_case(self):
+        cases = [{"input": "1"}, {"input": "loop"}, {"input": "3"}]
+        code = "value = input()\nwhile value == 'loop': pass\nprint(value)"
+        result = self.pool.grade(code, cases, case_timeout=0.5, timeout=5)
+        self.assertEqual([case['stdout'] for case in result.cases], ["1\n", "", "3\n"])
+        self.assertEqual([case['timed_out'] for case in result.cases], [False, True, False])
+
+    def test_output_cap_kills_runaway_program(self):
+        job = {'code': "while True: print('spam')", 'timeout': 5, 'max_output': 1000}
+        result = self.pool.submit(job).result()
+        self.assertTrue(result.truncated)
+        self.assertFalse(result.timed_out)
+        self.assertEqual(len(result.stdout), 1000)
+        self.assertLess(result.duration, 5)
+
+    def test_stream_yields_output_before_result(self):
+        events = list(self.pool.stream("print('a')\nprint('b', file=__import__('sys').stderr)", timeout=5))
+        result = events.pop()
+        self.assertEqual(result.returncode, 0)
+        self.assertEqual(result.stdout, '')
+        self.assertEqual(''.join(e['data'] for e in events if e['event'] == 'stdout'), "a\n")
+        self.assertEqual(''.join(e['data'] for e in events if e['event'] == 'stderr'), "b\n")
+
+    def test_resource_limits(self):
+        limits = {'cpu': 1, 'memory': 256 * 1024 * 1024, 'processes': 64}
+        result = self.pool.submit({'code': "data = bytearray(512 * 1024 * 1024)", 'timeout': 5, 'limits': limits}).result()
+        self.assertIn("MemoryError", result.stderr)
+
+        result = self.pool.submit({'code': "while True: pass", 'timeout': 5, 'limits': limits}).result()
+        self.assertFalse(result.timed_out)
+        self.assertLess(result.returncode, 0)
+        self.assertEqual(self.pool.stats()['limit_kills'], 1)
+
+    def test_stop_kills_a_running_job(self):
+        stop = threading.Event()
+        future = self.pool.submit({'code': "while True: pass", 'timeout': 10}, stop=stop)
+        while not future.running():
+            time.sleep(0.01)
+        started = time.monotonic()
+        stop.set()
+        self.assertIsInstance(future.exception(timeout=5), sandbox.WorkerCancelled)
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertEqual(self.pool.stats()['cancelled'], 1)
+        self.assertEqual(self.pool.run("print(1)", timeout=5).stdout, "1\n")
+
+    def test_stopped_stream_drops_its_queued_job(self):
+        blocker = self.pool.submit({'code': "import time\ntime.sleep(0.5)", 'timeout': 5})
+        while not blocker.running():
+            time.sleep(0.01)
+        stop = threading.Event()
+        errors = []
+
+        def consume():
+            try:
+                list(self.pool.stream("print('never')", timeout=5, stop=stop))
+            except sandbox.WorkerCancelled as e:
+                errors.append(e)
+        consumer = threading.Thread(target=consume)
+        consumer.start()
+        # Stopped while still queued behind the busy worker
+        stop.set()
+        consumer.join(timeout=5)
+        blocker.result(timeout=5)
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(self.pool.stats()['runs'], 1)
+
+    def test_garbage_reply_fails_the_job_not_the_pool(self):
+        with mock.patch.object(sandbox.Worker, '_read_line', return_value=b'not json'), \
+                self.assertLogs('api.courses.sandbox', 'ERROR'):
+            future = self.pool.submit({'code': "print(1)", 'timeout': 5})
+            with self.assertRaisesMessage(RuntimeError, "Execution worker failed"):
+                future.result(timeout=5)
+        self.assertEqual(self.pool.stats()['crashes'], 1)
+        self.assertEqual(self.pool.run("print(2)", timeout=5).stdout, "2\n")
+
+    def test_pool_survives_a_worker_that_cannot_start(self):
+        with mock.patch.object(sandbox.Worker, '_read_line', return_value=b'not json'), \
+                mock.patch.object(sandbox, 'Worker', side_effect=OSError("no processes left")), \
+                self.assertLogs('api.courses.sandbox', 'ERROR') as logs:
+            # The broken worker is recycled, but no replacement starts
+            with self.assertRaisesMessage(RuntimeError, "Execution worker failed"):
+                self.pool.run("print(1)", timeout=5)
+            with self.assertRaisesMessage(RuntimeError, "No execution worker available"):
+                self.pool.run("print(1)", timeout=5)
+        self.assertIn("Could not start an execution worker", logs.output[-1])
+        self.assertEqual(self.pool.run("print(2)", timeout=5).stdout, "2\n")
+
+    def test_runs_do_not_share_state(self):
+        self.pool.run("import builtins\nbuiltins.leaked = 1", timeout=5)
+        result = self.pool.run("print(hasattr(__builtins__, 'leaked'))", timeout=5)
+        self.assertEqual(result.stdout, "False\n")
+
+
+@override_settings(CODE_EXECUTION_ASYNC_WORKERS=0, CODE_EXECUTION_ASYNC_PER_USER=1)
+class ExecutionJobTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.alice = User.objects.create_user(username='alice', password='password')
+        self.bob = User.objects.create_user(username='bob', password='password')
+
+    def test_async_execute_and_poll(self):
+        self.client.force_authenticate(user=self.alice)
+        response = self.client.post('/api/courses/execute/', {"code": "print('later')", "async": True}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['status'], 'queued')
+        url = f"/api/courses/execute/{response.data['id']}/"
+
+        self.assertEqual(self.client.get(url).data['status'], 'queued')
+        jobs.process_next_job()
+        response = self.client.get(url, {'wait': 1})
+        self.assertEqual(response.data['status'], 'done')
+        self.assertEqual(response.data['output'], "later\n")
+
+        self.client.force_authenticate(user=self.bob)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_claims_are_fair_between_users(self):
+        for _ in range(3):
+            jobs.submit(self.alice, "print(1)")
+        jobs.submit(self.bob, "print(2)")
+
+        first = jobs.claim_next_job()
+        second = jobs.claim_next_job()
+        self.assertEqual(first.user, self.alice)
+        self.assertEqual(second.user, self.bob)
+        # Both users are at their running limit until a job finishes.
+        self.assertIsNone(jobs.claim_next_job())
+
+        jobs.run_job(first)
+        self.assertEqual(jobs.claim_next_job().user, self.alice)
+        self.assertEqual(ExecutionJob.objects.filter(status='queued').count(), 1)
+
+    @override_settings(CODE_EXECUTION_ASYNC_MAX_QUEUED=2)
+    def test_queued_jobs_are_capped_per_user(self):
+        self.client.force_authenticate(user=self.alice)
+        for _ in range(2):
+            response = self.client.post('/api/courses/execute/', {"code": "print(1)", "async": True}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        response = self.client.post('/api/courses/execute/', {"code": "print(1)", "async": True}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(ExecutionJob.objects.filter(user=self.alice).count(), 2)
+
+        jobs.submit(self.bob, "print(2)")
+        jobs.run_job(jobs.claim_next_job())
+        self.assertEqual(jobs.submit(self.alice, "print(3)").status, 'queued')
+
+
+class ResultCacheTests(TestCase):
+    def test_deterministic_detection(self):
+        self.assertTrue(result_cache.is_deterministic("print(sum(range(10)))"))
+        self.assertFalse(result_cache.is_deterministic("import random\nprint(random.random())"))
+        self.assertFalse(result_cache.is_deterministic("from datetime import datetime"))
+        self.assertFalse(result_cache.is_deterministic("print({'a', 'b'})"))
+
+    def test_lru_and_ttl(self):
+        cache = result_cache.ResultCache(max_entries=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.set('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+
+        expired = result_cache.ResultCache(max_entries=2, ttl=-1)
+        expired.set('a', 1)
+        self.assertIsNone(expired.get('a'))
+
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['evictions']), (2, 1, 1))
+
+    def test_bounded_by_output_bytes(self):
+        cache = result_cache.ResultCache(max_entries=100, ttl=60, max_bytes=8000)
+        for key in 'abcdefgh':
+            cache.set(key, sandbox.ExecutionResult(stdout='x' * 600, stderr='y' * 300))
+        self.assertEqual(cache.stats()['bytes'], 7200)
+        self.assertEqual(cache.get('a').stdout, 'x' * 600)
+        cache.set('i', [{'stdout': 'x' * 450}, {'stdout': 'x' * 450}])
+        # Over budget: the least recently used entry makes room
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.stats()['bytes'], 7200)
+        # An entry over an eighth of the budget is not stored at all
+        cache.set('e', sandbox.ExecutionResult(stdout='x' * 1001))
+        self.assertIsNone(cache.get('e'))
+        self.assertEqual(cache.stats()['too_large'], 1)
+
+    @override_settings(CODE_EXECUTION_CACHE_ENABLED=True, CODE_EXECUTION_POOL_SIZE=0)
+    def test_run_code_uses_cache(self):
+        result_cache._cache = None
+        with mock.patch.object(sandbox, 'run_subprocess', wraps=sandbox.run_subprocess) as run:
+            first = sandbox.run_code("print(6 * 7)")
+            second = sandbox.run_code("print(6 * 7)")
+            sandbox.run_code("import random")
+            sandbox.run_code("import random")
+        result_cache._cache = None
+
+        self.assertEqual(first, second)
+        self.assertEqual(run.call_count, 3)
+
+
+class AdmissionTests(TestCase):
+    def test_per_user_and_queue_limits(self):
+        controller = admission.AdmissionController(max_concurrent=1, max_per_user=1, max_queue=0, max_wait=0.1)
+        admitted_at = controller.acquire('alice')
+
+        with self.assertRaises(admission.Rejected) as rejection:
+            controller.acquire('alice')
+        self.assertEqual(rejection.exception.reason, 'user_limit')
+        self.assertGreaterEqual(rejection.exception.retry_after, 1)
+
+        with self.assertRaises(admission.Rejected) as rejection:
+            controller.acquire('bob')
+        self.assertEqual(rejection.exception.reason, 'queue_full')
+
+        controller.release('alice', admitted_at)
+        with controller.admit('bob'):
+            self.assertEqual(controller.stats()['running'], 1)
+
+        stats = controller.stats()
+        self.assertEqual(stats['admitted'], 2)
+        self.assertEqual(stats['rejected_user_limit'], 1)
+        self.assertEqual(stats['rejected_queue_full'], 1)
+
+    def test_waits_for_a_free_slot(self):
+        controller = admission.AdmissionController(max_concurrent=1, max_per_user=1, max_queue=1, max_wait=0.1)
+        controller.acquire('alice')
+        with self.assertRaises(admission.Rejected) as rejection:
+            controller.acquire('bob')
+        self.assertEqual(rejection.exception.reason, 'wait_timeout')
+        self.assertEqual(controller.stats()['queued'], 1)
+
+    def test_queued_requests_count_against_the_user(self):
+        controller = admission.AdmissionController(max_concurrent=2, max_per_user=1, max_queue=4, max_wait=5)
+        carol, dave = controller.acquire('carol'), controller.acquire('dave')
+        admitted = threading.Event()
+
+        def queued():
+            with controller.admit('alice'):
+                admitted.set()
+        waiter = threading.Thread(target=queued)
+        waiter.start()
+        while controller.stats()['waiting'] < 1:
+            time.sleep(0.01)
+
+        # Alice already has a request queued, so her second one is refused
+        with self.assertRaises(admission.Rejected) as rejection:
+            controller.acquire('alice')
+        self.assertEqual(rejection.exception.reason, 'user_limit')
+
+        controller.release('carol', carol)
+        controller.release('dave', dave)
+        waiter.join(timeout=5)
+        self.assertTrue(admitted.is_set())
+        self.assertEqual(controller.stats()['running'], 0)
+
+    def test_execute_returns_429_with_retry_after(self):
+        client = APIClient()
+        user = User.objects.create_user(username='busy', password='password')
+        client.force_authenticate(user=user)
+        controller = admission.AdmissionController(max_concurrent=1, max_per_user=1, max_queue=0, max_wait=0)
+        controller.acquire(f'user:{user.pk}')
+
+        with mock.patch.object(admission, 'get_controller', return_value=controller):
+            response = client.post('/api/courses/execute/', {"code": "print(1)"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', response)
+
+    def test_stream_slot_is_released_when_client_disconnects_early(self):
+        client = APIClient()
+        client.force_authenticate(user=User.objects.create_user(username='gone', password='password'))
+        controller = admission.AdmissionController(max_concurrent=1, max_per_user=1, max_queue=0, max_wait=0)
+
+        with mock.patch.object(admission, 'get_controller', return_value=controller):
+            response = client.post('/api/courses/execute/stream/', {"code": "print(1)"}, format='json')
+        self.assertEqual(controller.stats()['running'], 1)
+        # Closed without the body ever being read
+        response.close()
+        self.assertEqual(controller.stats()['running'], 0)
+
+    @override_settings(CODE_EXECUTION_POOL_SIZE=0)
+    def test_limits_the_host_refuses_are_skipped(self):
+        with mock.patch('resource.setrlimit', side_effect=ValueError("not allowed")):
+            result = sandbox.run_subprocess("print('ok')")
+        self.assertEqual(result.stdout, "ok\n")
+
+
+class BenchExecutionTests(TestCase):
+    def test_parse_mix_and_summary(self):
+        self.assertEqual(bench_execution.parse_mix("fast=3,timeout"), {'fast': 3, 'timeout': 1})
+        with self.assertRaises(CommandError):
+            bench_execution.parse_mix("slow=1")
+
+        stats = bench_execution.summarize([i / 1000 for i in range(1, 101)])
+        self.assertEqual((stats['p50_ms'], stats['p95_ms'], stats['p99_ms']), (50.0, 95.0, 99.0))
+        self.assertEqual(bench_execution.summarize([])['p50_ms'], None)
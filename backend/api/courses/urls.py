@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import CourseViewSet, CodingExerciseViewSet, ExecuteCodeView
+from .views import CourseViewSet, CodingExerciseViewSet, ExecuteCodeView, ExecuteStreamView, ExecutionJobView, ExecutionStatsView
 
 router = DefaultRouter()
 router.register(r'courses', CourseViewSet)
@@ -9,4 +9,7 @@ router.register(r'exercises', CodingExerciseViewSet)
 urlpatterns = [
     path('', include(router.urls)),
     path('execute/', ExecuteCodeView.as_view(), name='execute-code'),
+    path('execute/stream/', ExecuteStreamView.as_view(), name='execute-stream'),
+    path('execute/stats/', ExecutionStatsView.as_view(), name='execute-stats'),
+    path('execute/<uuid:job_id>/', ExecutionJobView.as_view(), name='execute-job'),
 ]
@@ -1,13 +1,35 @@
 from rest_framework import viewsets
+from rest_framework.decorators import action
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
-from .models import Course, CodingExercise
-from .serializers import CourseSerializer, CodingExerciseSerializer
+from rest_framework.exceptions import NotAuthenticated, Throttled
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from asgiref.sync import sync_to_async
+from .models import Course, CodingExercise, ExecutionJob
+from .serializers import CourseSerializer, CodingExerciseSerializer, ExecutionJobSerializer
 from api.permissions import IsInstructorOrReadOnly
-import subprocess
-import tempfile
-import os
+from . import admission, jobs, sandbox
+from contextlib import contextmanager
+import json
+import threading
+
+def _throttled(rejection):
+    return Throttled(
+        wait=rejection.retry_after,
+        detail="Too many code executions in progress, try again shortly.",
+    )
+
+@contextmanager
+def _admit(request):
+    """Holds an execution slot for the duration of the block, or raises 429."""
+    try:
+        with admission.get_controller().admit(admission.client_key(request)):
+            yield
+    except admission.Rejected as e:
+        raise _throttled(e)
 
 class CourseViewSet(viewsets.ModelViewSet):
     queryset = Course.objects.all()
@@ -22,6 +44,42 @@ class CodingExerciseViewSet(viewsets.ModelViewSet):
     serializer_class = CodingExerciseSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsInstructorOrReadOnly]
 
+    @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
+    def grade(self, request, pk=None):
+        """
+        Runs the submitted code against every test case of the exercise in one
+        sandboxed process and returns a pass/fail result per case.
+        """
+        exercise = self.get_object()
+        code = request.data.get('code')
+
+        if not code:
+            return Response({"error": "No code provided"}, status=status.HTTP_400_BAD_REQUEST)
+
+        if exercise.language != 'python':
+            return Response({"error": "Only Python is supported currently"}, status=status.HTTP_400_BAD_REQUEST)
+
+        term = sandbox.find_forbidden_term(code)
+        if term:
+            return Response({"error": f"Security violation: usage of '{term}' is not allowed."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            with _admit(request):
+                results = sandbox.grade_code(code, exercise.test_cases)
+        except Throttled:
+            raise
+        except Exception as e:
+            return Response({"error": f"Error: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        passed = sum(1 for result in results if result['passed'])
+        return Response({
+            "passed": passed,
+            "total": len(results),
+            "all_passed": passed == len(results),
+            "time_ms": round(sum(result['time_ms'] for result in results), 2),
+            "results": results
+        })
+
 class ExecuteCodeView(APIView):
     def post(self, request):
         code = request.data.get('code')
@@ -33,38 +91,157 @@ class ExecuteCodeView(APIView):
         if language != 'python':
              return Response({"error": "Only Python is supported currently"}, status=status.HTTP_400_BAD_REQUEST)
 
-        # SECURITY CHECK: Basic Blocklist
-        # This is NOT a complete sandbox. It is a minimal deterrent.
-        # Real sandboxing requires Docker/Containers which is out of scope for this environment.
-        forbidden_terms = ['import os', 'import subprocess', 'import sys', 'from os', 'from subprocess', 'from sys', '__import__', 'open(']
-        for term in forbidden_terms:
-            if term in code:
-                return Response({"error": f"Security violation: usage of '{term}' is not allowed."}, status=status.HTTP_400_BAD_REQUEST)
+        term = sandbox.find_forbidden_term(code)
+        if term:
+            return Response({"error": f"Security violation: usage of '{term}' is not allowed."}, status=status.HTTP_400_BAD_REQUEST)
+
+        if request.data.get('async'):
+            if not request.user.is_authenticated:
+                raise NotAuthenticated()
+            try:
+                job = jobs.submit(request.user, code, stdin=request.data.get('stdin', ''))
+            except admission.Rejected as e:
+                raise _throttled(e)
+            return Response(ExecutionJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
 
-        # Create a temporary file to run the code
         try:
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as temp_file:
-                temp_file.write(code)
-                temp_file_path = temp_file.name
-
-            # Run the code using subprocess with a timeout
-            process = subprocess.run(
-                ['python', temp_file_path],
-                capture_output=True,
-                text=True,
-                timeout=5 # 5 seconds timeout
-            )
-
-            output = process.stdout
-            if process.stderr:
-                output += "\nError:\n" + process.stderr
-
-        except subprocess.TimeoutExpired:
-            output = "Error: Execution timed out (limit: 5s)."
+            with _admit(request):
+                result = sandbox.run_code(code)
+            output = sandbox.format_output(result)
+        except Throttled:
+            raise
         except Exception as e:
             output = f"Error: {str(e)}"
-        finally:
-            if os.path.exists(temp_file_path):
-                os.remove(temp_file_path)
 
         return Response({"output": output})
+
+def _sse_events(events):
+    for event in events:
+        if isinstance(event, sandbox.ExecutionResult):
+            name = 'exit'
+            payload = {
+                'returncode': event.returncode,
+                'timed_out': event.timed_out,
+                'truncated': event.truncated,
+                'duration': event.duration,
+            }
+            if event.timed_out:
+                payload['error'] = sandbox.format_output(event)
+            elif event.truncated:
+                payload['error'] = sandbox.truncation_notice()
+        else:
+            name = event['event']
+            payload = {'data': event['data']}
+        yield f"event: {name}\ndata: {json.dumps(payload)}\n\n"
+
+async def _iterate_in_thread(iterator):
+    # Under ASGI, StreamingHttpResponse needs an async iterator or it buffers
+    # the whole body; pull each event from the blocking iterator in a thread.
+    done = object()
+    next_event = sync_to_async(next, thread_sensitive=False)
+    while True:
+        event = await next_event(iterator, done)
+        if event is done:
+            break
+        yield event
+
+class _ClosingStreamingHttpResponse(StreamingHttpResponse):
+    """Calls ``on_close`` when the server closes the response, however it ended."""
+
+    def __init__(self, *args, on_close, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._on_close = on_close
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            self._on_close()
+
+class ExecuteStreamView(APIView):
+    """
+    Runs code like ExecuteCodeView but streams stdout/stderr as Server-Sent
+    Events while the program runs, ending with an ``exit`` event. Output past
+    CODE_EXECUTION_MAX_OUTPUT bytes per stream kills the program.
+    """
+
+    def post(self, request):
+        code = request.data.get('code')
+        language = request.data.get('language', 'python')
+
+        if not code:
+            return Response({"error": "No code provided"}, status=status.HTTP_400_BAD_REQUEST)
+
+        if language != 'python':
+             return Response({"error": "Only Python is supported currently"}, status=status.HTTP_400_BAD_REQUEST)
+
+        term = sandbox.find_forbidden_term(code)
+        if term:
+            return Response({"error": f"Security violation: usage of '{term}' is not allowed."}, status=status.HTTP_400_BAD_REQUEST)
+
+        controller = admission.get_controller()
+        key = admission.client_key(request)
+        try:
+            admitted_at = controller.acquire(key)
+        except admission.Rejected as e:
+            raise _throttled(e)
+
+        released = []
+        stop = threading.Event()
+
+        def release():
+            if not released:
+                released.append(True)
+                controller.release(key, admitted_at)
+
+        def close():
+            # Kill the run too, or dropped streams could keep programs
+            # running while their slots are handed to new requests
+            stop.set()
+            release()
+
+        def admitted_events():
+            try:
+                yield from sandbox.stream_code(code, stdin=request.data.get('stdin', ''), stop=stop)
+            finally:
+                release()
+
+        events = _sse_events(admitted_events())
+        if isinstance(request._request, ASGIRequest):
+            events = _iterate_in_thread(events)
+        # A client that disconnects before the body starts never runs the
+        # generator, and under ASGI one that disconnects mid-stream leaves it
+        # suspended, so its finally cannot be relied on to free the slot
+        response = _ClosingStreamingHttpResponse(events, on_close=close, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+class ExecutionJobView(APIView):
+    """
+    Result of an asynchronous run. ``?wait=<seconds>`` long-polls until the
+    job finishes or the wait runs out.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, job_id):
+        job = get_object_or_404(ExecutionJob, pk=job_id, user=request.user)
+        try:
+            wait = float(request.query_params.get('wait', 0))
+        except ValueError:
+            return Response({"error": "wait must be a number of seconds"}, status=status.HTTP_400_BAD_REQUEST)
+        if wait > 0 and not job.finished:
+            job = jobs.wait_for(job, wait)
+        return Response(ExecutionJobSerializer(job).data)
+
+class ExecutionStatsView(APIView):
+    """
+    Pool size, queue depth and run latency of the code execution sandbox.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        stats = sandbox.stats()
+        stats['admission'] = admission.get_controller().stats()
+        stats['jobs'] = jobs.stats()
+        return Response(stats)
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from api.lessons import uploads
+
+
+class Command(BaseCommand):
+    help = "Deletes video uploads idle for longer than LESSON_UPLOAD_TTL, with their partial files."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ttl', type=int, default=uploads.get_ttl(),
+                            help="Seconds an upload may sit idle.")
+
+    def handle(self, *args, **options):
+        abandoned, finished = uploads.purge_abandoned(options['ttl'])
+        self.stdout.write(f"Removed {abandoned} abandoned and {finished} finished upload(s)")
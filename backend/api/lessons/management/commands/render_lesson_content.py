@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from api.lessons.models import Lesson
+
+
+class Command(BaseCommand):
+    help = "Renders the Markdown of lessons whose content changed since it was last rendered."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help="Re-render every lesson, e.g. after changing the renderer.")
+        parser.add_argument('--batch-size', type=int, default=200,
+                            help="Lessons written per query.")
+
+    def handle(self, *args, **options):
+        batch_size = max(options['batch_size'], 1)
+        lessons = Lesson.objects.only('pk', 'content', 'content_hash').order_by('pk')
+        rendered, batch, total = 0, [], 0
+        for lesson in lessons.iterator(chunk_size=batch_size):
+            total += 1
+            if options['force']:
+                lesson.content_hash = ''
+            if lesson.render_content():
+                batch.append(lesson)
+            if len(batch) >= batch_size:
+                Lesson.objects.bulk_update(batch, ['content_html', 'content_hash'])
+                rendered += len(batch)
+                batch = []
+        if batch:
+            Lesson.objects.bulk_update(batch, ['content_html', 'content_hash'])
+            rendered += len(batch)
+        self.stdout.write(f"Rendered {rendered} of {total} lesson(s)")
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("lessons", "0004_rendered_content"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="videoupload",
+            name="writing_since",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
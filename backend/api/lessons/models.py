@@ -1,5 +1,8 @@
 from django.db import models
+from django.contrib.auth.models import User
 from api.courses.models import Course
+from .rendering import content_hash, render_markdown
+import uuid
 
 class Lesson(models.Model):
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='lessons', null=True)
@@ -7,6 +10,8 @@ class Lesson(models.Model):
     title = models.CharField(max_length=255)
     description = models.TextField()
     content = models.TextField() # Markdown content
+    content_html = models.TextField(blank=True, default='', editable=False) # sanitized rendering of content
+    content_hash = models.CharField(max_length=64, blank=True, default='', editable=False) # of the content rendered
     video_path = models.CharField(max_length=255, blank=True, null=True) # Deprecated or used for external links
     video_file = models.FileField(upload_to='videos/', blank=True, null=True)
     duration = models.IntegerField(default=0) # in minutes
@@ -14,3 +19,51 @@ class Lesson(models.Model):
 
     def __str__(self):
         return self.title
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        rendered = (
+            'content' not in self.get_deferred_fields()
+            and (update_fields is None or 'content' in update_fields)
+            and self.render_content()
+        )
+        if rendered and update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'content_html', 'content_hash'}
+        super().save(*args, **kwargs)
+
+    def render_content(self):
+        """Re-renders content_html if content changed since. Returns True if it did."""
+        digest = content_hash(self.content)
+        if digest == self.content_hash:
+            return False
+        self.content_html = render_markdown(self.content)
+        self.content_hash = digest
+        return True
+
+class VideoUpload(models.Model):
+    """
+    A resumable upload of a lesson video (api/lessons/uploads.py). Chunks
+    are written straight into ``path`` under MEDIA_ROOT; ``received`` is the
+    offset the next chunk must start at.
+    """
+    STATUS_CHOICES = (
+        ('uploading', 'Uploading'),
+        ('complete', 'Complete'),
+    )
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE, related_name='video_uploads')
+    created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='video_uploads')
+    filename = models.CharField(max_length=255)
+    path = models.CharField(max_length=255) # storage name the file is written to
+    size = models.BigIntegerField()
+    sha256 = models.CharField(max_length=64, blank=True, default='') # of the whole file, checked on finalize
+    received = models.BigIntegerField(default=0)
+    # Set while a request writes the chunk at ``received``, so a second PUT of
+    # the same offset cannot write over it
+    writing_since = models.DateTimeField(null=True, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='uploading')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.filename} - {self.received}/{self.size}"
@@ -0,0 +1,32 @@
+"""
+Server-side rendering of lesson Markdown.
+
+Lesson.content is rendered to HTML once per revision instead of by every
+client on every view. The HTML is stored next to the SHA-256 of the Markdown
+it came from; Lesson.save re-renders only when that hash changes, and the
+hash doubles as the ETag of /api/lessons/<id>/html/, so clients revalidate
+with If-None-Match and only download a lesson again after it was edited.
+Rows changed behind the model's back (queryset updates, imports) are rendered
+in memory when served, and stored by ``manage.py render_lesson_content``.
+
+Raw HTML in the Markdown is not trusted: the output is sanitized with nh3,
+which keeps formatting tags and drops scripts, event handlers and unsafe URLs.
+"""
+import hashlib
+
+import markdown
+import nh3
+
+EXTENSIONS = ['fenced_code', 'tables', 'sane_lists']
+
+# Code blocks keep their language-* class for client-side highlighting
+ATTRIBUTES = {**nh3.ALLOWED_ATTRIBUTES, 'code': {'class'}}
+
+
+def content_hash(content):
+    return hashlib.sha256((content or '').encode()).hexdigest()
+
+
+def render_markdown(content):
+    html = markdown.markdown(content or '', extensions=EXTENSIONS, output_format='html')
+    return nh3.clean(html, attributes=ATTRIBUTES)
@@ -1,7 +1,33 @@
 from rest_framework import serializers
-from .models import Lesson
+from .models import Lesson, VideoUpload
+from . import streaming
 
 class LessonSerializer(serializers.ModelSerializer):
+    video_stream_url = serializers.SerializerMethodField()
+
     class Meta:
         model = Lesson
-        fields = '__all__'
+        # The rendered HTML is served on its own, with an ETag (LessonViewSet.html)
+        exclude = ('content_html',)
+
+    def get_video_stream_url(self, obj):
+        request = self.context.get('request')
+        if not obj.video_file or request is None or not request.user.is_authenticated:
+            return None
+        return streaming.stream_url(request, obj)
+
+class LessonListSerializer(LessonSerializer):
+    """
+    Catalog representation: everything but the lesson body, which the lesson
+    page fetches rendered (LessonViewSet.html).
+    """
+    class Meta(LessonSerializer.Meta):
+        exclude = ('content', 'content_html')
+
+class VideoUploadSerializer(serializers.ModelSerializer):
+    offset = serializers.IntegerField(source='received', read_only=True)
+
+    class Meta:
+        model = VideoUpload
+        fields = ('id', 'lesson', 'filename', 'size', 'sha256', 'offset', 'status', 'created_at', 'updated_at')
+        read_only_fields = ('status', 'created_at', 'updated_at')
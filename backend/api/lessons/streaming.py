@@ -0,0 +1,171 @@
+"""
+Authenticated, seekable delivery of lesson videos.
+
+GET /api/lessons/<id>/video/ answers ``Range`` requests with 206 and the
+requested bytes, so seeking in a player only fetches what it plays, and honours
+``If-None-Match``/``If-Modified-Since`` (304) and ``If-Range``. Files are read
+in fixed-size blocks, so memory per stream stays constant; whole-file
+responses go through FileResponse and so through the server's sendfile where
+it has one. With LESSON_VIDEO_SENDFILE set to ``x-accel`` (nginx) or
+``x-sendfile`` (Apache, lighttpd) Django only checks access and hands the
+transfer, ranges included, to the web server.
+
+A ``<video>`` element cannot send an Authorization header, so lesson payloads
+carry a signed ``video_stream_url`` that authorizes its user for
+LESSON_VIDEO_URL_MAX_AGE seconds.
+"""
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from django.http import FileResponse, HttpResponse, HttpResponseRedirect
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+SALT = 'api.lessons.video'
+BLOCK_SIZE = 64 * 1024
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def get_sendfile():
+    return getattr(settings, 'LESSON_VIDEO_SENDFILE', '')
+
+
+def get_accel_prefix():
+    return getattr(settings, 'LESSON_VIDEO_ACCEL_PREFIX', '/protected-media/')
+
+
+def get_url_max_age():
+    return getattr(settings, 'LESSON_VIDEO_URL_MAX_AGE', 6 * 3600)
+
+
+def stream_url(request, lesson):
+    """Absolute video URL for ``request.user``, signed for the query string."""
+    token = signing.dumps({'l': lesson.pk, 'u': request.user.pk}, salt=SALT)
+    return request.build_absolute_uri(reverse('lesson-video', args=[lesson.pk])) + f'?token={token}'
+
+
+def token_user(lesson, token):
+    """The user a signed video URL was issued to, or None."""
+    try:
+        data = signing.loads(token or '', salt=SALT, max_age=get_url_max_age())
+    except signing.BadSignature:
+        return None
+    if data.get('l') != lesson.pk:
+        return None
+    return User.objects.filter(pk=data.get('u'), is_active=True).first()
+
+
+class RangedFile:
+    """Reads ``length`` bytes of ``file`` from ``start``, for FileResponse."""
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """
+    The (start, end) byte range of a single-range ``Range`` header, None to
+    serve the whole file (no, malformed or multi-range header), or False if
+    the range cannot be satisfied.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or (last and int(last) < start):
+        return False
+    return start, end
+
+
+def _if_range_matches(request, etag, mtime):
+    value = request.META.get('HTTP_IF_RANGE')
+    if not value:
+        return True
+    if value.startswith(('"', 'W/')):
+        return value == etag
+    date = parse_http_date_safe(value)
+    return date is not None and int(mtime) <= date
+
+
+def serve(request, lesson):
+    """The response streaming ``lesson.video_file`` to an authorized user."""
+    video = lesson.video_file
+    try:
+        path = video.path
+    except NotImplementedError:
+        # Remote storage serves (and ranges) the file itself
+        return HttpResponseRedirect(video.url)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+
+    etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        response = _transfer(request, path, stat.st_size, content_type, etag, stat.st_mtime)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Accept-Ranges'] = 'bytes'
+    response['Cache-Control'] = 'private, max-age=3600'
+    return response
+
+
+def _transfer(request, path, size, content_type, etag, mtime):
+    sendfile = get_sendfile()
+    if sendfile == 'x-accel':
+        response = HttpResponse(content_type=content_type)
+        relative = os.path.relpath(path, settings.MEDIA_ROOT).replace(os.sep, '/')
+        response['X-Accel-Redirect'] = get_accel_prefix() + relative
+        return response
+    if sendfile == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = path
+        return response
+
+    byte_range = parse_range(request.META.get('HTTP_RANGE'), size)
+    if byte_range is not None and not _if_range_matches(request, etag, mtime):
+        byte_range = None
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    if byte_range is None:
+        return FileResponse(open(path, 'rb'), content_type=content_type)
+
+    start, end = byte_range
+    length = end - start + 1
+    response = FileResponse(RangedFile(open(path, 'rb'), start, length), status=206, content_type=content_type)
+    response.block_size = BLOCK_SIZE
+    response['Content-Length'] = str(length)
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
@@ -1,3 +1,274 @@
-from django.test import TestCase
+import hashlib
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import User
+from rest_framework.test import APIClient
+from rest_framework import status
+from django.utils import timezone
+from api.authapi.models import Profile
+from api.courses.models import Course
+from .models import Lesson, VideoUpload
+from . import uploads
 
-# Create your tests here.
+MEDIA_ROOT = tempfile.mkdtemp()
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class VideoStreamingTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='student', password='password')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        course = Course.objects.create(title="Python", description="", instructor=self.user)
+        self.data = bytes(range(256)) * 1024
+        self.lesson = Lesson.objects.create(
+            course=course, title="Intro", description="", content="",
+            video_file=SimpleUploadedFile('intro.mp4', self.data, content_type='video/mp4'),
+        )
+        self.url = f'/api/lessons/{self.lesson.id}/video/'
+
+    def body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_full_and_ranged_responses(self):
+        response = self.client.get(self.url, HTTP_ACCEPT='video/*')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'video/mp4')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(self.body(response), self.data)
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=1000-1999')
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(response['Content-Range'], f'bytes 1000-1999/{len(self.data)}')
+        self.assertEqual(response['Content-Length'], '1000')
+        self.assertEqual(self.body(response), self.data[1000:2000])
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-10')
+        self.assertEqual(self.body(response), self.data[-10:])
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.data)}-')
+        self.assertEqual(response.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.data)}')
+
+    def test_conditional_requests(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        # A stale If-Range gets the whole, current file
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+
+    def test_signed_url_and_authentication(self):
+        url = self.client.get(f'/api/lessons/{self.lesson.id}/').data['video_stream_url']
+        anonymous = APIClient()
+        self.assertEqual(anonymous.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(anonymous.get(url, HTTP_RANGE='bytes=0-0').status_code, status.HTTP_206_PARTIAL_CONTENT)
+        other = Lesson.objects.create(course=self.lesson.course, title="Other", description="", content="")
+        self.assertEqual(anonymous.get(url.replace(self.url, f'/api/lessons/{other.id}/video/')).status_code,
+                         status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(LESSON_VIDEO_SENDFILE='x-accel')
+    def test_web_server_offload(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.lesson.video_file.name}')
+        self.assertEqual(response.content, b'')
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, LESSON_UPLOAD_MAX_CHUNK=1000)
+class VideoUploadTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.instructor = User.objects.create_user(username='teacher', password='password')
+        Profile.objects.create(user=self.instructor, role='instructor')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.instructor)
+        course = Course.objects.create(title="Python", description="", instructor=self.instructor)
+        self.lesson = Lesson.objects.create(course=course, title="Intro", description="", content="")
+        self.data = os.urandom(2500)
+
+    def start(self, **extra):
+        response = self.client.post('/api/lessons/uploads/', {
+            "lesson": self.lesson.id, "filename": "intro.mp4", "size": len(self.data),
+            "sha256": hashlib.sha256(self.data).hexdigest(), **extra,
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return f"/api/lessons/uploads/{response.data['id']}/"
+
+    def put(self, url, offset, chunk, **headers):
+        return self.client.put(url, chunk, content_type='application/offset+octet-stream',
+                               HTTP_UPLOAD_OFFSET=str(offset), **headers)
+
+    def test_chunked_upload_with_resume(self):
+        url = self.start()
+        response = self.put(url, 0, self.data[:1000], HTTP_X_CHUNK_SHA256=hashlib.sha256(self.data[:1000]).hexdigest())
+        self.assertEqual((response.status_code, response['Upload-Offset']), (status.HTTP_200_OK, '1000'))
+
+        # The connection drops half way through the next chunk
+        upload = VideoUpload.objects.get()
+        with self.assertRaises(uploads.UploadError):
+            uploads.write_chunk(upload, 1000, BytesIO(self.data[1000:1500]), 1000)
+        self.assertEqual(self.client.get(url).data['offset'], 1000)
+
+        response = self.put(url, 2000, self.data[2000:])
+        self.assertEqual((response.status_code, response.data['offset']), (status.HTTP_409_CONFLICT, 1000))
+        response = self.put(url, 1000, self.data[1000:2000], HTTP_X_CHUNK_SHA256='0' * 64)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.put(url, 1000, self.data[1000:2000]).data['offset'], 2000)
+        self.assertEqual(self.client.post(url + 'finalize/').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.put(url, 2000, self.data[2000:]).data['offset'], 2500)
+
+        response = self.client.post(url + 'finalize/')
+        self.assertEqual(response.data['status'], 'complete')
+        self.lesson.refresh_from_db()
+        with self.lesson.video_file.open('rb') as video:
+            self.assertEqual(video.read(), self.data)
+
+    def test_concurrent_chunks_at_one_offset(self):
+        url = self.start()
+        upload = VideoUpload.objects.get()
+        # Another request has claimed offset 0 and is still writing
+        VideoUpload.objects.update(writing_since=timezone.now())
+        response = self.put(url, 0, self.data[:1000])
+        self.assertEqual((response.status_code, response['Upload-Offset']), (status.HTTP_409_CONFLICT, '0'))
+
+        # A claim left behind by a request that died lapses
+        VideoUpload.objects.update(writing_since=timezone.now() - timedelta(seconds=uploads.get_claim_timeout() + 1))
+        self.assertEqual(self.put(url, 0, self.data[:1000]).data['offset'], 1000)
+        # A chunk that fails half way releases its claim
+        upload.refresh_from_db()
+        with self.assertRaisesMessage(uploads.UploadError, "Chunk ended after 500 of 1000 bytes"):
+            uploads.write_chunk(upload, 1000, BytesIO(self.data[1000:1500]), 1000)
+        self.assertIsNone(VideoUpload.objects.get().writing_since)
+        self.assertEqual(self.put(url, 1000, self.data[1000:2000]).data['offset'], 2000)
+
+    def upload(self):
+        url = self.start()
+        for offset in range(0, len(self.data), 1000):
+            self.put(url, offset, self.data[offset:offset + 1000])
+        return VideoUpload.objects.get(pk=url.split('/')[-2])
+
+    def test_replacing_video_deletes_the_old_file(self):
+        first = self.upload()
+        with self.captureOnCommitCallbacks(execute=True):
+            uploads.finalize(first)
+        second = self.upload()
+        stale = VideoUpload.objects.get(pk=second.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            uploads.finalize(second)
+        self.lesson.refresh_from_db()
+        self.assertEqual(self.lesson.video_file.name, second.path)
+        self.assertFalse(default_storage.exists(first.path))
+
+        # A concurrent finalize that lost the race attaches and deletes nothing
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(uploads.finalize(stale).status, 'complete')
+        self.lesson.refresh_from_db()
+        self.assertEqual(self.lesson.video_file.name, second.path)
+        self.assertTrue(default_storage.exists(second.path))
+
+    def test_corrupt_file_is_rejected_on_finalize(self):
+        url = self.start(sha256=hashlib.sha256(b'something else').hexdigest())
+        for offset in range(0, len(self.data), 1000):
+            self.put(url, offset, self.data[offset:offset + 1000])
+        self.assertEqual(self.client.post(url + 'finalize/').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(url).data['offset'], 0)
+        self.lesson.refresh_from_db()
+        self.assertFalse(self.lesson.video_file)
+
+    def test_only_course_instructor_may_upload(self):
+        other = User.objects.create_user(username='other')
+        Profile.objects.create(user=other, role='instructor')
+        self.client.force_authenticate(user=other)
+        response = self.client.post('/api/lessons/uploads/', {
+            "lesson": self.lesson.id, "filename": "intro.mp4", "size": 10,
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_abandoned_uploads_are_purged(self):
+        self.start()
+        upload = VideoUpload.objects.get()
+        self.assertTrue(default_storage.exists(upload.path))
+        VideoUpload.objects.update(updated_at=timezone.now() - timedelta(days=2))
+        out = StringIO()
+        call_command('purge_video_uploads', stdout=out)
+        self.assertIn("Removed 1 abandoned and 0 finished upload(s)", out.getvalue())
+        self.assertFalse(default_storage.exists(upload.path))
+
+class RenderedContentTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        user = User.objects.create_user(username='teacher', password='password')
+        self.course = Course.objects.create(title="Python", description="", instructor=user)
+        self.lesson = Lesson.objects.create(
+            course=self.course, title="Intro", description="",
+            content="# Loops\n\n```python\nfor i in range(3): pass\n```\n\n"
+                    "<script>alert(1)</script>[click](javascript:alert(1)) <img src=x onerror=alert(1)>",
+        )
+
+    def test_content_is_rendered_and_sanitized_on_save(self):
+        html = self.lesson.content_html
+        self.assertIn("<h1>Loops</h1>", html)
+        self.assertIn('<code class="language-python">', html)
+        self.assertNotIn("<script", html)
+        self.assertNotIn("javascript:", html)
+        self.assertNotIn("onerror", html)
+
+        digest = self.lesson.content_hash
+        self.lesson.title = "Introduction"
+        self.lesson.save(update_fields=['title'])
+        self.lesson.content = "Changed"
+        self.lesson.save(update_fields=['content'])
+        self.lesson.refresh_from_db()
+        self.assertNotEqual(self.lesson.content_hash, digest)
+        self.assertEqual(self.lesson.content_html, "<p>Changed</p>")
+
+    def test_html_endpoint_revalidates_with_etag(self):
+        url = f'/api/lessons/{self.lesson.id}/html/'
+        response = self.client.get(url)
+        self.assertEqual(response.data['html'], self.lesson.content_html)
+        etag = response['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertNotIn('content_html', self.client.get(f'/api/lessons/{self.lesson.id}/').data)
+
+        # Updates that bypass save are caught when served
+        Lesson.objects.filter(pk=self.lesson.pk).update(content="*New*")
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['html'], "<p><em>New</em></p>")
+        # ...but only the backfill command stores the new rendering
+        self.assertEqual(Lesson.objects.get(pk=self.lesson.pk).content_html, self.lesson.content_html)
+
+    def test_list_leaves_out_the_lesson_body(self):
+        response = self.client.get('/api/lessons/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([lesson['title'] for lesson in response.data], ["Intro"])
+        self.assertNotIn('content', response.data[0])
+        self.assertNotIn('content_html', response.data[0])
+        self.assertIn('content', self.client.get(f'/api/lessons/{self.lesson.id}/').data)
+
+    def test_backfill_command(self):
+        Lesson.objects.update(content_html='', content_hash='')
+        Lesson.objects.create(course=self.course, title="Two", description="", content="Two")
+        out = StringIO()
+        call_command('render_lesson_content', stdout=out)
+        self.assertIn("Rendered 1 of 2 lesson(s)", out.getvalue())
+        self.assertIn("<h1>Loops</h1>", Lesson.objects.get(pk=self.lesson.pk).content_html)
+        out = StringIO()
+        call_command('render_lesson_content', stdout=out)
+        self.assertIn("Rendered 0 of 2 lesson(s)", out.getvalue())
@@ -0,0 +1,201 @@
+"""
+Resumable, chunked uploads of lesson videos.
+
+An instructor starts an upload with the file's name, size and (optionally)
+SHA-256, then PUTs chunks of at most LESSON_UPLOAD_MAX_CHUNK bytes, each at the
+offset the server has confirmed so far (``Upload-Offset``). Chunks are written
+straight into the file's final location under MEDIA_ROOT, reading the request
+in fixed-size blocks, so no request holds a whole video in memory or in a
+temporary file. A chunk only advances the offset once it has been received in
+full (and matches its ``X-Chunk-SHA256`` when sent), so after a dropped
+connection the client asks for the offset and carries on from there. A chunk
+claims its offset before writing, so a retry racing the original request gets
+409 instead of both writing the same bytes; a claim left by a dead request
+lapses after LESSON_UPLOAD_CLAIM_TIMEOUT seconds. Finalize checks the whole
+file's checksum and attaches it to the lesson, deleting the video it replaces.
+
+Uploads untouched for LESSON_UPLOAD_TTL seconds are removed, with their
+partial files, by ``manage.py purge_video_uploads``.
+"""
+import hashlib
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Lesson, VideoUpload
+
+BLOCK_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    pass
+
+
+class OffsetMismatch(UploadError):
+    def __init__(self, offset):
+        super().__init__(f"Chunk must start at offset {offset}")
+        self.offset = offset
+
+
+class ChunkInProgress(OffsetMismatch):
+    def __init__(self, offset):
+        UploadError.__init__(self, f"Another request is writing the chunk at offset {offset}")
+        self.offset = offset
+
+
+def get_max_chunk():
+    return getattr(settings, 'LESSON_UPLOAD_MAX_CHUNK', 8 * 1024 * 1024)
+
+
+def get_max_size():
+    return getattr(settings, 'LESSON_UPLOAD_MAX_SIZE', 2 * 1024 * 1024 * 1024)
+
+
+def get_ttl():
+    return getattr(settings, 'LESSON_UPLOAD_TTL', 24 * 3600)
+
+
+def get_claim_timeout():
+    return getattr(settings, 'LESSON_UPLOAD_CLAIM_TIMEOUT', 600)
+
+
+def start(lesson, user, filename, size, sha256=''):
+    """Reserves the file the video will be written to and returns the upload."""
+    if not 0 < size <= get_max_size():
+        raise UploadError(f"size must be between 1 and {get_max_size()} bytes")
+    name = lesson.video_file.field.generate_filename(lesson, os.path.basename(filename))
+    # Saving an empty file claims the name, so two uploads never share a file
+    path = default_storage.save(name, ContentFile(b''))
+    try:
+        default_storage.path(path)
+    except NotImplementedError:
+        default_storage.delete(path)
+        raise UploadError("Resumable uploads need file system storage")
+    return VideoUpload.objects.create(
+        lesson=lesson, created_by=user, filename=filename, path=path, size=size, sha256=(sha256 or '').lower(),
+    )
+
+
+def write_chunk(upload, offset, stream, length, sha256=''):
+    """
+    Writes ``length`` bytes read from ``stream`` at ``offset``. Returns the new
+    offset; raises OffsetMismatch if ``offset`` is not the confirmed one, or
+    ChunkInProgress if another request is writing it.
+    """
+    if upload.status != 'uploading':
+        raise UploadError("Upload is already complete")
+    if offset != upload.received:
+        raise OffsetMismatch(upload.received)
+    if not 0 < length <= get_max_chunk():
+        raise UploadError(f"Chunks must be between 1 and {get_max_chunk()} bytes")
+    if offset + length > upload.size:
+        raise UploadError("Chunk runs past the declared size")
+
+    claimed_at = timezone.now()
+    unclaimed = Q(writing_since__isnull=True) | Q(writing_since__lt=claimed_at - timedelta(seconds=get_claim_timeout()))
+    claimed = VideoUpload.objects.filter(unclaimed, pk=upload.pk, status='uploading', received=offset).update(
+        writing_since=claimed_at,
+    )
+    if not claimed:
+        upload.refresh_from_db()
+        if upload.status == 'uploading' and upload.received == offset:
+            raise ChunkInProgress(offset)
+        raise OffsetMismatch(upload.received)
+
+    # Our claim, unless it lapsed and another request took the offset over
+    ours = VideoUpload.objects.filter(pk=upload.pk, writing_since=claimed_at)
+    try:
+        digest = hashlib.sha256()
+        written = 0
+        with open(default_storage.path(upload.path), 'r+b') as file:
+            file.seek(offset)
+            while written < length:
+                block = stream.read(min(BLOCK_SIZE, length - written))
+                if not block:
+                    break
+                digest.update(block)
+                file.write(block)
+                written += len(block)
+            file.flush()
+            os.fsync(file.fileno())
+
+        # Bytes written past the confirmed offset are simply overwritten by the retry
+        if written < length:
+            raise UploadError(f"Chunk ended after {written} of {length} bytes")
+        if sha256 and digest.hexdigest() != sha256.lower():
+            raise UploadError("Chunk checksum does not match")
+    except BaseException:
+        ours.update(writing_since=None)
+        raise
+
+    advanced = ours.update(received=offset + length, writing_since=None, updated_at=timezone.now())
+    if not advanced:
+        upload.refresh_from_db()
+        raise OffsetMismatch(upload.received)
+    upload.received = offset + length
+    upload.writing_since = None
+    return upload.received
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with default_storage.open(path, 'rb') as file:
+        for block in iter(lambda: file.read(BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def finalize(upload):
+    """
+    Verifies the file and makes it the lesson's video, deleting the video it
+    replaces.
+    """
+    if upload.status == 'complete':
+        return upload
+    if upload.received != upload.size:
+        raise UploadError(f"Only {upload.received} of {upload.size} bytes received")
+    if upload.sha256 and file_sha256(upload.path) != upload.sha256:
+        VideoUpload.objects.filter(pk=upload.pk).update(received=0)
+        raise UploadError("File checksum does not match; upload it again")
+
+    with transaction.atomic():
+        # Conditional, so of two concurrent finalize calls only one attaches
+        completed = VideoUpload.objects.filter(pk=upload.pk, status='uploading', received=upload.size).update(
+            status='complete', updated_at=timezone.now(),
+        )
+        if not completed:
+            upload.refresh_from_db()
+            if upload.status == 'complete':
+                return upload
+            raise UploadError(f"Only {upload.received} of {upload.size} bytes received")
+        lesson = Lesson.objects.select_for_update().get(pk=upload.lesson_id)
+        previous = lesson.video_file.name
+        lesson.video_file.name = upload.path
+        lesson.save(update_fields=['video_file'])
+        if previous and previous != upload.path:
+            transaction.on_commit(lambda: default_storage.delete(previous))
+    upload.status = 'complete'
+    return upload
+
+
+def purge_abandoned(ttl=None):
+    """
+    Deletes uploads idle for ``ttl`` seconds: unfinished ones with their
+    partial files, finished ones (whose file now belongs to the lesson)
+    without. Returns (abandoned, finished) counts.
+    """
+    cutoff = timezone.now() - timedelta(seconds=get_ttl() if ttl is None else ttl)
+    stale = VideoUpload.objects.filter(updated_at__lt=cutoff)
+    abandoned = 0
+    for upload in stale.filter(status='uploading'):
+        default_storage.delete(upload.path)
+        upload.delete()
+        abandoned += 1
+    finished, _ = stale.filter(status='complete').delete()
+    return abandoned, finished
@@ -1,10 +1,13 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import LessonViewSet
+from .views import LessonVideoView, LessonViewSet, VideoUploadViewSet
 
 router = DefaultRouter()
+# Registered before the lessons so 'uploads/' is not taken for a pk
+router.register(r'uploads', VideoUploadViewSet)
 router.register(r'', LessonViewSet)
 
 urlpatterns = [
+    path('<int:pk>/video/', LessonVideoView.as_view(), name='lesson-video'),
     path('', include(router.urls)),
 ]
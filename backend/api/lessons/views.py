@@ -1,7 +1,138 @@
-from rest_framework import viewsets
-from .models import Lesson
-from .serializers import LessonSerializer
+from rest_framework import mixins, viewsets, permissions, status
+from rest_framework.decorators import action
+from rest_framework.negotiation import BaseContentNegotiation
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from api.permissions import IsInstructor
+from .models import Lesson, VideoUpload
+from .serializers import LessonListSerializer, LessonSerializer, VideoUploadSerializer
+from . import streaming, uploads
 
 class LessonViewSet(viewsets.ModelViewSet):
     queryset = Lesson.objects.all()
     serializer_class = LessonSerializer
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'list':
+            queryset = queryset.defer('content', 'content_html')
+        return queryset
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return LessonListSerializer
+        return LessonSerializer
+
+    @action(detail=True, methods=['get'])
+    def html(self, request, pk=None):
+        """
+        The lesson content rendered to sanitized HTML. The ETag is the content
+        hash, so If-None-Match gets a 304 until the lesson is edited.
+        """
+        lesson = self.get_object()
+        # Content changed without Lesson.save (e.g. a queryset update) is
+        # rendered for this response only; a GET never writes
+        lesson.render_content()
+        etag = f'"{lesson.content_hash}"'
+        response = get_conditional_response(request._request, etag=etag)
+        if response is None:
+            response = Response({'id': lesson.pk, 'content_hash': lesson.content_hash, 'html': lesson.content_html})
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+class IgnoreAccept(BaseContentNegotiation):
+    # Players send Accept: video/*; errors are rendered as JSON regardless
+    def select_parser(self, request, parsers):
+        return parsers[0]
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+class LessonVideoView(APIView):
+    """
+    Streams a lesson's video to a signed-in user, or to the holder of the
+    signed ``video_stream_url`` from the lesson payload.
+    """
+    content_negotiation_class = IgnoreAccept
+
+    def get(self, request, pk):
+        lesson = get_object_or_404(Lesson, pk=pk)
+        user = request.user
+        if not user.is_authenticated:
+            user = streaming.token_user(lesson, request.query_params.get('token'))
+        if user is None:
+            return Response({"error": "Authentication required"}, status=status.HTTP_401_UNAUTHORIZED)
+        if not lesson.video_file:
+            return Response({"error": "This lesson has no video"}, status=status.HTTP_404_NOT_FOUND)
+
+        response = streaming.serve(request._request, lesson)
+        if response is None:
+            return Response({"error": "Video file is missing"}, status=status.HTTP_404_NOT_FOUND)
+        return response
+
+class VideoUploadViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """
+    Resumable lesson video uploads: create with lesson, filename, size and
+    optional sha256; PUT raw chunks with an Upload-Offset header; retrieve to
+    learn the offset to resume from; then finalize.
+    """
+    serializer_class = VideoUploadSerializer
+    permission_classes = [permissions.IsAuthenticated, IsInstructor]
+    queryset = VideoUpload.objects.all()
+
+    def get_queryset(self):
+        return VideoUpload.objects.filter(created_by=self.request.user)
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        user = request.user
+        lesson = data['lesson']
+        is_admin = user.is_staff or user.profile.role == 'admin'
+        if not is_admin and (lesson.course is None or lesson.course.instructor_id != user.pk):
+            return Response(
+                {"error": "Instructors can only upload videos to their own courses"},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        try:
+            upload = uploads.start(lesson, user, data['filename'], data['size'], data.get('sha256', ''))
+        except uploads.UploadError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(self.get_serializer(upload).data, status=status.HTTP_201_CREATED)
+
+    def update(self, request, *args, **kwargs):
+        upload = self.get_object()
+        try:
+            offset = int(request.META['HTTP_UPLOAD_OFFSET'])
+            length = int(request.META['CONTENT_LENGTH'])
+        except (KeyError, ValueError):
+            return Response({"error": "Upload-Offset and Content-Length headers are required"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            # Read from the raw request in blocks; request.data would buffer it
+            offset = uploads.write_chunk(upload, offset, request._request, length,
+                                         request.META.get('HTTP_X_CHUNK_SHA256', ''))
+        except uploads.OffsetMismatch as e:
+            response = Response({"error": str(e), "offset": e.offset}, status=status.HTTP_409_CONFLICT)
+            response['Upload-Offset'] = e.offset
+            return response
+        except uploads.UploadError as e:
+            return Response({"error": str(e), "offset": upload.received}, status=status.HTTP_400_BAD_REQUEST)
+        response = Response({"offset": offset})
+        response['Upload-Offset'] = offset
+        return response
+
+    @action(detail=True, methods=['post'])
+    def finalize(self, request, pk=None):
+        """Checks the file and makes it the lesson's video."""
+        upload = self.get_object()
+        try:
+            uploads.finalize(upload)
+        except uploads.UploadError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(self.get_serializer(upload).data)
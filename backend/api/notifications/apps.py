@@ -4,3 +4,17 @@ from django.apps import AppConfig
 class NotificationsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api.notifications'
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_init, post_save
+        from api.lessons.models import Lesson
+        from .counters import notification_deleted, notification_saved, track_read
+        from .fanout import notify_new_lesson
+        from .models import Notification
+        from .stream import notification_created
+
+        post_save.connect(notify_new_lesson, sender=Lesson, dispatch_uid='notify_new_lesson')
+        post_init.connect(track_read, sender=Notification, dispatch_uid='notification_track_read')
+        post_save.connect(notification_saved, sender=Notification, dispatch_uid='notification_unread_save')
+        post_delete.connect(notification_deleted, sender=Notification, dispatch_uid='notification_unread_delete')
+        post_save.connect(notification_created, sender=Notification, dispatch_uid='notification_stream_publish')
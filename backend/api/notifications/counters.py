@@ -0,0 +1,70 @@
+"""
+Per-user unread notification counters.
+
+The badge polls unread_count, which reads one UnreadCounter row by primary key
+instead of counting notifications. Counters are adjusted in place: the signal
+receivers below handle single creates, updates and deletes, fan-outs adjust a
+whole chunk of users with one UPDATE, and mark_all_read rebuilds. A missing
+row, or one older than NOTIFICATION_UNREAD_COUNTER_TTL seconds, is rebuilt with
+a count over notification_user_read_idx, which also heals any drift left by
+racing updates.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import Notification, UnreadCounter
+
+
+def get_ttl():
+    return getattr(settings, 'NOTIFICATION_UNREAD_COUNTER_TTL', 3600)
+
+
+def rebuild(user_id):
+    count = Notification.objects.filter(user_id=user_id, read=False).count()
+    UnreadCounter.objects.update_or_create(user_id=user_id, defaults={'count': count, 'rebuilt_at': timezone.now()})
+    return count
+
+
+def get_unread_count(user_id):
+    row = UnreadCounter.objects.filter(user_id=user_id).values_list('count', 'rebuilt_at').first()
+    if row is None or row[1] < timezone.now() - timedelta(seconds=get_ttl()):
+        return rebuild(user_id)
+    return row[0]
+
+
+def adjust(user_ids, delta):
+    """Adds ``delta`` to the counters of ``user_ids`` that exist."""
+    if delta:
+        UnreadCounter.objects.filter(user_id__in=user_ids).update(count=Greatest(F('count') + delta, Value(0)))
+
+
+def track_read(sender, instance, **kwargs):
+    # The read flag as loaded, so post_save can tell what changed
+    loaded = instance.pk is not None and 'read' not in instance.get_deferred_fields()
+    instance._loaded_read = instance.read if loaded else None
+
+
+def notification_saved(sender, instance, created, update_fields=None, **kwargs):
+    if instance.user_id is None:
+        return
+    if created:
+        delta = 0 if instance.read else 1
+    elif update_fields is not None and 'read' not in update_fields:
+        delta = 0
+    elif instance._loaded_read is None:
+        # Saved without having been loaded first; we cannot know the change.
+        UnreadCounter.objects.filter(user_id=instance.user_id).delete()
+        delta = 0
+    else:
+        delta = int(instance._loaded_read) - int(instance.read)
+    adjust([instance.user_id], delta)
+    instance._loaded_read = instance.read
+
+
+def notification_deleted(sender, instance, **kwargs):
+    if instance.user_id is not None and not instance.read:
+        adjust([instance.user_id], -1)
@@ -0,0 +1,131 @@
+"""
+Notification fan-out to a course or a role.
+
+fan_out() records a FanOut and returns straight away; once the surrounding
+transaction commits, a background thread writes the notifications with one
+bulk_create per NOTIFICATION_FANOUT_CHUNK recipients. Recipients are walked in
+user id order and each chunk advances ``sent`` and ``cursor`` in the same
+transaction as its inserts, so clients can poll progress and a fan-out
+interrupted by a restart picks up where it stopped
+(``manage.py run_notification_fanouts --resume``).
+
+Model signals can call fan_out() directly; notify_new_lesson is wired to
+Lesson creation in NotificationsConfig.ready.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import counters, stream
+from .models import FanOut, Notification
+
+logger = logging.getLogger(__name__)
+
+
+def get_chunk_size():
+    return getattr(settings, 'NOTIFICATION_FANOUT_CHUNK', 1000)
+
+
+def get_workers():
+    return getattr(settings, 'NOTIFICATION_FANOUT_WORKERS', 1)
+
+
+def recipients(fanout):
+    """User ids the fan-out targets, in the order they are written."""
+    users = User.objects.filter(is_active=True)
+    if fanout.course_id is not None:
+        users = users.filter(progress__course_id=fanout.course_id)
+    if fanout.role:
+        users = users.filter(profile__role=fanout.role)
+    return users.order_by('pk').values_list('pk', flat=True)
+
+
+def fan_out(title, message, type='info', course=None, role='', created_by=None):
+    """
+    Queues ``title``/``message`` for every user of ``course`` (students with
+    progress in it) and/or with ``role``. Returns the FanOut to poll.
+    """
+    fanout = FanOut.objects.create(
+        title=title, message=message, type=type, course=course, role=role or '', created_by=created_by,
+    )
+    transaction.on_commit(lambda: _schedule(fanout.pk))
+    return fanout
+
+
+def _schedule(pk):
+    if get_workers() <= 0:
+        run_fanout(pk)
+    else:
+        get_executor().submit(_run_in_thread, pk)
+
+
+def _run_in_thread(pk):
+    try:
+        run_fanout(pk)
+    except Exception:
+        logger.exception("Notification fan-out %s failed", pk)
+    finally:
+        close_old_connections()
+
+
+def run_fanout(pk, resume=False):
+    """
+    Writes the notifications of one fan-out. Returns False if it was not
+    queued (or, with ``resume``, interrupted or failed) and so is left alone.
+    """
+    states = ('queued', 'running', 'failed') if resume else ('queued',)
+    # Conditional update so two processes never write the same fan-out.
+    claimed = FanOut.objects.filter(pk=pk, status__in=states).update(status='running', started_at=timezone.now())
+    if not claimed:
+        return False
+
+    fanout = FanOut.objects.get(pk=pk)
+    try:
+        targets = recipients(fanout)
+        FanOut.objects.filter(pk=pk).update(total=fanout.sent + targets.filter(pk__gt=fanout.cursor).count())
+        cursor, chunk = fanout.cursor, get_chunk_size()
+        while True:
+            users = list(targets.filter(pk__gt=cursor)[:chunk])
+            if not users:
+                break
+            with transaction.atomic():
+                Notification.objects.bulk_create([
+                    Notification(user_id=user_id, title=fanout.title, message=fanout.message, type=fanout.type)
+                    for user_id in users
+                ])
+                counters.adjust(users, 1)
+                stream.publish(users)
+                FanOut.objects.filter(pk=pk).update(sent=F('sent') + len(users), cursor=users[-1])
+            cursor = users[-1]
+    except Exception as e:
+        FanOut.objects.filter(pk=pk).update(status='failed', error=str(e), finished_at=timezone.now())
+        raise
+    FanOut.objects.filter(pk=pk).update(status='done', finished_at=timezone.now())
+    return True
+
+
+def notify_new_lesson(sender, instance, created, **kwargs):
+    if created and instance.course_id is not None:
+        fan_out(
+            title=f"New lesson: {instance.title}",
+            message=f"A new lesson was added to {instance.course.title}.",
+            course=instance.course,
+        )
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max(get_workers(), 1), thread_name_prefix='notification-fanout')
+        return _executor
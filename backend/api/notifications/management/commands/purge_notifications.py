@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+
+from api.notifications import retention
+
+
+class Command(BaseCommand):
+    help = "Deletes read notifications older than NOTIFICATION_RETENTION_DAYS for their type."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=retention.get_batch_size(),
+                            help="Rows deleted per transaction.")
+        parser.add_argument('--pause', type=float, default=0,
+                            help="Seconds to sleep between batches.")
+        parser.add_argument('--archive', metavar='PATH',
+                            help="Append removed rows to this gzipped JSON Lines file first.")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Only count what would be removed.")
+        parser.add_argument('--vacuum', action='store_true',
+                            help="VACUUM afterwards so the freed space goes back to the filesystem.")
+        parser.add_argument('--analyze', action='store_true',
+                            help="ANALYZE afterwards to refresh query planner statistics.")
+
+    def handle(self, *args, **options):
+        if not retention.get_retention_days():
+            self.stdout.write("NOTIFICATION_RETENTION_DAYS is empty; nothing to purge.")
+            return
+
+        used_before, file_before = retention.database_size(), retention.file_size()
+        removed = retention.purge(
+            batch_size=max(options['batch_size'], 1),
+            archive=options['archive'],
+            pause=options['pause'],
+            dry_run=options['dry_run'],
+        )
+        verb = "Would remove" if options['dry_run'] else "Removed"
+        detail = ", ".join(f"{type}: {count}" for type, count in removed.items())
+        self.stdout.write(f"{verb} {sum(removed.values())} notification(s) ({detail})")
+        if options['dry_run']:
+            return
+
+        if options['vacuum'] or options['analyze']:
+            retention.compact(vacuum=options['vacuum'], analyze=options['analyze'])
+        used_after, file_after = retention.database_size(), retention.file_size()
+        if used_before is not None:
+            self.stdout.write(f"Freed {max(used_before - used_after, 0)} bytes of database pages")
+        if file_before is not None and options['vacuum']:
+            self.stdout.write(f"Database file {file_before} -> {file_after} bytes")
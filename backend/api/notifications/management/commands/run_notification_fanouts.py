@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from api.notifications.fanout import run_fanout
+from api.notifications.models import FanOut
+
+
+class Command(BaseCommand):
+    help = "Runs queued notification fan-outs in this process."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--resume', action='store_true',
+                            help="Also pick up fan-outs that were interrupted or failed, from where they stopped.")
+
+    def handle(self, *args, **options):
+        states = ('queued', 'running', 'failed') if options['resume'] else ('queued',)
+        for fanout in FanOut.objects.filter(status__in=states).order_by('created_at'):
+            if run_fanout(fanout.pk, resume=options['resume']):
+                fanout.refresh_from_db()
+                self.stdout.write(f"{fanout.pk}: {fanout.status}, {fanout.sent}/{fanout.total} sent")
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from api.notifications import outbox
+
+
+class Command(BaseCommand):
+    help = "Delivers queued email/SMS messages from the notification outbox in this process."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=outbox.get_workers(),
+                            help="Number of dispatcher threads.")
+        parser.add_argument('--once', action='store_true',
+                            help="Send what is due now, print the queue stats and exit.")
+        parser.add_argument('--retry-dead', action='store_true',
+                            help="Requeue dead messages before sending.")
+
+    def handle(self, *args, **options):
+        if options['retry_dead']:
+            self.stdout.write(f"Requeued {outbox.retry_dead()} dead message(s).")
+        if options['once']:
+            outbox.housekeeping()
+            claimed = outbox.drain()
+            stats = outbox.stats()
+            self.stdout.write(f"Processed {claimed} message(s); lag {stats['lag_seconds']:.1f}s, "
+                              f"{stats['sent_per_minute']} sent/min")
+            for transport, counts in stats['transports'].items():
+                summary = ", ".join(f"{count} {status}" for status, count in counts.items())
+                self.stdout.write(f"{transport}: {summary}")
+            return
+
+        workers = max(options['workers'], 1)
+        self.stdout.write(f"Running the notification outbox with {workers} worker(s). Press CTRL+C to stop.")
+        dispatcher = outbox.OutboxDispatcher(workers)
+        try:
+            dispatcher.join()
+        except KeyboardInterrupt:
+            dispatcher.stop()
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:58
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("notifications", "0005_outbound_message"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                condition=models.Q(("read", True)),
+                fields=["type", "created_at"],
+                name="notification_retention_idx",
+            ),
+        ),
+    ]
@@ -1,5 +1,8 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
+from api.courses.models import Course
+import uuid
 
 class Notification(models.Model):
     NOTIFICATION_TYPES = (
@@ -15,5 +18,102 @@ class Notification(models.Model):
     read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # History pages (api/notifications/pagination.py)
+            models.Index(fields=['user', 'created_at', 'id'], name='notification_user_created_idx'),
+            # Read/unread pages, and rebuilding unread counters (api/notifications/counters.py)
+            models.Index(fields=['user', 'read', 'created_at', 'id'], name='notification_user_read_idx'),
+            # Retention purges of expired read notifications (api/notifications/retention.py)
+            models.Index(fields=['type', 'created_at'], name='notification_retention_idx', condition=models.Q(read=True)),
+        ]
+
     def __str__(self):
         return self.title
+
+class UnreadCounter(models.Model):
+    """
+    Cached number of unread notifications per user. A missing row means
+    unknown; it is rebuilt from notification_user_read_idx on the next read.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='unread_notifications')
+    count = models.IntegerField(default=0)
+    rebuilt_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.user_id}: {self.count}"
+
+class FanOut(models.Model):
+    """
+    One notification sent to every student of a course and/or every user
+    with a role. Written in chunks by api/notifications/fanout.py; ``sent``
+    and ``cursor`` advance with each chunk so progress can be polled and an
+    interrupted fan-out resumes without duplicates.
+    """
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='fanouts')
+    title = models.CharField(max_length=255)
+    message = models.TextField()
+    type = models.CharField(max_length=20, choices=Notification.NOTIFICATION_TYPES, default='info')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, null=True, blank=True, related_name='fanouts')
+    role = models.CharField(max_length=20, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    total = models.IntegerField(default=0)
+    sent = models.IntegerField(default=0)
+    cursor = models.BigIntegerField(default=0) # last recipient user id written
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'failed')
+
+    def __str__(self):
+        return f"{self.title} - {self.status}"
+
+
+class OutboundMessage(models.Model):
+    """
+    An email or SMS waiting in the outbox. Delivered in batches per transport
+    by api/notifications/outbox.py, retried with backoff, and left ``dead``
+    after NOTIFICATION_OUTBOX_MAX_ATTEMPTS failures.
+    """
+    TRANSPORT_CHOICES = (
+        ('email', 'Email'),
+        ('sms', 'SMS'),
+    )
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('dead', 'Dead'),
+    )
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='outbound_messages')
+    transport = models.CharField(max_length=20, choices=TRANSPORT_CHOICES)
+    recipient = models.CharField(max_length=255)
+    subject = models.CharField(max_length=255, blank=True, default='')
+    content = models.TextField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    attempts = models.IntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Claiming due messages per transport
+            models.Index(fields=['status', 'transport', 'next_attempt_at'], name='outbound_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.transport} to {self.recipient} - {self.status}"
@@ -0,0 +1,297 @@
+"""
+Durable outbox for email and SMS.
+
+send_external only stores an OutboundMessage, so a slow mail server or SMS
+gateway never holds up a web worker. A dispatcher thread (or a separate
+``manage.py run_outbox`` process) claims due messages of one transport at a
+time, NOTIFICATION_OUTBOX_BATCH at once, and sends the whole batch over a
+single open connection. A failed message is retried after
+NOTIFICATION_OUTBOX_BACKOFF seconds, doubling per attempt, and is left
+``dead`` after NOTIFICATION_OUTBOX_MAX_ATTEMPTS attempts. Claims are
+conditional updates, so several dispatchers can share the queue.
+"""
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import close_old_connections, transaction
+from django.db.models import Count, F, Min
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import OutboundMessage
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = 5.0
+
+
+def get_workers():
+    return getattr(settings, 'NOTIFICATION_OUTBOX_WORKERS', 1)
+
+
+def get_batch_size():
+    return getattr(settings, 'NOTIFICATION_OUTBOX_BATCH', 50)
+
+
+def get_max_attempts():
+    return getattr(settings, 'NOTIFICATION_OUTBOX_MAX_ATTEMPTS', 5)
+
+
+def get_backoff(attempts):
+    base = getattr(settings, 'NOTIFICATION_OUTBOX_BACKOFF', 30)
+    return min(base * 2 ** (attempts - 1), getattr(settings, 'NOTIFICATION_OUTBOX_MAX_BACKOFF', 3600))
+
+
+def get_claim_timeout():
+    return getattr(settings, 'NOTIFICATION_OUTBOX_CLAIM_TIMEOUT', 300)
+
+
+def get_send_timeout():
+    return getattr(settings, 'NOTIFICATION_OUTBOX_SEND_TIMEOUT', 30)
+
+
+def get_rate_limit():
+    # Messages one user may queue per hour
+    return getattr(settings, 'NOTIFICATION_OUTBOX_RATE_LIMIT', 200)
+
+
+class EmailTransport:
+    """Sends a batch over one SMTP (or other EMAIL_BACKEND) connection."""
+
+    def __enter__(self):
+        # Bounded, so a hung server cannot outlive the claim on its batch
+        self.connection = get_connection(fail_silently=False, timeout=settings.EMAIL_TIMEOUT or get_send_timeout())
+        self.connection.open()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.connection.close()
+
+    def send(self, message):
+        EmailMessage(
+            subject=message.subject,
+            body=message.content,
+            to=[message.recipient],
+            connection=self.connection,
+        ).send()
+
+
+class LogTransport:
+    """Logs messages instead of sending them; for transports with no gateway yet."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def send(self, message):
+        logger.info("[%s] Sent to %s: %s", message.transport.upper(), message.recipient, message.content)
+
+
+def get_transports():
+    return getattr(settings, 'NOTIFICATION_OUTBOX_TRANSPORTS', {
+        'email': 'api.notifications.outbox.EmailTransport',
+        'sms': 'api.notifications.outbox.LogTransport',
+    })
+
+
+def get_transport(name):
+    return import_string(get_transports()[name])()
+
+
+def sent_recently(user):
+    """Messages ``user`` queued in the last hour, and when the oldest of them leaves the window."""
+    since = timezone.now() - timedelta(hours=1)
+    recent = OutboundMessage.objects.filter(created_by=user, created_at__gte=since)
+    oldest = recent.aggregate(oldest=Min('created_at'))['oldest']
+    retry_after = (oldest - since).total_seconds() if oldest else 0
+    return recent.count(), retry_after
+
+
+def enqueue(transport, recipient, content, subject='', created_by=None):
+    message = OutboundMessage.objects.create(
+        transport=transport, recipient=recipient, content=content, subject=subject or '', created_by=created_by,
+    )
+    if get_workers() > 0:
+        transaction.on_commit(lambda: get_dispatcher().notify())
+    return message
+
+
+def claim_batch(transport, size):
+    now = timezone.now()
+    due = OutboundMessage.objects.filter(status='queued', transport=transport, next_attempt_at__lte=now)
+    ids = list(due.order_by('next_attempt_at', 'pk').values_list('pk', flat=True)[:size])
+    if not ids:
+        return []
+    # Conditional update so two dispatchers never send the same message;
+    # claimed_at tells our claims apart from a racing dispatcher's.
+    OutboundMessage.objects.filter(pk__in=ids, status='queued').update(status='sending', claimed_at=now)
+    return list(OutboundMessage.objects.filter(pk__in=ids, status='sending', claimed_at=now).order_by('pk'))
+
+
+def send_batch(transport, messages):
+    """Sends claimed messages. Returns (sent, failed), failed as (message, error) pairs."""
+    sent, failed = [], []
+    refreshed = time.monotonic()
+    try:
+        with get_transport(transport) as connection:
+            for message in messages:
+                if time.monotonic() - refreshed > get_claim_timeout() / 4:
+                    # Renew the claim on the whole batch (sent messages stay
+                    # 'sending' until recorded) so housekeeping does not
+                    # requeue a batch that is slow but still being sent
+                    refreshed = time.monotonic()
+                    OutboundMessage.objects.filter(
+                        pk__in=[claimed.pk for claimed in messages], status='sending',
+                    ).update(claimed_at=timezone.now())
+                try:
+                    connection.send(message)
+                    sent.append(message)
+                except Exception as e:
+                    failed.append((message, str(e)))
+    except Exception as e:
+        # Could not connect (or disconnect); everything not yet sent failed
+        done = {message.pk for message in sent} | {message.pk for message, _ in failed}
+        failed += [(message, str(e)) for message in messages if message.pk not in done]
+    return sent, failed
+
+
+def record_results(sent, failed):
+    now = timezone.now()
+    if sent:
+        OutboundMessage.objects.filter(pk__in=[message.pk for message in sent]).update(
+            status='sent', sent_at=now, attempts=F('attempts') + 1, last_error='',
+        )
+    max_attempts = get_max_attempts()
+    for message, error in failed:
+        message.attempts += 1
+        message.last_error = error
+        if message.attempts >= max_attempts:
+            message.status = 'dead'
+            logger.warning("Giving up on %s message %s after %d attempts: %s",
+                           message.transport, message.pk, message.attempts, error)
+        else:
+            message.status = 'queued'
+            message.next_attempt_at = now + timedelta(seconds=get_backoff(message.attempts))
+    OutboundMessage.objects.bulk_update(
+        [message for message, _ in failed], ['attempts', 'last_error', 'status', 'next_attempt_at'],
+    )
+
+
+def dispatch(transport, size=None):
+    """Sends one batch of ``transport``. Returns the number of messages claimed."""
+    messages = claim_batch(transport, size or get_batch_size())
+    if messages:
+        sent, failed = send_batch(transport, messages)
+        record_results(sent, failed)
+    return len(messages)
+
+
+def drain():
+    """Sends every message that is due now. Returns the number claimed."""
+    total = 0
+    for transport in get_transports():
+        while True:
+            claimed = dispatch(transport)
+            total += claimed
+            if not claimed:
+                break
+    return total
+
+
+def housekeeping():
+    """
+    Requeues messages claimed by a dispatcher that died mid-batch. Live
+    dispatchers renew their claims well within the timeout.
+    """
+    cutoff = timezone.now() - timedelta(seconds=get_claim_timeout())
+    return OutboundMessage.objects.filter(status='sending', claimed_at__lt=cutoff).update(status='queued')
+
+
+def retry_dead():
+    return OutboundMessage.objects.filter(status='dead').update(
+        status='queued', attempts=0, next_attempt_at=timezone.now(),
+    )
+
+
+def stats(window=60):
+    """
+    Queue depth per status, lag of the oldest due message, and messages sent
+    in the last ``window`` seconds.
+    """
+    now = timezone.now()
+    counts = {
+        (row['transport'], row['status']): row['count']
+        for row in OutboundMessage.objects.values('transport', 'status').annotate(count=Count('pk'))
+    }
+    oldest = OutboundMessage.objects.filter(status='queued', next_attempt_at__lte=now).aggregate(
+        oldest=Min('next_attempt_at'),
+    )['oldest']
+    sent = OutboundMessage.objects.filter(status='sent', sent_at__gte=now - timedelta(seconds=window)).count()
+    return {
+        'workers': get_workers(),
+        'transports': {
+            transport: {status: counts.get((transport, status), 0) for status, _ in OutboundMessage.STATUS_CHOICES}
+            for transport in get_transports()
+        },
+        'lag_seconds': (now - oldest).total_seconds() if oldest else 0,
+        'sent_per_minute': round(sent * 60 / window, 1),
+    }
+
+
+class OutboxDispatcher:
+    def __init__(self, workers):
+        self._wakeup = threading.Condition()
+        self._stopping = False
+        self._threads = [
+            threading.Thread(target=self._serve, name=f'notification-outbox-{index}', daemon=True)
+            for index in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def notify(self):
+        with self._wakeup:
+            self._wakeup.notify()
+
+    def stop(self):
+        self._stopping = True
+        with self._wakeup:
+            self._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=5)
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+
+    def _serve(self):
+        while not self._stopping:
+            claimed = 0
+            try:
+                housekeeping()
+                claimed = drain()
+            except Exception:
+                logger.exception("Notification outbox dispatcher failed")
+            finally:
+                close_old_connections()
+            if not claimed:
+                with self._wakeup:
+                    self._wakeup.wait(timeout=POLL_INTERVAL)
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher():
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = OutboxDispatcher(get_workers())
+        return _dispatcher
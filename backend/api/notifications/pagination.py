@@ -0,0 +1,89 @@
+"""
+Keyset pagination for notification history.
+
+Pages are ordered newest first by (created_at, id) and the cursor holds the
+position of the last row of the previous page, so each page is an index range
+scan from that position on notification_user_created_idx. The tenth page costs
+the same as the first, where OFFSET would read and skip every earlier row, and
+notifications arriving while a client pages do not shift it.
+"""
+import base64
+import binascii
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+ORDERING = ('-created_at', '-id')
+
+
+def get_page_size():
+    return getattr(settings, 'NOTIFICATION_PAGE_SIZE', 20)
+
+
+def get_max_page_size():
+    return getattr(settings, 'NOTIFICATION_MAX_PAGE_SIZE', 100)
+
+
+def encode_cursor(created_at, pk):
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{pk}".encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        created_at, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        position = parse_datetime(created_at), int(pk)
+    except (binascii.Error, UnicodeError, ValueError):
+        raise NotFound("Invalid cursor")
+    if position[0] is None:
+        raise NotFound("Invalid cursor")
+    return position
+
+
+class NotificationCursorPagination(BasePagination):
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, get_page_size()))
+        except ValueError:
+            size = get_page_size()
+        return min(max(size, 1), get_max_page_size())
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        queryset = queryset.order_by(*ORDERING)
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            created_at, pk = decode_cursor(cursor)
+            queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+
+        size = self.get_page_size(request)
+        # One extra row tells us whether there is a next page
+        rows = list(queryset[:size + 1])
+        page = rows[:size]
+        self.next_cursor = encode_cursor(page[-1].created_at, page[-1].pk) if len(rows) > size else None
+        return page
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
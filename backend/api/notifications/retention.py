@@ -0,0 +1,109 @@
+"""
+Retention for read notifications.
+
+NOTIFICATION_RETENTION_DAYS maps a notification type to the number of days a
+read notification of that type is kept; types left out are kept forever and
+unread notifications are never removed. purge() deletes expired rows
+NOTIFICATION_RETENTION_BATCH at a time, each batch in its own short
+transaction, so on SQLite writers wait for one small batch at most rather than
+for the whole purge. Rows can be appended to a gzipped JSON Lines archive
+before they are deleted. Run it with ``manage.py purge_notifications``.
+"""
+import gzip
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Notification
+
+ARCHIVE_FIELDS = ('id', 'user_id', 'title', 'message', 'type', 'read', 'created_at')
+
+
+def get_retention_days():
+    return getattr(settings, 'NOTIFICATION_RETENTION_DAYS', {})
+
+
+def get_batch_size():
+    return getattr(settings, 'NOTIFICATION_RETENTION_BATCH', 500)
+
+
+def expired(type, days, now=None):
+    cutoff = (now or timezone.now()) - timedelta(days=days)
+    return Notification.objects.filter(type=type, read=True, created_at__lt=cutoff)
+
+
+def purge(batch_size=None, archive=None, pause=0, dry_run=False, now=None):
+    """
+    Deletes expired read notifications. Returns the rows removed per type.
+    ``archive`` is a path the removed rows are appended to first.
+    """
+    batch_size = batch_size or get_batch_size()
+    removed = {}
+    for type, days in get_retention_days().items():
+        queryset = expired(type, days, now)
+        if dry_run:
+            removed[type] = queryset.count()
+            continue
+        removed[type] = 0
+        while True:
+            with transaction.atomic():
+                # Oldest first, in notification_retention_idx order, so no sort
+                rows = list(queryset.order_by('created_at', 'pk').values(*ARCHIVE_FIELDS)[:batch_size])
+                if not rows:
+                    break
+                if archive:
+                    _archive(archive, rows)
+                Notification.objects.filter(pk__in=[row['id'] for row in rows]).delete()
+            removed[type] += len(rows)
+            if pause:
+                # Leave a gap for writers waiting on the database lock
+                time.sleep(pause)
+    return removed
+
+
+def _archive(path, rows):
+    # Each batch is its own gzip member; `zcat` reads the whole file
+    with gzip.open(path, 'at', encoding='utf-8') as archive:
+        for row in rows:
+            archive.write(json.dumps(row, default=str) + '\n')
+
+
+def database_size():
+    """Bytes used by the database, or None where we cannot tell."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute("PRAGMA page_count")
+            pages = cursor.fetchone()[0]
+            cursor.execute("PRAGMA freelist_count")
+            free = cursor.fetchone()[0]
+            cursor.execute("PRAGMA page_size")
+            return (pages - free) * cursor.fetchone()[0]
+        if connection.vendor == 'postgresql':
+            cursor.execute("SELECT pg_total_relation_size(%s)", [Notification._meta.db_table])
+            return cursor.fetchone()[0]
+    return None
+
+
+def file_size():
+    """Bytes the SQLite file takes on disk; freed pages only return with VACUUM."""
+    if connection.vendor != 'sqlite':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA page_count")
+        pages = cursor.fetchone()[0]
+        cursor.execute("PRAGMA page_size")
+        return pages * cursor.fetchone()[0]
+
+
+def compact(vacuum=False, analyze=False):
+    """Runs VACUUM and/or ANALYZE. Must run outside a transaction."""
+    table = connection.ops.quote_name(Notification._meta.db_table)
+    with connection.cursor() as cursor:
+        if vacuum:
+            cursor.execute("VACUUM" if connection.vendor == 'sqlite' else f"VACUUM {table}")
+        if analyze:
+            cursor.execute("ANALYZE" if connection.vendor == 'sqlite' else f"ANALYZE {table}")
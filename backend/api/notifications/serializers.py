@@ -1,7 +1,30 @@
 from rest_framework import serializers
-from .models import Notification
+from api.authapi.models import Profile
+from .models import FanOut, Notification
 
 class NotificationSerializer(serializers.ModelSerializer):
     class Meta:
         model = Notification
         fields = '__all__'
+
+class FanOutSerializer(serializers.ModelSerializer):
+    role = serializers.ChoiceField(choices=Profile.USER_ROLES, required=False, allow_blank=True)
+    progress = serializers.SerializerMethodField()
+
+    class Meta:
+        model = FanOut
+        fields = (
+            'id', 'title', 'message', 'type', 'course', 'role', 'status',
+            'total', 'sent', 'progress', 'error', 'created_at', 'started_at', 'finished_at',
+        )
+        read_only_fields = ('status', 'total', 'sent', 'error', 'created_at', 'started_at', 'finished_at')
+
+    def get_progress(self, obj):
+        if obj.status == 'done':
+            return 100.0
+        return round(obj.sent * 100 / obj.total, 1) if obj.total else 0.0
+
+    def validate(self, data):
+        if not data.get('course') and not data.get('role'):
+            raise serializers.ValidationError("Target a course, a role or both.")
+        return data
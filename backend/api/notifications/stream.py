@@ -0,0 +1,217 @@
+"""
+Server-Sent Events stream of a user's new notifications.
+
+A client keeps one GET /api/notifications/stream/ open instead of polling the
+list. Under ASGI the stream is an async generator, so an idle connection holds
+no thread. It waits on the in-process broker below, which the create paths
+(the Notification post_save receiver and fan-out chunks) publish to once their
+transaction commits. The broker only reaches streams in the same process, so
+with several web processes (or notifications created by management commands)
+set NOTIFICATION_STREAM_POLL_DB and streams also re-check the database every
+NOTIFICATION_STREAM_POLL_INTERVAL seconds. Events carry the notification id, so a reconnecting
+EventSource resumes from Last-Event-ID without gaps. Streams close after
+NOTIFICATION_STREAM_MAX_AGE seconds and the client reconnects.
+"""
+import asyncio
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from rest_framework.renderers import BaseRenderer
+
+from . import counters
+from .models import Notification
+from .serializers import NotificationSerializer
+
+
+def get_poll_db():
+    return getattr(settings, 'NOTIFICATION_STREAM_POLL_DB', False)
+
+
+def get_poll_interval():
+    return getattr(settings, 'NOTIFICATION_STREAM_POLL_INTERVAL', 5)
+
+
+def get_keepalive():
+    return getattr(settings, 'NOTIFICATION_STREAM_KEEPALIVE', 15)
+
+
+def get_max_age():
+    return getattr(settings, 'NOTIFICATION_STREAM_MAX_AGE', 300)
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Lets DRF accept ``text/event-stream`` and render errors as an event."""
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return format_event('error', data).encode()
+
+
+class Broker:
+    """In-process pub/sub that wakes the streams of the given users."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waiters = {}
+
+    @contextmanager
+    def subscribe(self, user_id, waiter):
+        with self._lock:
+            self._waiters.setdefault(user_id, set()).add(waiter)
+        try:
+            yield waiter
+        finally:
+            with self._lock:
+                waiters = self._waiters.get(user_id)
+                waiters.discard(waiter)
+                if not waiters:
+                    del self._waiters[user_id]
+
+    def publish(self, user_ids):
+        with self._lock:
+            waiters = [waiter for user_id in set(user_ids) for waiter in self._waiters.get(user_id, ())]
+        for waiter in waiters:
+            waiter.wake()
+
+    def subscribers(self):
+        with self._lock:
+            return sum(len(waiters) for waiters in self._waiters.values())
+
+
+class ThreadWaiter:
+    def __init__(self):
+        self._event = threading.Event()
+
+    def wake(self):
+        self._event.set()
+
+    def wait(self, timeout):
+        woken = self._event.wait(timeout)
+        self._event.clear()
+        return woken
+
+
+class AsyncWaiter:
+    def __init__(self):
+        self._loop = asyncio.get_running_loop()
+        self._event = asyncio.Event()
+
+    def wake(self):
+        # Publishers run in worker threads, not on the event loop
+        self._loop.call_soon_threadsafe(self._event.set)
+
+    async def wait(self, timeout):
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+            woken = True
+        except asyncio.TimeoutError:
+            woken = False
+        self._event.clear()
+        return woken
+
+
+_broker = Broker()
+
+
+def get_broker():
+    return _broker
+
+
+def publish(user_ids):
+    """Wakes the streams of ``user_ids`` once the current transaction commits."""
+    user_ids = list(user_ids)
+    transaction.on_commit(lambda: _broker.publish(user_ids))
+
+
+def notification_created(sender, instance, created, **kwargs):
+    if created and instance.user_id is not None:
+        publish([instance.user_id])
+
+
+def format_event(name, data, event_id=None):
+    lines = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{lines}event: {name}\ndata: {json.dumps(data)}\n\n"
+
+
+def start_position(user_id, last_event_id):
+    """
+    The id to stream after: the client's Last-Event-ID, or the user's newest
+    notification so a fresh stream only carries what arrives from now on.
+    """
+    try:
+        return int(last_event_id)
+    except (TypeError, ValueError):
+        return Notification.objects.filter(user_id=user_id).order_by('-pk').values_list('pk', flat=True).first() or 0
+
+
+def fetch(user_id, position):
+    """SSE chunks for the notifications after ``position``, and the new position."""
+    notifications = list(Notification.objects.filter(user_id=user_id, pk__gt=position).order_by('pk')[:100])
+    if not notifications:
+        return [], position
+    chunks = [
+        format_event('notification', data, data['id'])
+        for data in NotificationSerializer(notifications, many=True).data
+    ]
+    chunks.append(format_event('unread', {'unread': counters.get_unread_count(user_id)}))
+    return chunks, notifications[-1].pk
+
+
+def _timeouts(deadline, last_sent):
+    now = time.monotonic()
+    timeout = min(last_sent + get_keepalive() - now, deadline - now)
+    if get_poll_db():
+        timeout = min(timeout, get_poll_interval())
+    return timeout, now
+
+
+def events(user_id, position):
+    """Blocking stream for WSGI servers; holds a thread while open."""
+    deadline = time.monotonic() + get_max_age()
+    with _broker.subscribe(user_id, ThreadWaiter()) as waiter:
+        yield f"retry: {get_poll_interval() * 1000}\n\n"
+        last_sent = time.monotonic()
+        while True:
+            chunks, position = fetch(user_id, position)
+            if chunks:
+                yield ''.join(chunks)
+                last_sent = time.monotonic()
+            timeout, now = _timeouts(deadline, last_sent)
+            if now >= deadline:
+                return
+            if now >= last_sent + get_keepalive():
+                yield ": keepalive\n\n"
+                last_sent = now
+                continue
+            waiter.wait(timeout)
+
+
+async def async_events(user_id, position):
+    """The same stream for ASGI; waits on the event loop without a thread."""
+    deadline = time.monotonic() + get_max_age()
+    # Not thread-sensitive: on the shared sync thread every stream's fetch
+    # would queue behind the others and behind every sync view
+    async_fetch = sync_to_async(fetch, thread_sensitive=False)
+    with _broker.subscribe(user_id, AsyncWaiter()) as waiter:
+        yield f"retry: {get_poll_interval() * 1000}\n\n"
+        last_sent = time.monotonic()
+        while True:
+            chunks, position = await async_fetch(user_id, position)
+            if chunks:
+                yield ''.join(chunks)
+                last_sent = time.monotonic()
+            timeout, now = _timeouts(deadline, last_sent)
+            if now >= deadline:
+                return
+            if now >= last_sent + get_keepalive():
+                yield ": keepalive\n\n"
+                last_sent = now
+                continue
+            await waiter.wait(timeout)
@@ -1,3 +1,405 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import tempfile
+from io import StringIO
+from django.utils import timezone
+import socketserver
+import threading
+import time
+from datetime import timedelta
+from django.core import mail
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.contrib.auth.models import User
+from rest_framework.test import APIClient
+from rest_framework import status
+from api.authapi.models import Profile
+from api.courses.models import Course
+from api.lessons.models import Lesson
+from api.progress.models import Progress
+from . import counters, outbox, retention, stream
+from .fanout import fan_out
+from .models import FanOut, Notification, OutboundMessage, UnreadCounter
 
-# Create your tests here.
+@override_settings(NOTIFICATION_FANOUT_WORKERS=0, NOTIFICATION_FANOUT_CHUNK=2)
+class FanOutTests(TestCase):
+    def setUp(self):
+        self.instructor = User.objects.create_user(username='teacher', password='password')
+        Profile.objects.create(user=self.instructor, role='instructor')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.instructor)
+        self.course = Course.objects.create(title="Python", description="", instructor=self.instructor)
+        self.students = []
+        for index in range(5):
+            student = User.objects.create_user(username=f'student{index}')
+            Profile.objects.create(user=student, role='student')
+            Progress.objects.create(user=student, course=self.course)
+            self.students.append(student)
+
+    def test_course_fan_out(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/notifications/fanouts/', {
+                "title": "Exam moved", "message": "Now on Friday", "course": self.course.id,
+            }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['status'], 'queued')
+        self.assertEqual(Notification.objects.filter(title="Exam moved").count(), 5)
+        self.assertEqual(Notification.objects.filter(user=self.students[0]).count(), 1)
+
+        response = self.client.get(f"/api/notifications/fanouts/{response.data['id']}/")
+        self.assertEqual(response.data['status'], 'done')
+        self.assertEqual((response.data['sent'], response.data['total'], response.data['progress']), (5, 5, 100.0))
+
+    def test_interrupted_fan_out_resumes_without_duplicates(self):
+        fanout = fan_out("Reminder", "Submit your project", role='student')
+        FanOut.objects.filter(pk=fanout.pk).update(status='running', sent=2, cursor=self.students[1].pk)
+        Notification.objects.bulk_create([
+            Notification(user=student, title="Reminder", message="") for student in self.students[:2]
+        ])
+
+        out = StringIO()
+        call_command('run_notification_fanouts', '--resume', stdout=out)
+        self.assertIn("done, 5/5 sent", out.getvalue())
+        for student in self.students:
+            self.assertEqual(Notification.objects.filter(user=student, title="Reminder").count(), 1)
+        self.assertFalse(Notification.objects.filter(user=self.instructor).exists())
+
+    def test_new_lesson_notifies_course(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Lesson.objects.create(course=self.course, title="Loops", description="", content="")
+        self.assertEqual(Notification.objects.filter(title="New lesson: Loops").count(), 5)
+
+    def test_fan_out_permissions(self):
+        data = {"title": "Hi", "message": "Hello", "role": "student"}
+        self.assertEqual(self.client.post('/api/notifications/fanouts/', data, format='json').status_code,
+                         status.HTTP_403_FORBIDDEN)
+        other = Course.objects.create(title="Go", description="", instructor=self.students[0])
+        data = {"title": "Hi", "message": "Hello", "course": other.id}
+        self.assertEqual(self.client.post('/api/notifications/fanouts/', data, format='json').status_code,
+                         status.HTTP_403_FORBIDDEN)
+        self.client.force_authenticate(user=self.students[0])
+        self.assertEqual(self.client.post('/api/notifications/fanouts/', data, format='json').status_code,
+                         status.HTTP_403_FORBIDDEN)
+        self.assertFalse(FanOut.objects.exists())
+
+class UnreadCounterTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='student', password='password')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.notifications = [
+            Notification.objects.create(user=self.user, title=f"Note {index}", message="") for index in range(3)
+        ]
+
+    def unread(self):
+        return self.client.get('/api/notifications/unread_count/').data['unread']
+
+    def test_counter_follows_reads_and_deletes(self):
+        self.assertEqual(self.unread(), 3)
+        with self.assertNumQueries(1):
+            self.assertEqual(counters.get_unread_count(self.user.pk), 3)
+
+        Notification.objects.create(user=self.user, title="Note 3", message="")
+        self.assertEqual(self.unread(), 4)
+        self.client.patch(f'/api/notifications/{self.notifications[0].id}/', {"read": True}, format='json')
+        self.assertEqual(self.unread(), 3)
+        self.notifications[1].delete()
+        self.assertEqual(self.unread(), 2)
+        self.client.post('/api/notifications/mark_all_read/')
+        self.assertEqual(self.unread(), 0)
+
+    def test_missing_or_expired_counter_is_rebuilt(self):
+        UnreadCounter.objects.create(user=self.user, count=42, rebuilt_at=timezone.now())
+        with override_settings(NOTIFICATION_UNREAD_COUNTER_TTL=0):
+            self.assertEqual(self.unread(), 3)
+        UnreadCounter.objects.all().delete()
+        self.assertEqual(self.unread(), 3)
+
+    @override_settings(NOTIFICATION_FANOUT_WORKERS=0)
+    def test_fan_out_increments_counters(self):
+        self.assertEqual(self.unread(), 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            fan_out("Maintenance", "Tonight at 10")
+        self.assertEqual(UnreadCounter.objects.get(user=self.user).count, 4)
+
+@override_settings(NOTIFICATION_STREAM_MAX_AGE=0)
+class StreamTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='student', password='password')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def read(self, response):
+        return b''.join(response.streaming_content).decode()
+
+    def test_stream_resumes_after_last_event_id(self):
+        first = Notification.objects.create(user=self.user, title="First", message="")
+        second = Notification.objects.create(user=self.user, title="Second", message="")
+        Notification.objects.create(title="Someone else's", message="")
+
+        response = self.client.get('/api/notifications/stream/', HTTP_ACCEPT='text/event-stream',
+                                   HTTP_LAST_EVENT_ID=str(first.id))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = self.read(response)
+        self.assertIn(f"id: {second.id}\nevent: notification", body)
+        self.assertNotIn('"First"', body)
+        self.assertNotIn("Someone else", body)
+        self.assertIn('event: unread\ndata: {"unread": 2}', body)
+
+        # Without Last-Event-ID only new notifications are streamed
+        body = self.read(self.client.get('/api/notifications/stream/', HTTP_ACCEPT='text/event-stream'))
+        self.assertNotIn("event: notification", body)
+
+    def test_stream_requires_authentication(self):
+        self.client.force_authenticate(user=None)
+        response = self.client.get('/api/notifications/stream/', HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertTrue(response.content.startswith(b"event: error"))
+
+    def test_create_wakes_subscribed_stream(self):
+        waiter = stream.ThreadWaiter()
+        woken = []
+        with stream.get_broker().subscribe(self.user.pk, waiter):
+            thread = threading.Thread(target=lambda: woken.append(waiter.wait(5)))
+            thread.start()
+            with self.captureOnCommitCallbacks(execute=True):
+                Notification.objects.create(user=self.user, title="Ping", message="")
+            thread.join(5)
+        self.assertEqual(woken, [True])
+        self.assertEqual(stream.get_broker().subscribers(), 0)
+
+    @override_settings(NOTIFICATION_STREAM_KEEPALIVE=15, NOTIFICATION_STREAM_POLL_INTERVAL=5)
+    def test_database_is_polled_only_when_configured(self):
+        deadline = time.monotonic() + 60
+        timeout, _ = stream._timeouts(deadline, time.monotonic())
+        self.assertGreater(timeout, 10)
+        with override_settings(NOTIFICATION_STREAM_POLL_DB=True):
+            timeout, _ = stream._timeouts(deadline, time.monotonic())
+        self.assertLessEqual(timeout, 5)
+
+class HistoryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='student', password='password')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        Notification.objects.bulk_create([
+            Notification(user=self.user, title=f"Note {index}", message="", type='warning' if index % 3 else 'info',
+                         read=index < 4)
+            for index in range(10)
+        ])
+        # Ties on created_at are broken by id
+        Notification.objects.filter(title__in=["Note 5", "Note 6", "Note 7"]).update(created_at=timezone.now())
+
+    def walk(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids += [item['id'] for item in response.data['results']]
+            url = response.data['next']
+        return ids
+
+    def test_pages_cover_history_newest_first(self):
+        expected = list(Notification.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(self.walk('/api/notifications/?page_size=3'), expected)
+
+    def test_deep_page_is_a_single_query(self):
+        response = self.client.get('/api/notifications/?page_size=3')
+        for _ in range(2):
+            response = self.client.get(response.data['next'])
+        with self.assertNumQueries(1):
+            self.client.get(response.data['next'])
+
+    def test_filters(self):
+        unread = self.walk('/api/notifications/?read=false&page_size=4')
+        self.assertEqual(len(unread), 6)
+        self.assertFalse(Notification.objects.filter(id__in=unread, read=True).exists())
+        self.assertEqual(len(self.walk('/api/notifications/?type=info')), 4)
+        self.assertEqual(self.client.get('/api/notifications/?read=maybe').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get('/api/notifications/?cursor=bogus').status_code, status.HTTP_404_NOT_FOUND)
+
+class SMTPStandIn(socketserver.ThreadingTCPServer):
+    """Just enough SMTP to accept mail locally; refuses recipients at bounce.test."""
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), SMTPHandler)
+        self.connections = 0
+        self.delivered = []
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply("220 localhost")
+        recipients = []
+        while True:
+            line = self.rfile.readline().decode().strip()
+            command = line[:4].upper()
+            if not line or command == 'QUIT':
+                self.reply("221 bye")
+                return
+            if command == 'RCPT':
+                if 'bounce.test' in line:
+                    self.reply("550 no such user")
+                    continue
+                recipients.append(line.split(':', 1)[1].strip(' <>'))
+            if command == 'DATA':
+                self.reply("354 go ahead")
+                while self.rfile.readline().strip() != b'.':
+                    pass
+                self.server.delivered += recipients
+                recipients = []
+            elif command == 'RSET':
+                recipients = []
+            self.reply("250 ok")
+
+class SlowTransport(outbox.LogTransport):
+    # Runs housekeeping mid-batch, as another dispatcher would
+    def send(self, message):
+        time.sleep(0.2)
+        SlowTransport.requeued += outbox.housekeeping()
+
+@override_settings(NOTIFICATION_OUTBOX_WORKERS=0)
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='teacher', password='password')
+        Profile.objects.create(user=self.user, role='instructor')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def queue(self, recipient, type='email'):
+        return self.client.post('/api/notifications/send_external/', {
+            "type": type, "recipient": recipient, "subject": "Hello", "content": "Class starts at 9",
+        }, format='json')
+
+    def test_send_external_queues_message(self):
+        response = self.queue('student@example.com')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(outbox.drain(), 1)
+        self.assertEqual(mail.outbox[0].to, ['student@example.com'])
+        self.assertEqual(OutboundMessage.objects.get(pk=response.data['id']).status, 'sent')
+        self.assertEqual(self.queue('x', type='fax').status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_batch_shares_one_smtp_connection_and_retries_failures(self):
+        server = SMTPStandIn()
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        for recipient in ('a@example.com', 'nobody@bounce.test', 'b@example.com'):
+            self.queue(recipient)
+        self.queue('+260970000000', type='sms')
+
+        with self.settings(EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+                           EMAIL_HOST='127.0.0.1', EMAIL_PORT=server.server_address[1]):
+            outbox.drain()
+            self.assertEqual(server.connections, 1)
+            self.assertEqual(server.delivered, ['a@example.com', 'b@example.com'])
+            bounced = OutboundMessage.objects.get(recipient='nobody@bounce.test')
+            self.assertEqual((bounced.status, bounced.attempts), ('queued', 1))
+            self.assertGreater(bounced.next_attempt_at, timezone.now())
+
+            # Retried once due, and dead after the last attempt
+            with self.settings(NOTIFICATION_OUTBOX_MAX_ATTEMPTS=2):
+                OutboundMessage.objects.filter(pk=bounced.pk).update(next_attempt_at=timezone.now())
+                with self.assertLogs('api.notifications.outbox', 'WARNING'):
+                    outbox.drain()
+        bounced.refresh_from_db()
+        self.assertEqual((bounced.status, bounced.attempts), ('dead', 2))
+        self.assertEqual(OutboundMessage.objects.get(transport='sms').status, 'sent')
+
+    def test_unreachable_server_backs_off_and_reports_lag(self):
+        self.queue('a@example.com')
+        self.queue('b@example.com')
+        with self.settings(EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+                           EMAIL_HOST='127.0.0.1', EMAIL_PORT=1, EMAIL_TIMEOUT=1):
+            outbox.drain()
+        self.assertEqual(OutboundMessage.objects.filter(status='queued', attempts=1).count(), 2)
+
+        OutboundMessage.objects.update(next_attempt_at=timezone.now() - timedelta(seconds=30))
+        out = StringIO()
+        with override_settings(NOTIFICATION_OUTBOX_TRANSPORTS={'email': 'api.notifications.outbox.LogTransport'}):
+            self.assertGreaterEqual(outbox.stats()['lag_seconds'], 30)
+            call_command('run_outbox', '--once', stdout=out)
+        self.assertIn("Processed 2 message(s)", out.getvalue())
+        self.assertIn("email: 0 queued, 0 sending, 2 sent, 0 dead", out.getvalue())
+
+    def test_only_instructors_may_send_and_at_a_limited_rate(self):
+        student = User.objects.create_user(username='student')
+        Profile.objects.create(user=student, role='student')
+        self.client.force_authenticate(user=student)
+        self.assertEqual(self.queue('a@example.com').status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(user=self.user)
+        with override_settings(NOTIFICATION_OUTBOX_RATE_LIMIT=2):
+            self.assertEqual(self.queue('a@example.com').status_code, status.HTTP_202_ACCEPTED)
+            self.assertEqual(self.queue('b@example.com').status_code, status.HTTP_202_ACCEPTED)
+            response = self.queue('c@example.com')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(OutboundMessage.objects.count(), 2)
+
+    @override_settings(NOTIFICATION_OUTBOX_CLAIM_TIMEOUT=0.5,
+                       NOTIFICATION_OUTBOX_TRANSPORTS={'email': 'api.notifications.tests.SlowTransport'})
+    def test_slow_batch_keeps_its_claim(self):
+        for recipient in ('a@example.com', 'b@example.com', 'c@example.com'):
+            self.queue(recipient)
+        SlowTransport.requeued = 0
+        outbox.drain()
+        self.assertEqual(SlowTransport.requeued, 0)
+        self.assertEqual(OutboundMessage.objects.filter(status='sent', attempts=1).count(), 3)
+
+@override_settings(NOTIFICATION_RETENTION_DAYS={'info': 30, 'error': 180}, NOTIFICATION_RETENTION_BATCH=2)
+class RetentionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='student', password='password')
+        old = timezone.now() - timedelta(days=60)
+        for index in range(5):
+            Notification.objects.create(user=self.user, title=f"Old {index}", message="", read=True)
+        Notification.objects.create(user=self.user, title="Old unread", message="")
+        Notification.objects.create(user=self.user, title="Old error", message="", type='error', read=True)
+        Notification.objects.create(user=self.user, title="Old warning", message="", type='warning', read=True)
+        Notification.objects.update(created_at=old)
+        Notification.objects.create(user=self.user, title="Recent", message="", read=True)
+
+    def test_purge_removes_expired_read_notifications_in_batches(self):
+        out = StringIO()
+        call_command('purge_notifications', '--dry-run', stdout=out)
+        self.assertIn("Would remove 5 notification(s) (info: 5, error: 0)", out.getvalue())
+        self.assertEqual(Notification.objects.count(), 9)
+
+        archive = os.path.join(tempfile.mkdtemp(), 'notifications.jsonl.gz')
+        self.addCleanup(os.remove, archive)
+        self.assertEqual(retention.purge(archive=archive), {'info': 5, 'error': 0})
+        self.assertEqual(
+            sorted(Notification.objects.values_list('title', flat=True)),
+            ["Old error", "Old unread", "Old warning", "Recent"],
+        )
+        with gzip.open(archive, 'rt') as lines:
+            self.assertEqual(sorted(json.loads(line)['title'] for line in lines), [f"Old {index}" for index in range(5)])
+
+    def test_purge_batches_come_from_the_retention_index(self):
+        queryset = retention.expired('info', 30).order_by('created_at', 'pk')[:100]
+        plan = queryset.explain()
+        self.assertIn('notification_retention_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+class CompactionTests(TransactionTestCase):
+    def test_vacuum_reports_reclaimed_bytes(self):
+        user = User.objects.create_user(username='student', password='password')
+        Notification.objects.bulk_create([
+            Notification(user=user, title="Old", message="x" * 2000, read=True) for _ in range(200)
+        ])
+        Notification.objects.update(created_at=timezone.now() - timedelta(days=60))
+        out = StringIO()
+        with override_settings(NOTIFICATION_RETENTION_DAYS={'info': 30}):
+            call_command('purge_notifications', '--vacuum', '--analyze', stdout=out)
+        self.assertIn("Removed 200 notification(s)", out.getvalue())
+        freed = int(out.getvalue().split("Freed ")[1].split()[0])
+        self.assertGreater(freed, 200 * 2000)
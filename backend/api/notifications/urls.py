@@ -1,10 +1,13 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import NotificationViewSet
+from .views import FanOutViewSet, NotificationViewSet, OutboxStatsView
 
 router = DefaultRouter()
+# Registered before the notifications so 'fanouts/' is not taken for a pk
+router.register(r'fanouts', FanOutViewSet)
 router.register(r'', NotificationViewSet)
 
 urlpatterns = [
+    path('outbox/stats/', OutboxStatsView.as_view(), name='outbox-stats'),
     path('', include(router.urls)),
 ]
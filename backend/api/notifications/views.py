@@ -1,12 +1,26 @@
-from rest_framework import viewsets, permissions, status
+from rest_framework import mixins, viewsets, permissions, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import Throttled, ValidationError
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
-from .models import Notification
-from .serializers import NotificationSerializer
+from rest_framework.views import APIView
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from api.permissions import IsInstructor
+from . import counters, outbox, stream
+from .fanout import fan_out
+from .models import FanOut, Notification
+from .pagination import NotificationCursorPagination
+from .serializers import FanOutSerializer, NotificationSerializer
 
 class NotificationViewSet(viewsets.ModelViewSet):
+    """
+    The user's notifications, newest first in cursor-paginated pages.
+    Filter with ``?read=true|false`` and ``?type=``.
+    """
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = NotificationCursorPagination
 
     # Add queryset for metadata or override basename
     queryset = Notification.objects.all()
@@ -14,24 +28,109 @@ class NotificationViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         if self.request.user.is_anonymous:
              return Notification.objects.none()
-        return Notification.objects.filter(user=self.request.user)
+        queryset = Notification.objects.filter(user=self.request.user)
+        params = self.request.query_params
+        if params.get('read'):
+            if params['read'] not in ('true', 'false'):
+                raise ValidationError({"read": ["Must be true or false."]})
+            queryset = queryset.filter(read=params['read'] == 'true')
+        if params.get('type'):
+            queryset = queryset.filter(type=params['type'])
+        return queryset
 
     @action(detail=False, methods=['post'])
     def mark_all_read(self, request):
         self.get_queryset().update(read=True)
+        # Rebuilt rather than zeroed, in case something arrived meanwhile
+        counters.rebuild(request.user.pk)
         return Response({'status': 'marked all as read'})
 
-    # Mock Email/SMS Send
-    @action(detail=False, methods=['post'])
+    @action(detail=False, methods=['get'])
+    def unread_count(self, request):
+        """
+        Number of unread notifications, from the per-user counter cache.
+        """
+        return Response({'unread': counters.get_unread_count(request.user.pk)})
+
+    @action(detail=False, methods=['get'], renderer_classes=[JSONRenderer, stream.EventStreamRenderer])
+    def stream(self, request):
+        """
+        Server-Sent Events of new notifications, resuming after Last-Event-ID
+        (or ``?last_id=``) when given.
+        """
+        user_id = request.user.pk
+        last_id = request.META.get('HTTP_LAST_EVENT_ID') or request.query_params.get('last_id')
+        position = stream.start_position(user_id, last_id)
+        if isinstance(request._request, ASGIRequest):
+            events = stream.async_events(user_id, position)
+        else:
+            events = stream.events(user_id, position)
+        response = StreamingHttpResponse(events, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    @action(detail=False, methods=['post'], permission_classes=[permissions.IsAuthenticated, IsInstructor])
     def send_external(self, request):
         """
-        Simulates sending an external email or SMS.
+        Queues an email or SMS in the outbox; it is delivered in the background.
+        Instructors only, at most NOTIFICATION_OUTBOX_RATE_LIMIT per hour.
         """
         message_type = request.data.get('type', 'email')
         recipient = request.data.get('recipient')
         content = request.data.get('content')
 
-        # Log to console/stdout to simulate "sending"
-        print(f"[{message_type.upper()}] Sent to {recipient}: {content}")
+        if message_type not in outbox.get_transports():
+            return Response({"error": f"Unknown message type '{message_type}'"}, status=status.HTTP_400_BAD_REQUEST)
+        if not recipient or not content:
+            return Response({"error": "recipient and content are required"}, status=status.HTTP_400_BAD_REQUEST)
+
+        queued, retry_after = outbox.sent_recently(request.user)
+        if queued >= outbox.get_rate_limit():
+            raise Throttled(wait=retry_after, detail="Too many messages sent in the last hour.")
+
+        message = outbox.enqueue(message_type, recipient, content, subject=request.data.get('subject', ''),
+                                 created_by=request.user)
+        return Response({'status': 'queued', 'id': message.pk}, status=status.HTTP_202_ACCEPTED)
+
+class FanOutViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.ListModelMixin, viewsets.GenericViewSet):
+    """
+    Sends one notification to a course and/or role in the background.
+    Retrieve a fan-out to follow its progress.
+    """
+    serializer_class = FanOutSerializer
+    permission_classes = [permissions.IsAuthenticated, IsInstructor]
+    queryset = FanOut.objects.all()
+
+    def get_queryset(self):
+        return FanOut.objects.filter(created_by=self.request.user).order_by('-created_at')
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        user = request.user
+        is_admin = user.is_staff or user.profile.role == 'admin'
+        course = data.get('course')
+        if not is_admin and (course is None or course.instructor_id != user.pk):
+            return Response(
+                {"error": "Instructors can only notify the students of their own courses"},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        fanout = fan_out(
+            title=data['title'], message=data['message'], type=data.get('type', 'info'),
+            course=course, role=data.get('role', ''), created_by=user,
+        )
+        return Response(self.get_serializer(fanout).data, status=status.HTTP_202_ACCEPTED)
+
+
+class OutboxStatsView(APIView):
+    """
+    Queue depth, lag and throughput of the email/SMS outbox.
+    """
+    permission_classes = [permissions.IsAdminUser]
 
-        return Response({'status': 'sent', 'detail': f'Mock {message_type} sent successfully'}, status=status.HTTP_200_OK)
+    def get(self, request):
+        return Response(outbox.stats())
@@ -1,5 +1,17 @@
 from rest_framework import permissions
 
+def is_instructor(user):
+    """
+    True for authenticated users whose profile role is instructor or admin.
+    """
+    if not user.is_authenticated:
+        return False
+    # Handle case where user might not have a profile (though they should)
+    try:
+        return user.profile.role in ['instructor', 'admin']
+    except AttributeError:
+        return False
+
 class IsInstructorOrReadOnly(permissions.BasePermission):
     """
     Custom permission to only allow instructors to edit objects.
@@ -11,13 +23,13 @@ class IsInstructorOrReadOnly(permissions.BasePermission):
         if request.method in permissions.SAFE_METHODS:
             return True
 
-        # Write permissions are only allowed to authenticated users
-        if not request.user.is_authenticated:
-            return False
+        # Write permissions are only allowed to authenticated instructors
+        return is_instructor(request.user)
 
-        # Check if user has a profile and is an instructor
-        # Handle case where user might not have a profile (though they should)
-        try:
-            return request.user.profile.role in ['instructor', 'admin']
-        except AttributeError:
-            return False
+class IsInstructor(permissions.BasePermission):
+    """
+    Only allow instructors, for reads as well as writes.
+    """
+
+    def has_permission(self, request, view):
+        return is_instructor(request.user)
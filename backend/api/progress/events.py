@@ -0,0 +1,209 @@
+"""
+Append-only learning events and their incremental rollup into Progress.
+
+Clients post batches of events (lesson viewed or completed, time heartbeats).
+Assessment progress is not reported this way: it is counted from graded
+attempts (api/progress/write_behind.py). A batch is validated with one query per referenced table and
+inserted with a single bulk_create; ingestion never reads or rewrites Progress.
+
+The rollup folds events past a stored high-water mark into Progress in id
+order, PROGRESS_EVENT_ROLLUP_BATCH at a time, and advances the mark in the same
+transaction, so every event is counted exactly once. Time is added with F()
+expressions and completed lessons are recounted from the log, so Progress is
+never read and written back. It runs in a background thread every
+PROGRESS_EVENT_ROLLUP_INTERVAL seconds, straight after ingestion when the
+interval is 0, or from ``manage.py rollup_learning_events``.
+"""
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Count, F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from rest_framework import serializers
+
+from .models import HighWaterMark, LearningEvent, Progress
+from .serializers import LearningEventSerializer
+from .write_behind import ensure_progress_rows
+
+logger = logging.getLogger(__name__)
+
+MARK = 'progress.learning_events'
+
+
+def get_interval():
+    return getattr(settings, 'PROGRESS_EVENT_ROLLUP_INTERVAL', 10)
+
+
+def get_batch_size():
+    return getattr(settings, 'PROGRESS_EVENT_ROLLUP_BATCH', 5000)
+
+
+def get_settle():
+    return getattr(settings, 'PROGRESS_EVENT_ROLLUP_SETTLE', 2)
+
+
+def get_max_batch():
+    return getattr(settings, 'PROGRESS_EVENT_MAX_BATCH', 1000)
+
+
+def ingest_events(user, items):
+    """
+    Validates and stores a batch of events for ``user``. Raises
+    ValidationError, keyed by item index, if any item is invalid.
+    """
+    from api.assessments.models import Assessment
+    from api.courses.models import Course
+    from api.lessons.models import Lesson
+
+    serializer = LearningEventSerializer(data=items, many=True)
+    serializer.is_valid(raise_exception=True)
+    data = serializer.validated_data
+
+    courses = set(Course.objects.filter(pk__in={item['course'] for item in data}).values_list('pk', flat=True))
+    lessons = dict(Lesson.objects.filter(pk__in={item['lesson'] for item in data if item.get('lesson')})
+                   .values_list('pk', 'course_id'))
+    assessments = dict(Assessment.objects.filter(pk__in={item['assessment'] for item in data if item.get('assessment')})
+                       .values_list('pk', 'course_id'))
+
+    errors = {}
+    for index, item in enumerate(data):
+        if item['course'] not in courses:
+            errors[index] = {"course": ["Not found."]}
+        elif item.get('lesson') and lessons.get(item['lesson']) != item['course']:
+            errors[index] = {"lesson": ["Not a lesson of this course."]}
+        elif item.get('assessment') and assessments.get(item['assessment']) != item['course']:
+            errors[index] = {"assessment": ["Not an assessment of this course."]}
+    if errors:
+        raise serializers.ValidationError(errors)
+
+    now = timezone.now()
+    events = LearningEvent.objects.bulk_create([
+        LearningEvent(
+            user=user,
+            course_id=item['course'],
+            lesson_id=item.get('lesson'),
+            assessment_id=item.get('assessment'),
+            kind=item['kind'],
+            seconds=item['seconds'] if item['kind'] == 'heartbeat' else 0,
+            # A device clock ahead of ours must not date events in the future.
+            occurred_at=min(item.get('occurred_at') or now, now),
+        )
+        for item in data
+    ])
+
+    if get_interval() <= 0:
+        rollup(settle=0)
+    else:
+        _ensure_thread()
+    return events
+
+
+def rollup(batch_size=None, settle=None):
+    """Folds every settled event past the high-water mark. Returns the count."""
+    batch_size = batch_size or get_batch_size()
+    settle = get_settle() if settle is None else settle
+    total = 0
+    while True:
+        folded, more = _rollup_chunk(batch_size, settle)
+        total += folded
+        if not more:
+            return total
+
+
+def _rollup_chunk(batch_size, settle):
+    with transaction.atomic():
+        mark, _ = HighWaterMark.objects.select_for_update().get_or_create(name=MARK)
+        events = list(
+            LearningEvent.objects.filter(pk__gt=mark.position)
+            .order_by('pk')
+            .values('pk', 'user_id', 'course_id', 'kind', 'seconds', 'occurred_at', 'created_at')[:batch_size]
+        )
+        full = len(events) == batch_size
+        # A transaction still open elsewhere can commit an event with a lower
+        # id than ones we can see, so stop at the first event that has not
+        # settled and leave it and everything after it for the next run.
+        cutoff = timezone.now() - timedelta(seconds=settle)
+        for index, event in enumerate(events):
+            if event['created_at'] > cutoff:
+                events, full = events[:index], False
+                break
+        if not events:
+            return 0, False
+
+        _fold(events)
+        mark.position = events[-1]['pk']
+        mark.save(update_fields=['position', 'updated_at'])
+    return len(events), full
+
+
+def _fold(events):
+    from api.analytics.summaries import course_changed_bulk
+    from api.lessons.models import Lesson
+
+    pairs = {}
+    for event in events:
+        pair = pairs.setdefault((event['user_id'], event['course_id']), {
+            'seconds': 0, 'last': event['occurred_at'], 'lessons': False,
+        })
+        if event['kind'] == 'heartbeat':
+            pair['seconds'] += event['seconds']
+        elif event['kind'] == 'lesson_completed':
+            pair['lessons'] = True
+        pair['last'] = max(pair['last'], event['occurred_at'])
+
+    courses = {course_id for _, course_id in pairs}
+    recount = [pair for pair, change in pairs.items() if change['lessons']]
+    completed = {}
+    if recount:
+        completed = {
+            (row['user_id'], row['course_id']): row['count']
+            for row in LearningEvent.objects.filter(
+                kind='lesson_completed', lesson__isnull=False,
+                user_id__in={user_id for user_id, _ in recount},
+                course_id__in={course_id for _, course_id in recount},
+            ).values('user_id', 'course_id').annotate(count=Count('lesson', distinct=True))
+        }
+    totals = dict(Lesson.objects.filter(course_id__in=courses).values_list('course_id').annotate(count=Count('id')))
+
+    rows = ensure_progress_rows(set(pairs)).values()
+    for progress in rows:
+        pair = (progress.user_id, progress.course_id)
+        change = pairs[pair]
+        seconds = F('time_spent_seconds') + change['seconds']
+        progress.time_spent_seconds = seconds
+        progress.time_spent = seconds / 60
+        progress.lessons_completed = completed.get(pair, 0) if change['lessons'] else F('lessons_completed')
+        progress.total_lessons = totals.get(progress.course_id, 0)
+        progress.last_accessed = Greatest(F('last_accessed'), Value(change['last']))
+    Progress.objects.bulk_update(
+        rows, ['time_spent_seconds', 'time_spent', 'lessons_completed', 'total_lessons', 'last_accessed'],
+    )
+    course_changed_bulk(courses)
+
+
+_thread = None
+_thread_lock = threading.Lock()
+
+
+def _ensure_thread():
+    global _thread
+    with _thread_lock:
+        if _thread is None:
+            _thread = threading.Thread(target=_run, name='learning-event-rollup', daemon=True)
+            _thread.start()
+
+
+def _run():
+    while True:
+        time.sleep(get_interval())
+        try:
+            rollup()
+        except Exception:
+            logger.exception("Learning event rollup failed")
+        finally:
+            close_old_connections()
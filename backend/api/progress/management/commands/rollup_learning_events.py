@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api.progress import events
+
+
+class Command(BaseCommand):
+    help = "Folds learning events past the high-water mark into Progress."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Keep running, rolling up every --interval seconds.")
+        parser.add_argument('--interval', type=float, default=events.get_interval() or 10,
+                            help="Seconds between rollups with --loop.")
+        parser.add_argument('--batch-size', type=int, default=events.get_batch_size(),
+                            help="Events folded per transaction.")
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.monotonic()
+            folded = events.rollup(batch_size=options['batch_size'])
+            if folded or not options['loop']:
+                self.stdout.write(f"Folded {folded} event(s) in {time.monotonic() - started:.2f}s.")
+            if not options['loop']:
+                return
+            close_old_connections()
+            try:
+                time.sleep(options['interval'])
+            except KeyboardInterrupt:
+                return
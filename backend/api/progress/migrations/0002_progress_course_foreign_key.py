@@ -0,0 +1,122 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def link_courses(apps, schema_editor):
+    """
+    Points every row at its Course. Duplicates of one (user, course) are
+    merged into the most recently accessed row: time spent is summed, the
+    counters and last_accessed take their maximum. A row naming a course that
+    does not exist stops the migration, as it holds a student's progress.
+    """
+    Course = apps.get_model("courses", "Course")
+    Progress = apps.get_model("progress", "Progress")
+    courses = {str(pk): pk for pk in Course.objects.values_list("pk", flat=True)}
+
+    kept, duplicates, orphans = {}, [], []
+    for progress in Progress.objects.order_by("-last_accessed", "-pk").iterator():
+        course = courses.get(progress.course_id.strip())
+        if course is None:
+            orphans.append(progress.pk)
+            continue
+        first = kept.get((progress.user_id, course))
+        if first is None:
+            progress.course_ref_id = course
+            kept[(progress.user_id, course)] = progress
+            continue
+        first.time_spent += progress.time_spent
+        for field in ("lessons_completed", "total_lessons", "assessments_completed", "total_assessments"):
+            setattr(first, field, max(getattr(first, field), getattr(progress, field)))
+        duplicates.append(progress.pk)
+    if orphans:
+        raise RuntimeError(
+            "Progress rows %s name courses that do not exist; fix their course_id "
+            "or delete them before migrating." % sorted(orphans)
+        )
+    Progress.objects.filter(pk__in=duplicates).delete()
+    # bulk_update leaves auto_now alone, so last_accessed stays the newest one
+    Progress.objects.bulk_update(
+        kept.values(),
+        ["course_ref", "time_spent", "lessons_completed", "total_lessons",
+         "assessments_completed", "total_assessments"],
+        batch_size=1000,
+    )
+
+
+def unlink_courses(apps, schema_editor):
+    """Restores course_id from the foreign key; merged duplicates stay merged."""
+    Progress = apps.get_model("progress", "Progress")
+    progress = list(Progress.objects.only("id", "course_ref_id"))
+    for row in progress:
+        row.course_id = str(row.course_ref_id)
+    Progress.objects.bulk_update(progress, ["course_id"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("courses", "0003_executionjob"),
+        ("progress", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="progress",
+            name="course_ref",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to="courses.course",
+            ),
+        ),
+        migrations.RunPython(link_courses, unlink_courses),
+        # A default lets the removal be reversed, so unlink_courses can run
+        migrations.AlterField(
+            model_name="progress",
+            name="course_id",
+            field=models.CharField(default="", max_length=255),
+        ),
+        migrations.RemoveField(
+            model_name="progress",
+            name="course_id",
+        ),
+        migrations.RenameField(
+            model_name="progress",
+            old_name="course_ref",
+            new_name="course",
+        ),
+        migrations.AlterField(
+            model_name="progress",
+            name="course",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="progress_records",
+                to="courses.course",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="progress",
+            constraint=models.UniqueConstraint(
+                fields=("user", "course"), name="unique_progress_user_course"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="progress",
+            index=models.Index(
+                fields=[
+                    "course",
+                    "lessons_completed",
+                    "total_lessons",
+                    "assessments_completed",
+                    "total_assessments",
+                ],
+                name="progress_course_rollup_idx",
+            ),
+        ),
+    ]
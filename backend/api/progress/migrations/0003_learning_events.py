@@ -0,0 +1,115 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:49
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def seed_seconds(apps, schema_editor):
+    Progress = apps.get_model("progress", "Progress")
+    Progress.objects.update(time_spent_seconds=models.F("time_spent") * 60)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("assessments", "0008_course_foreign_keys"),
+        ("courses", "0003_executionjob"),
+        ("lessons", "0002_remove_lesson_course_id_lesson_course_and_more"),
+        ("progress", "0002_progress_course_foreign_key"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="HighWaterMark",
+            fields=[
+                (
+                    "name",
+                    models.CharField(max_length=100, primary_key=True, serialize=False),
+                ),
+                ("position", models.BigIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="progress",
+            name="time_spent_seconds",
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(seed_seconds, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name="LearningEvent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("lesson_viewed", "Lesson viewed"),
+                            ("lesson_completed", "Lesson completed"),
+                            ("assessment_passed", "Assessment passed"),
+                            ("heartbeat", "Time heartbeat"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("seconds", models.IntegerField(default=0)),
+                ("occurred_at", models.DateTimeField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "assessment",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="assessments.assessment",
+                    ),
+                ),
+                (
+                    "course",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="learning_events",
+                        to="courses.course",
+                    ),
+                ),
+                (
+                    "lesson",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="lessons.lesson",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="learning_events",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["user", "course", "kind"],
+                        name="learning_event_user_course_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -1,15 +1,97 @@
 from django.db import models
+from django.db.models import Avg, Count, F, FloatField, Q, Value
+from django.db.models.functions import Cast, Coalesce, Least, NullIf
 from django.contrib.auth.models import User
+from api.courses.models import Course
+from api.lessons.models import Lesson
+
+class ProgressQuerySet(models.QuerySet):
+    def with_completion(self):
+        """
+        Annotates ``completion``, the percentage of the course's lessons and
+        assessments done, computed in the database.
+        """
+        done = Cast(F('lessons_completed') + F('assessments_completed'), FloatField())
+        total = NullIf(F('total_lessons') + F('total_assessments'), 0)
+        return self.annotate(completion=Coalesce(Least(done * 100 / total, Value(100.0)), Value(0.0)))
+
+    def course_rollup(self, course):
+        """
+        Students, average completion and students done for one course, in a
+        single aggregate served from progress_course_rollup_idx.
+        """
+        return self.filter(course=course).with_completion().aggregate(
+            students=Count('pk'),
+            average_completion=Coalesce(Avg('completion'), Value(0.0)),
+            completed=Count('pk', filter=Q(completion__gte=100)),
+        )
 
 class Progress(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    course_id = models.CharField(max_length=255)
+    # Indexed by progress_course_rollup_idx, which starts with course
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='progress_records', db_index=False)
     lessons_completed = models.IntegerField(default=0)
     total_lessons = models.IntegerField(default=0)
     assessments_completed = models.IntegerField(default=0)
     total_assessments = models.IntegerField(default=0)
     time_spent = models.IntegerField(default=0) # in minutes
+    # Exact total behind time_spent, so heartbeat rollups do not lose remainders
+    time_spent_seconds = models.BigIntegerField(default=0)
     last_accessed = models.DateTimeField(auto_now=True)
 
+    objects = ProgressQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'course'], name='unique_progress_user_course'),
+        ]
+        indexes = [
+            # Covers course-wide rollups, so they never touch the table rows
+            models.Index(
+                fields=['course', 'lessons_completed', 'total_lessons', 'assessments_completed', 'total_assessments'],
+                name='progress_course_rollup_idx',
+            ),
+        ]
+
     def __str__(self):
         return f"{self.user.username} - {self.course_id}"
+
+class LearningEvent(models.Model):
+    """
+    Append-only log of learner activity. Rows are only ever inserted; they are
+    folded into Progress by api/progress/events.py.
+    """
+    KIND_CHOICES = (
+        ('lesson_viewed', 'Lesson viewed'),
+        ('lesson_completed', 'Lesson completed'),
+        ('assessment_passed', 'Assessment passed'),
+        ('heartbeat', 'Time heartbeat'),
+    )
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='learning_events', db_index=False)
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='learning_events')
+    lesson = models.ForeignKey(Lesson, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    assessment = models.ForeignKey('assessments.Assessment', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    seconds = models.IntegerField(default=0) # time on task, for heartbeats
+    occurred_at = models.DateTimeField() # client time
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Recomputing distinct completed lessons for touched (user, course) pairs
+            models.Index(fields=['user', 'course', 'kind'], name='learning_event_user_course_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.kind} @ {self.occurred_at}"
+
+class HighWaterMark(models.Model):
+    """
+    The last LearningEvent id a rollup has folded in. One row per rollup.
+    """
+    name = models.CharField(max_length=100, primary_key=True)
+    position = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.position}"
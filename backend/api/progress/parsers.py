@@ -0,0 +1,40 @@
+import gzip
+import io
+import zlib
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+
+
+def get_max_body():
+    return getattr(settings, 'PROGRESS_HEARTBEAT_MAX_BODY', 1024 * 1024)
+
+
+class CompressedJSONParser(JSONParser):
+    """
+    JSON that may be sent with ``Content-Encoding: gzip`` (or deflate), so
+    the lesson player can upload long heartbeat batches cheaply. Decompressed
+    bodies are capped at PROGRESS_HEARTBEAT_MAX_BODY bytes.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = (parser_context or {}).get('request')
+        encoding = request.META.get('HTTP_CONTENT_ENCODING', '').strip().lower() if request is not None else ''
+        if encoding in ('', 'identity'):
+            return super().parse(stream, media_type, parser_context)
+
+        limit = get_max_body()
+        try:
+            if encoding == 'gzip':
+                body = gzip.GzipFile(fileobj=stream).read(limit + 1)
+            elif encoding == 'deflate':
+                body = zlib.decompressobj().decompress(stream.read(), limit + 1)
+            else:
+                raise ParseError(f"Unsupported Content-Encoding '{encoding}'")
+        except (OSError, EOFError, zlib.error) as e:
+            raise ParseError(f"Could not decompress body: {e}")
+        if len(body) > limit:
+            raise ParseError(f"Decompressed body is larger than {limit} bytes")
+
+        return super().parse(io.BytesIO(body), media_type, parser_context)
@@ -1,7 +1,33 @@
 from rest_framework import serializers
-from .models import Progress
+from .models import LearningEvent, Progress
 
 class ProgressSerializer(serializers.ModelSerializer):
     class Meta:
         model = Progress
         fields = '__all__'
+        # Counters are maintained from the event log and assessment attempts
+        read_only_fields = (
+            'lessons_completed', 'total_lessons', 'assessments_completed', 'total_assessments',
+            'time_spent', 'time_spent_seconds', 'last_accessed',
+        )
+
+class LearningEventSerializer(serializers.Serializer):
+    # Assessment progress comes from attempts, so clients cannot post
+    # assessment_passed; older rows of that kind stay in the log
+    KIND_CHOICES = [choice for choice in LearningEvent.KIND_CHOICES if choice[0] != 'assessment_passed']
+
+    # Plain ids; references are checked for the whole batch in api/progress/events.py
+    kind = serializers.ChoiceField(choices=KIND_CHOICES)
+    course = serializers.IntegerField()
+    lesson = serializers.IntegerField(required=False, allow_null=True)
+    assessment = serializers.IntegerField(required=False, allow_null=True)
+    seconds = serializers.IntegerField(required=False, default=0, min_value=0, max_value=24 * 3600)
+    occurred_at = serializers.DateTimeField(required=False)
+
+    def validate(self, data):
+        kind = data['kind']
+        if kind.startswith('lesson_') and not data.get('lesson'):
+            raise serializers.ValidationError({"lesson": ["Required for lesson events."]})
+        if kind == 'heartbeat' and not data.get('seconds'):
+            raise serializers.ValidationError({"seconds": ["Required for heartbeats."]})
+        return data
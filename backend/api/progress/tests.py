@@ -1,3 +1,245 @@
-from django.test import TestCase
+import gzip
+import json
+import operator
+from io import StringIO
+from unittest import mock
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import User
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+from api.assessments.models import Assessment, Attempt
+from api.courses.models import Course
+from .models import HighWaterMark, LearningEvent, Progress
+from api.lessons.models import Lesson
+from .events import MARK, rollup
+from .write_behind import WriteBehindBuffer, assessment_progress, heartbeats, record_attempts
 
-# Create your tests here.
+class WriteBehindTests(TestCase):
+    def test_buffer_merges_pending_keys(self):
+        flushed = []
+        buffer = WriteBehindBuffer('test', flushed.append, merge=operator.add)
+        with override_settings(PROGRESS_WRITE_BEHIND_INTERVAL=3600):
+            buffer.add('a', 1)
+            buffer.add('a', 2)
+            buffer.add('b', 5)
+            self.assertEqual(buffer.pending(), 2)
+            self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(flushed, [{'a': 3, 'b': 5}])
+        self.assertEqual(buffer.pending(), 0)
+
+    @override_settings(PROGRESS_WRITE_BEHIND_INTERVAL=3600)
+    def test_failed_flush_is_merged_back(self):
+        flushed = []
+
+        def flush(batch):
+            if not flushed:
+                flushed.append(None)
+                # A value arriving while the failing flush runs
+                buffer.add('a', 10)
+                raise RuntimeError("database is locked")
+            flushed.append(batch)
+
+        buffer = WriteBehindBuffer('test', flush, merge=operator.add)
+        buffer.add('a', 1)
+        with self.assertRaises(RuntimeError):
+            buffer.flush()
+        buffer.flush()
+        self.assertEqual(flushed[1], {'a': 11})
+
+    @override_settings(PROGRESS_WRITE_BEHIND_INTERVAL=3600)
+    def test_attempts_are_folded_into_progress_in_one_flush(self):
+        user = User.objects.create_user(username='student', password='password')
+        course = Course.objects.create(title="Python", description="", instructor=user)
+        other = Course.objects.create(title="Go", description="", instructor=user)
+        existing = Progress.objects.create(user=user, course=course, lessons_completed=2)
+        first = Assessment.objects.create(course=course, title="Quiz 1", description="")
+        second = Assessment.objects.create(course=course, title="Quiz 2", description="")
+        Assessment.objects.create(course=other, title="Quiz 3", description="")
+
+        attempts = [
+            Attempt.objects.create(user=user, assessment=first),
+            Attempt.objects.create(user=user, assessment=first),
+            Attempt.objects.create(user=user, assessment=second),
+        ]
+        record_attempts(attempts)
+        self.assertEqual(Progress.objects.get(pk=existing.pk).assessments_completed, 0)
+
+        assessment_progress.flush()
+        existing.refresh_from_db()
+        self.assertEqual(existing.assessments_completed, 2)
+        self.assertEqual(existing.total_assessments, 2)
+        self.assertEqual(existing.lessons_completed, 2)
+
+class ProgressRollupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='student', password='password')
+        self.python = Course.objects.create(title="Python", description="", instructor=self.user)
+        self.go = Course.objects.create(title="Go", description="", instructor=self.user)
+        Progress.objects.create(user=self.user, course=self.python, lessons_completed=3, total_lessons=4,
+                                assessments_completed=1, total_assessments=4)
+        Progress.objects.create(user=self.user, course=self.go, lessons_completed=2, total_lessons=2)
+
+    def test_user_courses_in_one_query(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        with self.assertNumQueries(1):
+            response = client.get('/api/progress/courses/')
+        completion = {row['title']: row['completion'] for row in response.data}
+        self.assertEqual(completion, {"Python": 50.0, "Go": 100.0})
+
+    def test_course_rollup(self):
+        for index in range(3):
+            student = User.objects.create_user(username=f'student{index}')
+            Progress.objects.create(user=student, course=self.python, lessons_completed=index, total_lessons=2)
+        Progress.objects.create(user=User.objects.create_user(username='new'), course=self.python)
+
+        rollup = Progress.objects.course_rollup(self.python)
+        self.assertEqual(rollup['students'], 5)
+        self.assertEqual(rollup['completed'], 1)
+        self.assertAlmostEqual(rollup['average_completion'], (50 + 0 + 50 + 100 + 0) / 5)
+
+    def test_one_row_per_user_and_course(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Progress.objects.create(user=self.user, course=self.go)
+
+@override_settings(PROGRESS_EVENT_ROLLUP_INTERVAL=0)
+class LearningEventTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='student', password='password')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.course = Course.objects.create(title="Python", description="", instructor=self.user)
+        self.lessons = [
+            Lesson.objects.create(course=self.course, title=f"Lesson {i}", description="", content="")
+            for i in range(3)
+        ]
+
+    def post_events(self, events):
+        return self.client.post('/api/progress/events/', {"events": events}, format='json')
+
+    def test_events_are_folded_into_progress(self):
+        first, second = self.lessons[0].id, self.lessons[1].id
+        course = self.course.id
+        response = self.post_events([
+            {"kind": "lesson_viewed", "course": course, "lesson": first},
+            {"kind": "lesson_completed", "course": course, "lesson": first},
+            {"kind": "lesson_completed", "course": course, "lesson": first},
+            {"kind": "lesson_completed", "course": course, "lesson": second},
+            {"kind": "heartbeat", "course": course, "seconds": 90},
+            {"kind": "heartbeat", "course": course, "seconds": 45},
+        ])
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['accepted'], 6)
+
+        progress = Progress.objects.get(user=self.user, course=self.course)
+        self.assertEqual((progress.lessons_completed, progress.total_lessons), (2, 3))
+        self.assertEqual((progress.time_spent_seconds, progress.time_spent), (135, 2))
+
+        self.post_events([{"kind": "heartbeat", "course": course, "seconds": 30}])
+        progress.refresh_from_db()
+        self.assertEqual((progress.time_spent_seconds, progress.time_spent), (165, 2))
+        self.assertEqual(progress.lessons_completed, 2)
+
+    def test_invalid_batch_is_rejected(self):
+        other = Course.objects.create(title="Go", description="", instructor=self.user)
+        response = self.post_events([
+            {"kind": "heartbeat", "course": self.course.id, "seconds": 30},
+            {"kind": "lesson_completed", "course": other.id, "lesson": self.lessons[0].id},
+        ])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('lesson', response.data[1])
+        self.assertFalse(LearningEvent.objects.exists())
+
+        # Assessment progress comes from attempts, not client events
+        quiz = Assessment.objects.create(course=self.course, title="Quiz", description="")
+        response = self.post_events([{"kind": "assessment_passed", "course": self.course.id, "assessment": quiz.id}])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('kind', response.data[0])
+
+    def test_rollup_resumes_from_high_water_mark(self):
+        now = timezone.now()
+        LearningEvent.objects.bulk_create([
+            LearningEvent(user=self.user, course=self.course, kind='heartbeat', seconds=60, occurred_at=now)
+            for _ in range(5)
+        ])
+        # Events younger than the settle time wait for the next run
+        self.assertEqual(rollup(settle=3600), 0)
+        self.assertEqual(rollup(batch_size=2, settle=0), 5)
+        self.assertEqual(rollup(settle=0), 0)
+        self.assertEqual(HighWaterMark.objects.get(name=MARK).position, LearningEvent.objects.latest('pk').pk)
+        self.assertEqual(Progress.objects.get(user=self.user).time_spent, 5)
+
+        LearningEvent.objects.create(user=self.user, course=self.course, kind='heartbeat', seconds=60, occurred_at=now)
+        out = StringIO()
+        with override_settings(PROGRESS_EVENT_ROLLUP_SETTLE=0):
+            call_command('rollup_learning_events', stdout=out)
+        self.assertIn("Folded 1 event(s)", out.getvalue())
+        self.assertEqual(Progress.objects.get(user=self.user).time_spent, 6)
+
+@override_settings(PROGRESS_WRITE_BEHIND_INTERVAL=3600)
+class HeartbeatTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='student', password='password')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.course = Course.objects.create(title="Python", description="", instructor=self.user)
+        self.lessons = [
+            Lesson.objects.create(course=self.course, title=f"Lesson {i}", description="", content="")
+            for i in range(2)
+        ]
+
+    def tearDown(self):
+        heartbeats.flush()
+
+    def beat(self, seconds):
+        return self.client.post('/api/progress/heartbeat/', {"intervals": [[self.lessons[0].id, seconds]]},
+                                format='json')
+
+    def post_gzip(self, payload):
+        return self.client.generic(
+            'POST', '/api/progress/heartbeat/', gzip.compress(json.dumps(payload).encode()),
+            content_type='application/json', HTTP_CONTENT_ENCODING='gzip',
+        )
+
+    def test_heartbeats_are_coalesced_and_flushed_in_bulk(self):
+        first, second = self.lessons[0].id, self.lessons[1].id
+        response = self.post_gzip({"intervals": [[first, 30], [first, 30], [second, 45], [9999, 30]]})
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data, {"accepted": 105, "ignored": 1})
+        response = self.client.post('/api/progress/heartbeat/', {"intervals": [[second, 20]]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+
+        self.assertFalse(Progress.objects.exists())
+        self.assertEqual(heartbeats.pending(), 1)
+        # Create missing rows, load their keys, one bulk update and the
+        # analytics change stamp, however many heartbeats were coalesced,
+        # inside one savepoint
+        with self.assertNumQueries(6):
+            self.assertEqual(heartbeats.flush(), 1)
+        progress = Progress.objects.get(user=self.user, course=self.course)
+        self.assertEqual((progress.time_spent_seconds, progress.time_spent), (125, 2))
+
+    def test_failed_flush_is_retried_without_double_counting(self):
+        self.beat(30)
+        Progress.objects.create(user=self.user, course=self.course)
+        with mock.patch('api.analytics.summaries.course_changed_bulk', side_effect=RuntimeError("locked")):
+            with self.assertRaises(RuntimeError):
+                heartbeats.flush()
+        self.assertEqual(Progress.objects.get(user=self.user).time_spent_seconds, 0)
+        self.beat(15)
+        heartbeats.flush()
+        self.assertEqual(Progress.objects.get(user=self.user).time_spent_seconds, 45)
+
+    def test_invalid_batches_are_rejected(self):
+        url = '/api/progress/heartbeat/'
+        response = self.client.post(url, {"intervals": [[self.lessons[0].id, 0]]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(url, {"intervals": [[self.lessons[0].id, 10 ** 6]]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.generic('POST', url, b'not gzip', content_type='application/json',
+                                       HTTP_CONTENT_ENCODING='gzip')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(heartbeats.pending(), 0)
@@ -1,6 +1,13 @@
-from rest_framework import viewsets, permissions
+from collections import defaultdict
+from rest_framework import viewsets, permissions, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from api.lessons.models import Lesson
 from .models import Progress
 from .serializers import ProgressSerializer
+from .events import get_max_batch, ingest_events
+from .parsers import CompressedJSONParser
+from .write_behind import get_heartbeat_max_intervals, get_heartbeat_max_seconds, record_heartbeats
 
 class ProgressViewSet(viewsets.ModelViewSet):
     serializer_class = ProgressSerializer
@@ -13,3 +20,88 @@ class ProgressViewSet(viewsets.ModelViewSet):
         if self.request.user.is_anonymous:
              return Progress.objects.none()
         return Progress.objects.filter(user=self.request.user)
+
+    @action(detail=False, methods=['get'])
+    def courses(self, request):
+        """
+        Completion percentage for each of the user's courses, in one query.
+        """
+        rows = (
+            self.get_queryset()
+            .with_completion()
+            .order_by('-last_accessed')
+            .values('course', 'course__title', 'completion', 'last_accessed')
+        )
+        return Response([
+            {
+                "course": row['course'],
+                "title": row['course__title'],
+                "completion": round(row['completion'], 1),
+                "last_accessed": row['last_accessed'],
+            }
+            for row in rows
+        ])
+
+    @action(detail=False, methods=['post'])
+    def events(self, request):
+        """
+        Appends a batch of learning events. Progress catches up when the
+        next rollup runs.
+        """
+        events = request.data.get('events')
+        if not isinstance(events, list):
+            return Response({"error": "events must be a list"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(events) > get_max_batch():
+            return Response(
+                {"error": f"At most {get_max_batch()} events can be sent at once"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        created = ingest_events(request.user, events)
+        return Response({"accepted": len(created)}, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=False, methods=['post'], parser_classes=[CompressedJSONParser])
+    def heartbeat(self, request):
+        """
+        Time on task from the lesson player as {"intervals": [[lesson_id,
+        seconds], ...]}, optionally gzip-compressed. Seconds are summed per
+        course in memory and added to Progress in batches.
+        """
+        intervals = request.data.get('intervals')
+        if not isinstance(intervals, list):
+            return Response({"error": "intervals must be a list"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(intervals) > get_heartbeat_max_intervals():
+            return Response(
+                {"error": f"At most {get_heartbeat_max_intervals()} intervals can be sent at once"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        max_seconds = get_heartbeat_max_seconds()
+        for index, interval in enumerate(intervals):
+            valid = (
+                isinstance(interval, list) and len(interval) == 2
+                and all(isinstance(value, int) and not isinstance(value, bool) for value in interval)
+                and 0 < interval[1] <= max_seconds
+            )
+            if not valid:
+                return Response(
+                    {"error": f"Interval {index} must be [lesson_id, seconds] with 0 < seconds <= {max_seconds}"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+        courses = dict(
+            Lesson.objects.filter(pk__in={lesson for lesson, _ in intervals}, course__isnull=False)
+            .values_list('pk', 'course_id')
+        )
+        seconds_by_course = defaultdict(int)
+        ignored = 0
+        for lesson, seconds in intervals:
+            if lesson in courses:
+                seconds_by_course[courses[lesson]] += seconds
+            else:
+                ignored += 1
+        record_heartbeats(request.user.pk, seconds_by_course)
+        return Response(
+            {"accepted": sum(seconds_by_course.values()), "ignored": ignored},
+            status=status.HTTP_202_ACCEPTED
+        )
@@ -0,0 +1,241 @@
+"""
+Write-behind updates of Progress.
+
+Request handlers record what changed in an in-process buffer: attempts
+(assessment counters) and lesson player heartbeats (time spent, summed per
+user and course). The buffer is
+merged per key and flushed to the database in batches, by a background thread
+every PROGRESS_WRITE_BEHIND_INTERVAL seconds, as soon as
+PROGRESS_WRITE_BEHIND_MAX_PENDING keys are waiting, and once more at exit.
+An interval of 0 flushes straight away in the calling thread.
+
+A batch whose flush fails is merged back into the buffer and retried. Each
+flush runs in one transaction, so a failed flush leaves nothing behind and a
+retry never applies a batch twice. Assessment counters are recomputed from
+their source tables, so for them a lost buffer is also fixed by the next flush
+for that key. Heartbeat seconds have no source table to recompute from: they
+are added to Progress and exist only in the buffer until flushed.
+"""
+import atexit
+import logging
+import operator
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+def get_interval():
+    return getattr(settings, 'PROGRESS_WRITE_BEHIND_INTERVAL', 5)
+
+
+def get_max_pending():
+    return getattr(settings, 'PROGRESS_WRITE_BEHIND_MAX_PENDING', 500)
+
+
+def get_heartbeat_max_intervals():
+    return getattr(settings, 'PROGRESS_HEARTBEAT_MAX_INTERVALS', 1000)
+
+
+def get_heartbeat_max_seconds():
+    return getattr(settings, 'PROGRESS_HEARTBEAT_MAX_SECONDS', 300)
+
+
+class WriteBehindBuffer:
+    """
+    Pending values by key. ``merge`` combines a new value with a pending one
+    for the same key (e.g. operator.add to sum); without it the newest wins.
+    """
+
+    def __init__(self, name, flush, merge=None):
+        self.name = name
+        self._flush = flush
+        self._merge = merge
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self.flushes = 0
+
+    def add(self, key, value=None):
+        with self._lock:
+            self._put(key, value)
+            pending = len(self._pending)
+
+        if get_interval() <= 0:
+            self.flush()
+            return
+        self._ensure_thread()
+        if pending >= get_max_pending():
+            self._wake.set()
+
+    def _put(self, key, value):
+        if self._merge is not None and key in self._pending:
+            value = self._merge(self._pending[key], value)
+        self._pending[key] = value
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+            try:
+                with transaction.atomic():
+                    self._flush(batch)
+            except Exception:
+                # Merge the batch back, with whatever arrived meanwhile, so the
+                # next flush retries it.
+                with self._lock:
+                    for key, value in batch.items():
+                        self._put(key, value)
+                raise
+            self.flushes += 1
+            return len(batch)
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name=f'write-behind-{self.name}', daemon=True)
+            self._thread.start()
+        atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            self._wake.wait(timeout=get_interval())
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Write-behind flush of %s failed", self.name)
+            finally:
+                close_old_connections()
+
+
+def _progress_rows(pairs):
+    """Existing Progress rows for (user_id, course_id) pairs, keyed by pair."""
+    from .models import Progress
+
+    users = {user_id for user_id, _ in pairs}
+    courses = {course_id for _, course_id in pairs}
+    return {
+        (progress.user_id, progress.course_id): progress
+        for progress in Progress.objects.filter(user_id__in=users, course_id__in=courses)
+        if (progress.user_id, progress.course_id) in pairs
+    }
+
+
+def ensure_progress_rows(pairs):
+    """
+    Creates any missing Progress rows for (user_id, course_id) pairs and
+    returns all of them keyed by pair, with only their keys loaded, ready for
+    a bulk_update of expressions.
+    """
+    from .models import Progress
+
+    Progress.objects.bulk_create(
+        [Progress(user_id=user_id, course_id=course_id) for user_id, course_id in pairs],
+        ignore_conflicts=True,
+    )
+    users = {user_id for user_id, _ in pairs}
+    courses = {course_id for _, course_id in pairs}
+    return {
+        (progress.user_id, progress.course_id): progress
+        for progress in Progress.objects.filter(user_id__in=users, course_id__in=courses).only('pk', 'user_id', 'course_id')
+        if (progress.user_id, progress.course_id) in pairs
+    }
+
+
+def flush_assessment_progress(batch):
+    """
+    Sets assessments_completed (distinct assessments attempted) and
+    total_assessments for every (user_id, course_id) in the batch.
+    """
+    from api.analytics.summaries import course_changed_bulk
+    from api.assessments.models import Assessment, Attempt
+    from .models import Progress
+
+    pairs = set(batch)
+    users = {user_id for user_id, _ in pairs}
+    courses = {course_id for _, course_id in pairs}
+
+    completed = {
+        (row['user_id'], row['assessment__course_id']): row['count']
+        for row in Attempt.objects.filter(user_id__in=users, assessment__course_id__in=courses)
+        .values('user_id', 'assessment__course_id')
+        .annotate(count=Count('assessment', distinct=True))
+    }
+    totals = dict(
+        Assessment.objects.filter(course_id__in=courses)
+        .values_list('course_id')
+        .annotate(count=Count('id'))
+    )
+
+    rows = _progress_rows(pairs)
+    now = timezone.now()
+    updated, created = [], []
+    for pair in pairs:
+        user_id, course_id = pair
+        done = completed.get(pair, 0)
+        total = totals.get(course_id, 0)
+        progress = rows.get(pair)
+        if progress is not None:
+            progress.assessments_completed = done
+            progress.total_assessments = total
+            progress.last_accessed = now
+            updated.append(progress)
+        else:
+            created.append(Progress(
+                user_id=user_id, course_id=course_id,
+                assessments_completed=done, total_assessments=total,
+            ))
+    fields = ['assessments_completed', 'total_assessments', 'last_accessed']
+    Progress.objects.bulk_update(updated, fields)
+    # Another process may have created the row since we looked
+    Progress.objects.bulk_create(
+        created, update_conflicts=True, unique_fields=['user', 'course'], update_fields=fields,
+    )
+    # New attempts change the course's scores as well as its progress
+    course_changed_bulk(courses)
+
+
+assessment_progress = WriteBehindBuffer('assessment-progress', flush_assessment_progress)
+
+
+def record_attempts(attempts):
+    for attempt in attempts:
+        assessment_progress.add((attempt.user_id, attempt.assessment.course_id))
+
+
+def flush_heartbeats(batch):
+    """Adds the coalesced seconds of each (user_id, course_id) to time spent."""
+    from api.analytics.summaries import course_changed_bulk
+    from .models import Progress
+
+    rows = ensure_progress_rows(set(batch))
+    now = timezone.now()
+    for pair, progress in rows.items():
+        seconds = F('time_spent_seconds') + batch[pair]
+        progress.time_spent_seconds = seconds
+        progress.time_spent = seconds / 60
+        progress.last_accessed = now
+    Progress.objects.bulk_update(rows.values(), ['time_spent_seconds', 'time_spent', 'last_accessed'])
+    course_changed_bulk(course_id for _, course_id in rows)
+
+
+heartbeats = WriteBehindBuffer('heartbeats', flush_heartbeats, merge=operator.add)
+
+
+def record_heartbeats(user_id, seconds_by_course):
+    for course_id, seconds in seconds_by_course.items():
+        heartbeats.add((user_id, course_id), seconds)
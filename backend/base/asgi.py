@@ -3,6 +3,10 @@ ASGI config for base project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve the project with an ASGI server (e.g. ``uvicorn base.asgi:application``)
+to stream long responses such as /api/courses/execute/stream/ and
+/api/notifications/stream/ without tying up a worker thread per open stream.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -45,6 +45,7 @@ INSTALLED_APPS = [
     'api.notifications',
     'api.progress',
     'api.authapi',
+    'api.analytics',
     'corsheaders'
 ]
 
@@ -146,3 +147,76 @@ REST_FRAMEWORK = {
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     )
 }
+
+# Code execution sandbox (api/courses/sandbox.py)
+CODE_EXECUTION_TIMEOUT = 5 # seconds
+CODE_EXECUTION_POOL_SIZE = 4 # warm interpreters; 0 runs one subprocess per request
+CODE_EXECUTION_MAX_RUNS_PER_WORKER = 50
+CODE_EXECUTION_GRADE_TIMEOUT = 20 # seconds, for all test cases of one grading run
+CODE_EXECUTION_MAX_OUTPUT = 1024 * 1024 # bytes per stream before the program is killed
+CODE_EXECUTION_ASYNC_WORKERS = 2 # dispatcher threads per web process; 0 leaves jobs to `manage.py run_execution_jobs`
+CODE_EXECUTION_ASYNC_PER_USER = 1 # running async jobs per user
+CODE_EXECUTION_ASYNC_MAX_QUEUED = 5 # queued or running async jobs per user before submissions get 429
+CODE_EXECUTION_MAX_WAIT = 30 # seconds a long-poll on execute/{job_id}/ may wait
+CODE_EXECUTION_JOB_TTL = 3600 # seconds finished jobs are kept
+CODE_EXECUTION_CACHE_ENABLED = False # reuse results of identical deterministic runs (api/courses/result_cache.py)
+CODE_EXECUTION_CACHE_SIZE = 256 # entries
+CODE_EXECUTION_CACHE_MAX_BYTES = 16 * 1024 * 1024 # output held by the cache; results over an eighth of this are not cached
+CODE_EXECUTION_CACHE_TTL = 300 # seconds
+CODE_EXECUTION_MEMORY_LIMIT = 256 * 1024 * 1024 # bytes of address space per program
+CODE_EXECUTION_PROCESS_LIMIT = 64 # RLIMIT_NPROC per program
+CODE_EXECUTION_MAX_CONCURRENT = 4 # synchronous runs admitted at once (api/courses/admission.py)
+CODE_EXECUTION_MAX_PER_USER = 2 # synchronous runs one user may have in flight
+CODE_EXECUTION_MAX_QUEUE = 16 # requests waiting for a slot before we answer 429
+CODE_EXECUTION_MAX_QUEUE_WAIT = 10 # seconds a request may wait for a slot
+
+ASSESSMENT_SYNC_MAX_BATCH = 500 # submissions per offline sync request
+ASSESSMENT_DRAW_MAX_AGE = 7 * 24 * 3600 # seconds a drawn question set can be submitted for
+PROGRESS_WRITE_BEHIND_INTERVAL = 5 # seconds between Progress flushes; 0 writes immediately (api/progress/write_behind.py)
+PROGRESS_WRITE_BEHIND_MAX_PENDING = 500 # pending keys that trigger an early flush
+PROGRESS_EVENT_ROLLUP_INTERVAL = 10 # seconds between learning event rollups; 0 folds right after ingestion (api/progress/events.py)
+PROGRESS_EVENT_ROLLUP_BATCH = 5000 # events folded per rollup transaction
+PROGRESS_EVENT_ROLLUP_SETTLE = 2 # seconds an event must be old before it is folded
+PROGRESS_EVENT_MAX_BATCH = 1000 # events per ingestion request
+PROGRESS_HEARTBEAT_MAX_INTERVALS = 1000 # (lesson, seconds) intervals per heartbeat request
+PROGRESS_HEARTBEAT_MAX_SECONDS = 300 # longest single interval a client may report
+PROGRESS_HEARTBEAT_MAX_BODY = 1024 * 1024 # bytes, after decompression
+ANALYTICS_MAX_STALENESS = 3600 # seconds a changed course summary is served before a request refreshes it inline; `manage.py refresh_analytics --loop` keeps summaries fresh (api/analytics/summaries.py)
+ANALYTICS_TIME_BUCKETS = [0, 15, 30, 60, 120, 240, 480] # minutes, lower edges of the time-on-task histogram
+NOTIFICATION_FANOUT_CHUNK = 1000 # notifications per bulk insert (api/notifications/fanout.py)
+NOTIFICATION_FANOUT_WORKERS = 1 # background fan-out threads; 0 runs a fan-out in the request that commits it
+NOTIFICATION_UNREAD_COUNTER_TTL = 3600 # seconds before an unread counter is recounted (api/notifications/counters.py)
+NOTIFICATION_STREAM_POLL_DB = False # set when notifications are created in more than one process (several web workers, management commands); streams then also check the database
+NOTIFICATION_STREAM_POLL_INTERVAL = 5 # seconds between those database checks, and the client's reconnect delay
+NOTIFICATION_STREAM_KEEPALIVE = 15 # seconds of silence before a stream sends a keepalive comment
+NOTIFICATION_STREAM_MAX_AGE = 300 # seconds a stream stays open before the client reconnects with Last-Event-ID
+NOTIFICATION_PAGE_SIZE = 20 # notifications per history page; clients may ask for up to NOTIFICATION_MAX_PAGE_SIZE with ?page_size=
+NOTIFICATION_MAX_PAGE_SIZE = 100
+NOTIFICATION_OUTBOX_WORKERS = 1 # email/SMS dispatcher threads per web process; 0 leaves delivery to `manage.py run_outbox`
+NOTIFICATION_OUTBOX_BATCH = 50 # messages sent per transport connection
+NOTIFICATION_OUTBOX_MAX_ATTEMPTS = 5 # failures before a message is left dead
+NOTIFICATION_OUTBOX_BACKOFF = 30 # seconds before the first retry, doubled per attempt
+NOTIFICATION_OUTBOX_MAX_BACKOFF = 3600
+NOTIFICATION_OUTBOX_SEND_TIMEOUT = 30 # seconds per SMTP operation unless EMAIL_TIMEOUT is set
+NOTIFICATION_OUTBOX_CLAIM_TIMEOUT = 300 # seconds before a batch claimed by a dead dispatcher is requeued; keep well above the send timeout
+NOTIFICATION_OUTBOX_RATE_LIMIT = 200 # messages one instructor may queue per hour through send_external
+NOTIFICATION_OUTBOX_TRANSPORTS = {
+    'email': 'api.notifications.outbox.EmailTransport', # uses EMAIL_BACKEND / EMAIL_HOST
+    'sms': 'api.notifications.outbox.LogTransport', # no SMS gateway yet; messages are logged
+}
+NOTIFICATION_RETENTION_DAYS = { # days read notifications are kept, per type; others are kept forever (`manage.py purge_notifications`)
+    'info': 30,
+    'success': 30,
+    'warning': 90,
+    'error': 180,
+}
+NOTIFICATION_RETENTION_BATCH = 500 # rows deleted per transaction, so writers are only ever blocked briefly
+
+# Lesson video delivery (api/lessons/streaming.py)
+LESSON_VIDEO_SENDFILE = '' # '' streams from Django; 'x-accel' (nginx) or 'x-sendfile' (Apache/lighttpd) hands the transfer to the web server
+LESSON_VIDEO_ACCEL_PREFIX = '/protected-media/' # internal nginx location aliased to MEDIA_ROOT, for 'x-accel'
+LESSON_VIDEO_URL_MAX_AGE = 6 * 3600 # seconds a signed video_stream_url stays valid
+LESSON_UPLOAD_MAX_CHUNK = 8 * 1024 * 1024 # bytes per resumable upload chunk (api/lessons/uploads.py)
+LESSON_UPLOAD_MAX_SIZE = 2 * 1024 * 1024 * 1024 # bytes per uploaded video
+LESSON_UPLOAD_CLAIM_TIMEOUT = 600 # seconds a chunk write holds its offset before another request may take it over
+LESSON_UPLOAD_TTL = 24 * 3600 # seconds an unfinished upload may sit idle before `manage.py purge_video_uploads` removes it
@@ -15,7 +15,7 @@ import api from "@/lib/api"
 interface Question {
     question: string;
     options: string[];
-    answer: number; // Index of correct option
+    answer?: number; // Index of correct option, only sent to instructors
 }
 
 interface Assessment {
@@ -24,6 +24,7 @@ interface Assessment {
     description: string;
     questions: Question[];
     time_limit: number;
+    draw_token?: string; // Set when questions are drawn from a bank
 }
 
 export default function AssessmentPage() {
@@ -64,7 +65,8 @@ export default function AssessmentPage() {
     setSubmitting(true)
     try {
         const res = await api.post(`assessments/${assessmentId}/submit/`, {
-            answers: answers
+            answers: answers,
+            draw_token: assessment?.draw_token
         })
         setResult(res.data)
     } catch (e) {
@@ -108,6 +110,7 @@ export default function AssessmentPage() {
             {assessment.questions.map((q, qIdx) => {
                 const isCorrect = result?.results[qIdx]?.correct;
                 const userAnswer = result?.results[qIdx]?.user_answer;
+                const correctAnswer = result?.results[qIdx]?.correct_answer;
 
                 return (
                 <Card key={qIdx} className={`border-l-4 ${result ? (isCorrect ? "border-l-green-500" : "border-l-red-500") : "border-l-primary"}`}>
@@ -126,11 +129,11 @@ export default function AssessmentPage() {
                                 <div key={oIdx} className="flex items-center space-x-2 space-y-2">
                                     <RadioGroupItem value={oIdx.toString()} id={`q${qIdx}-o${oIdx}`} />
                                     <Label htmlFor={`q${qIdx}-o${oIdx}`} className={
-                                        result && oIdx === q.answer ? "text-green-600 font-bold" :
-                                        result && oIdx !== q.answer && oIdx === userAnswer ? "text-red-600 font-bold" : ""
+                                        result && oIdx === correctAnswer ? "text-green-600 font-bold" :
+                                        result && oIdx !== correctAnswer && oIdx === userAnswer ? "text-red-600 font-bold" : ""
                                     }>{opt}</Label>
-                                    {result && oIdx === q.answer && <CheckCircle className="h-4 w-4 text-green-500" />}
-                                    {result && oIdx !== q.answer && oIdx === userAnswer && <XCircle className="h-4 w-4 text-red-500" />}
+                                    {result && oIdx === correctAnswer && <CheckCircle className="h-4 w-4 text-green-500" />}
+                                    {result && oIdx !== correctAnswer && oIdx === userAnswer && <XCircle className="h-4 w-4 text-red-500" />}
                                 </div>
                             ))}
                         </RadioGroup>
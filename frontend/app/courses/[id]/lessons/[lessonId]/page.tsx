@@ -12,7 +12,6 @@ import type { Lesson, Course } from "@/types"
 import api from "@/lib/api"
 import { ArrowLeft, ArrowRight, Clock, CheckCircle } from "lucide-react"
 import Link from "next/link"
-import ReactMarkdown from "react-markdown"
 
 interface BackendLesson {
   id: number
@@ -24,7 +23,7 @@ interface BackendLesson {
   }
   title: string
   description: string
-  content: string
+  content?: string // detail only; lists leave the body out
   video_path: string | null
   video_file: string | null
   duration: number
@@ -33,12 +32,32 @@ interface BackendLesson {
   updated_at: string
 }
 
+// Rendered lesson bodies by lesson id, revalidated with their ETag
+const htmlCache = new Map<string, { etag: string; html: string }>()
+
+async function fetchLessonHtml(lessonId: string): Promise<string> {
+  const cached = htmlCache.get(lessonId)
+  const response = await api.get(`lessons/${lessonId}/html/`, {
+    headers: cached ? { "If-None-Match": cached.etag } : {},
+    validateStatus: (status) => (status >= 200 && status < 300) || status === 304,
+  })
+  if (response.status === 304 && cached) {
+    return cached.html
+  }
+  const etag = response.headers["etag"]
+  if (etag) {
+    htmlCache.set(lessonId, { etag, html: response.data.html })
+  }
+  return response.data.html
+}
+
 export default function LessonPage() {
   const params = useParams()
   const courseId = params.id as string
   const lessonId = params.lessonId as string
 
   const [lesson, setLesson] = useState<Lesson | null>(null)
+  const [contentHtml, setContentHtml] = useState("")
   const [course, setCourse] = useState<Course | null>(null)
   const [courseLessons, setCourseLessons] = useState<Lesson[]>([])
   const [loading, setLoading] = useState(true)
@@ -50,9 +69,13 @@ export default function LessonPage() {
         setLoading(true)
         setError(null)
 
-        // Fetch lesson details
-        const lessonResponse = await api.get(`lessons/${lessonId}/`)
+        // Fetch lesson details and the server-rendered (sanitized) content
+        const [lessonResponse, html] = await Promise.all([
+          api.get(`lessons/${lessonId}/`),
+          fetchLessonHtml(lessonId),
+        ])
         const backendLesson: BackendLesson = lessonResponse.data
+        setContentHtml(html)
 
         // Transform lesson data
         const transformedLesson: Lesson = {
@@ -91,7 +114,6 @@ export default function LessonPage() {
             courseId: l.course.toString(),
             title: l.title,
             description: l.description,
-            content: l.content,
             videoPath: l.video_path || undefined,
             duration: l.duration,
             order: l.order,
@@ -187,9 +209,10 @@ export default function LessonPage() {
               <CardHeader>
                 <CardTitle>Lesson Content</CardTitle>
               </CardHeader>
-              <CardContent className="prose prose-sm max-w-none dark:prose-invert">
-                <ReactMarkdown>{lesson.content}</ReactMarkdown>
-              </CardContent>
+              <CardContent
+                className="prose prose-sm max-w-none dark:prose-invert"
+                dangerouslySetInnerHTML={{ __html: contentHtml }}
+              />
             </Card>
 
             {/* Navigation */}
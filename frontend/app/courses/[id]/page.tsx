@@ -56,7 +56,6 @@ export default function CourseDetailPage() {
           courseId: l.course.toString(),
           title: l.title,
           description: l.description,
-          content: l.content,
           videoPath: l.video_path || undefined,
           duration: l.duration,
           order: l.order,
@@ -329,7 +328,7 @@ export default function CourseDetailPage() {
                              <div className="flex items-center justify-between pt-2">
                                  <div className="flex items-center gap-3 text-xs text-muted-foreground">
                                      <span className="flex items-center"><Clock className="w-3 h-3 mr-1" />{assessment.timeLimit}m</span>
-                                     <span className="flex items-center"><FileText className="w-3 h-3 mr-1" />{assessment.questions.length} Qs</span>
+                                     <span className="flex items-center"><FileText className="w-3 h-3 mr-1" />{assessment.question_count} Qs</span>
                                  </div>
                                  {assessment.score && (<Badge variant="secondary" className="bg-green-100 text-green-700 dark:bg-green-900/30">{assessment.score}%</Badge>)}
                             </div>
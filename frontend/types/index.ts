@@ -28,7 +28,7 @@ export interface Lesson {
   courseId: string
   title: string
   description: string
-  content: string // Markdown content
+  content?: string // Markdown content; left out of lesson lists
   videoPath?: string
   duration: number // in minutes
   order: number